@@ -3,13 +3,35 @@ import json
 from pathlib import Path
 from datetime import datetime, timezone
 import pandas as pd
-import csv
 import hashlib
+import os
+import copy
+import time
+import uuid
+
+import autosave
+import backup
+import catalog
+import columnar
+import completeness
+import diagnostics
+import history
+import merkle
+import migrations
+import profiling
+import search
+import storage
 
 DATA_DIR = Path("data")
 AGGREGATED_FILE = DATA_DIR / "aggregated.json"
 UPLOADS_DIR = Path("uploads")
 PRODUCT_CATALOG_FILE = UPLOADS_DIR / "Product Catalog.csv"
+# Fingerprints of the last imported catalog (see catalog.py)
+CATALOG_SYNC_FILE = DATA_DIR / "catalog_sync.json"
+# Storage backend (see storage.py): "json" (aggregated.json), "sharded" (one file per product) or "sqlite"
+STORAGE_MODE = os.environ.get("WORKSHOP_STORAGE", "json")
+# Initial state of the sidebar's Autosave toggle (see autosave.py)
+AUTOSAVE_DEFAULT = os.environ.get("WORKSHOP_AUTOSAVE", "0") not in ("0", "")
 
 st.set_page_config(page_title="Workshop Session Capture", layout="wide")
 
@@ -26,9 +48,24 @@ def get_owner_color(owner_name: str) -> str:
 def ensure_dirs():
     UPLOADS_DIR.mkdir(parents=True, exist_ok=True)
     AGGREGATED_FILE.parent.mkdir(parents=True, exist_ok=True)
-    if not AGGREGATED_FILE.exists():
-        with open(AGGREGATED_FILE, "w") as f:
-            json.dump({"products": {}}, f)
+    # First start in a storage mode carries over the data of any other backend
+    storage.ensure_store(STORAGE_MODE, DATA_DIR)
+    # Every save from here on is logged as a revision, including the migrations below
+    get_history()
+    # Hashes the store and checks it against the hashes of the last saves (see merkle.py)
+    get_merkle()
+    # Schema migrations run on the first rerun in this process; later reruns skip them
+    migrations.migrate_store(get_repository(), get_writer())
+
+
+def get_repository():
+    """Return the process-wide store repository for STORAGE_MODE."""
+    return storage.get_repository(STORAGE_MODE, DATA_DIR)
+
+
+def get_writer():
+    """Return the single writer thread that applies every store mutation (group commit)."""
+    return storage.get_writer(STORAGE_MODE, DATA_DIR)
 
 
 def slugify(name: str) -> str:
@@ -469,166 +506,495 @@ def get_empty_business_owner_template():
     }
 
 
-def deep_merge(target, source):
-    """Deep merge source dict into target dict."""
-    for key, value in source.items():
-        if key in target and isinstance(target[key], dict) and isinstance(value, dict):
-            deep_merge(target[key], value)
-        else:
-            target[key] = value
-    return target
+@diagnostics.timed("save_product_data")
+def save_product_data(product_id, product_data, expected_revision=None, base=None):
+    """Save or update product data; nested structures are deep-merged into the stored product.
 
+    Pass the revision and values a form was opened with to detect concurrent
+    edits: fields changed by someone else are kept, and fields changed on both
+    sides raise storage.SaveConflict. Returns the list of changed leaves
+    (storage.Change); a save that changes nothing writes nothing.
+    """
+    template = get_empty_product_template()
+    return get_writer().submit(lambda repo: repo.save_product(
+        product_id, product_data, template=template,
+        expected_revision=expected_revision, base=base,
+    ))
 
-def save_product_data(product_id, product_data):
-    """Save or update product data directly in aggregated.json."""
-    aggregated = load_aggregated_data()
-    
-    if product_id not in aggregated["products"]:
-        # Initialize with full template
-        aggregated["products"][product_id] = get_empty_product_template()
-    
-    # Deep merge to preserve nested structures
-    deep_merge(aggregated["products"][product_id], product_data)
-    
-    save_aggregated_data(aggregated)
 
+def delete_products_data(product_ids):
+    """Remove several products in one write."""
+    get_writer().submit(lambda repo: [repo.delete_product(pid) for pid in product_ids])
 
 
+def save_products_data(updates):
+    """Deep-merge {product_id: product_data} for several products in one write."""
+    template = get_empty_product_template()
+    return get_writer().submit(lambda repo: {
+        pid: repo.save_product(pid, data, template=template)
+        for pid, data in updates.items()
+    })
 
 
-def load_products():
-    """Load products from aggregated data."""
-    aggregated = load_aggregated_data()
-    products = []
-    
-    for pid, prod_data in aggregated.get("products", {}).items():
-        product = dict(prod_data)  # Copy all fields directly
-        products.append(product)
-    
-    return products
-
-
-def migrate_remove_last_updated():
-    """Remove deprecated 'last_updated' fields from aggregated.json if present."""
-    data = load_aggregated_data()
-    changed = False
-    # Clean products
-    for pid, prod in list(data.get("products", {}).items()):
-        if isinstance(prod, dict) and "last_updated" in prod:
-            del prod["last_updated"]
-            changed = True
-    if changed:
-        save_aggregated_data(data)
-
-
-def load_products_from_csv():
-    """Parse Product Catalog CSV and extract products with all relevant metadata."""
-    products_list = []
-    if not PRODUCT_CATALOG_FILE.exists():
-        return products_list
-    
-    try:
-        with open(PRODUCT_CATALOG_FILE, 'r') as f:
-            reader = csv.reader(f)
-            rows = list(reader)
-        
-        # Skip header row
-        for i, row in enumerate(rows):
-            if i == 0:
-                continue  # Skip header
-            
-            if not row or all(c.strip() == '' for c in row):
-                continue
-            
-            product_name = row[0].strip() if len(row) > 0 else ''
-            
-            # Skip platform rows (no actual product name)
-            if not product_name or 'Platform' in product_name and 'N/A' in (row[2] if len(row) > 2 else ''):
-                continue
-            
-            # Extract only the fields used in UI
-            workstream = row[1].strip() if len(row) > 1 else ''
-            business_owner = row[3].strip() if len(row) > 3 else ''
-            existing_users = row[4].strip() if len(row) > 4 else ''
-            primary_operator = row[6].strip() if len(row) > 6 else ''
-            primary_developer = row[10].strip() if len(row) > 10 else ''
-            
-            products_list.append({
-                'product_name': product_name,
-                'workstream': workstream,
-                'business_owner': business_owner,
-                'existing_users': existing_users,
-                'primary_operator': primary_operator,
-                'primary_developer': primary_developer
-            })
-    except Exception:
-        pass
-    
-    return products_list
+def get_history():
+    """Return the process-wide revision history (see history.py), recording every save to the store."""
+    return history.get_history(get_repository(), DATA_DIR)
 
 
+def get_merkle():
+    """Return the process-wide Merkle hashes of the store (see merkle.py), kept current by every save."""
+    return merkle.get_index(get_repository(), DATA_DIR)
 
-def load_aggregated_data():
-    """Load aggregated data (products only)."""
-    if AGGREGATED_FILE.exists():
-        with open(AGGREGATED_FILE, 'r') as f:
-            return json.load(f)
-    return {"products": {}}
 
+def get_autosaver():
+    """Return the process-wide autosaver, which writes buffered session edits through get_writer()."""
+    return autosave.get_autosaver(get_writer(), get_empty_product_template())
+
+
+def autosave_session():
+    """This browser session's key in the autosaver."""
+    return st.session_state.setdefault('autosave_session', uuid.uuid4().hex)
+
+
+def get_completeness():
+    """Return the process-wide completeness counts (see completeness.py), kept current by every save."""
+    return completeness.get_index(get_repository(), get_empty_product_template(), get_empty_business_owner_template())
+
+
+def load_product_summaries():
+    """Load the summary row of every product (id, name, owner, workstream, revision) without session bodies."""
+    return get_repository().list_products()
+
+
+def load_product_summary(product_id):
+    """Load one product's summary row, or None if it does not exist."""
+    return get_repository().get_summary(product_id)
+
+
+@diagnostics.timed("load_aggregated_data")
+def load_aggregated_data():
+    """Load the whole store as one aggregated document.
 
-def save_aggregated_data(data):
-    """Save aggregated data to file."""
-    with open(AGGREGATED_FILE, 'w') as f:
-        json.dump(data, f, indent=2)
+    Served by the configured repository, which caches reads process-wide; the
+    returned dict may be shared, so treat it as read-only.
+    """
+    return get_repository().load()
 
 
+@diagnostics.timed("import_products_from_csv")
 def import_products_from_csv():
-    """Import products from CSV into aggregated.json."""
-    aggregated = load_aggregated_data()
-    csv_products = load_products_from_csv()
-    
-    for csv_prod in csv_products:
-        pid = slugify(csv_prod['product_name'])
-        # Only add if not already exists
-        if pid not in aggregated["products"]:
-            # Start with full template
-            new_product = get_empty_product_template()
-            # Update with CSV data
-            new_product.update(csv_prod)
-            new_product["product_id"] = pid
-            aggregated["products"][pid] = new_product
-    
-    save_aggregated_data(aggregated)
-    return aggregated
+    """Sync the Product Catalog CSV into the store; returns added/updated/unchanged counts and slug collisions.
+
+    Only products whose catalog row changed since the last import are
+    written, and only their changed metadata fields (see catalog.py).
+    """
+    return catalog.sync_catalog(get_writer(), PRODUCT_CATALOG_FILE, CATALOG_SYNC_FILE, get_empty_product_template())
 
 
 def get_product_data(product_id):
-    """Get product data from aggregated.json."""
-    aggregated = load_aggregated_data()
-    return aggregated.get("products", {}).get(product_id, {})
+    """Get product data from the store, with the fields it has no answer for filled in from the template."""
+    product = get_repository().get_product(product_id)
+    return storage.with_defaults(get_empty_product_template(), product) if product is not None else {}
 
 
 # --- UI ---
 
+def remember_form_base(form_key, product):
+    """Record the revision and values a form was opened with, until it is saved or the page changes."""
+    bases = st.session_state.setdefault('form_bases', {})
+    if form_key not in bases:
+        bases[form_key] = {'revision': product.get('revision', 0), 'values': copy.deepcopy(product)}
+
+
+def reset_form_widgets(key_prefix):
+    """Drop widget state so the form re-initializes from the stored product on the next run."""
+    for key in [k for k in st.session_state.keys() if isinstance(k, str) and k.startswith(key_prefix)]:
+        del st.session_state[key]
+
+
+def save_product_form(form_key, key_prefix, product_id, product_data):
+    """Save a product form against the base it was opened with.
+
+    Returns the changed leaves (empty when the form matched the stored
+    product). On a conflicting concurrent edit nothing is written, the
+    conflict is stashed for render_save_conflict() and None is returned.
+    """
+    base = st.session_state.get('form_bases', {}).get(form_key)
+    try:
+        changes = save_product_data(
+            product_id, product_data,
+            expected_revision=base['revision'] if base else None,
+            base=base['values'] if base else None,
+        )
+    except storage.SaveConflict as conflict:
+        st.session_state['save_conflict'] = {'form_key': form_key, 'key_prefix': key_prefix, 'conflict': conflict}
+        return None
+    # Fields saved by someone else in the meantime must show up in the form
+    st.session_state['form_bases'].pop(form_key, None)
+    reset_form_widgets(key_prefix)
+    return changes
+
+
+def render_save_conflict(form_key):
+    """Show a stashed save conflict for this form and let the user pick a side."""
+    pending = st.session_state.get('save_conflict')
+    if not pending or pending['form_key'] != form_key:
+        return
+    conflict = pending['conflict']
+    st.error("Someone else saved this product while you were editing. These fields were changed on both sides; nothing has been saved yet.")
+    st.table(pd.DataFrame([
+        {
+            'Field': ' › '.join(c['path']),
+            'Your value': c['mine'],
+            'Their value': c['theirs'],
+        }
+        for c in conflict.conflicts
+    ]))
+    mine_col, theirs_col = st.columns(2)
+    keep_mine = mine_col.button("Keep my values", key=f"{form_key}-keep-mine")
+    keep_theirs = theirs_col.button("Keep their values", key=f"{form_key}-keep-theirs")
+    if keep_mine or keep_theirs:
+        del st.session_state['save_conflict']
+        st.session_state.setdefault('form_bases', {})[form_key] = {'revision': conflict.revision, 'values': conflict.current}
+        if save_product_form(form_key, pending['key_prefix'], conflict.product_id, conflict.resolution(keep_mine)) is not None:
+            st.success("Saved")
+        st.rerun()
+
+
+# Operator/Developer session layout: one entry per collapsible part as
+# (part key, title, [(subheading, path under technical_session, [(field, label[, kind]), ...]), ...]).
+# kind is "text" (default), "maturity" (1–5 slider) or "quotes" (one "Speaker | timestamp | quote" per line).
+TECHNICAL_SESSION_PARTS = [
+    ("overview", "Part 1: Developer’s Product Overview", [
+        (None, ("part1_overview",), [
+            ("overview_product_desc", "What is the product and why does it exist?"),
+            ("overview_problem_solved", "What problems does it solve?"),
+            ("overview_process_fit", "Where does it fit in the delivery process?"),
+            ("overview_history", "History & evolution"),
+            ("overview_alignment", "Alignment notes from other participants"),
+        ]),
+    ]),
+    ("development", "Part 2: Development Deep-Dive", [
+        ("A. Technical Stack", ("part2_technical_stack",), [
+            ("tech_languages_versions", "Languages & versions"),
+            ("tech_frameworks_libs", "Frameworks & libraries"),
+            ("tech_commercial_tools", "Commercial packages/tools"),
+            ("tech_dependencies_external", "External dependencies/services"),
+            ("tech_dependencies_internal", "Internal dependencies (Nuton systems)"),
+            ("tech_runtime_env", "Intended runtime (local/server/cloud)"),
+            ("tech_os_requirements", "OS requirements"),
+            ("tech_hardware_needs", "Special hardware needs"),
+        ]),
+        ("B. Development Environment & Practices", ("part3_development_deployment",), [
+            ("dev_feature_request", "How are features requested and prioritized?"),
+            ("dev_roadmap", "Roadmap (exists/how managed)"),
+            ("dev_version_control", "Version control (tool/location)"),
+            ("dev_code_reviews", "Code reviews"),
+            ("dev_testing", "Testing approach (unit/integration/regression/manual)"),
+            ("dev_docs", "Documentation approach"),
+            ("dev_deploy_process", "Deploy process & frequency"),
+            ("dev_deploy_roles", "Who can deploy"),
+            ("dev_deploy_duration", "Deployment duration"),
+            ("dev_operator_coordination", "Coordination with Operators during deploys"),
+            ("dev_operator_comms", "Operator comms about changes"),
+        ]),
+        ("C. Technical Challenges", ("part4_challenges",), [
+            ("challenges_limitations", "Technical limitations/constraints"),
+            ("challenges_rewrite", "What would you do differently if rebuilding?"),
+            ("challenges_tech_debt", "Technical debt / issues"),
+            ("challenges_maintainability", "Who else could maintain / training time"),
+            ("challenges_docs_training", "Docs availability / training"),
+        ]),
+    ]),
+    ("operation", "Part 3: Operation Deep-Dive", [
+        ("A. Usage & Access", ("part5_operation_deepdive", "usage_access"), [
+            ("usage_frequency", "Usage frequency (daily/weekly/per project)"),
+            ("usage_tasks", "Tasks performed"),
+            ("usage_duration", "Typical duration"),
+            ("access_method", "Access method (desktop/web/CLI)"),
+            ("access_permissions", "Access/permissions needed"),
+            ("access_locations", "Locations usable (any/specific)"),
+            ("training_type", "Training type & provider"),
+            ("training_duration", "Time to proficiency"),
+            ("training_docs", "Docs/user guides availability"),
+        ]),
+        ("B. Pain Points & Workarounds", ("part5_operation_deepdive", "pain_points_workarounds"), [
+            ("ops_pain_points", "Biggest frustrations"),
+            ("ops_slowdowns", "Where it slows you down / extra work"),
+            ("ops_workarounds", "Workarounds / manual steps"),
+            ("ops_failure_detection", "Failure detection (how you know)"),
+            ("ops_self_debug", "Self-debug info used"),
+            ("ops_support_contact", "Who you contact for help"),
+            ("ops_resolution_time", "Typical resolution time"),
+            ("ops_missing_features", "Missing features / wishlist"),
+        ]),
+        ("C. Gap Analysis", ("part5_operation_deepdive", "gap_analysis"), [
+            ("gap_output_quality", "Output content/quality sufficiency"),
+            ("gap_timeline_speed", "Timeline/speed sufficiency"),
+            ("gap_unavailability", "Times you need but can't use; why"),
+            ("gap_alternatives", "Alternative methods used; when/why"),
+        ]),
+    ]),
+    ("data", "Part 4: Data and Integration", [
+        ("A. Data Inputs", ("part6_data_integration", "data_inputs"), [
+            ("data_inputs_sources", "Sources"),
+            ("data_inputs_format", "Formats"),
+            ("data_inputs_frequency", "Frequency"),
+            ("data_inputs_ingestion", "Ingestion process (auto/manual)"),
+            ("data_inputs_time", "Time to ingest"),
+            ("data_inputs_prep", "Preparation/cleaning"),
+            ("data_inputs_failure", "Behavior if wrong/missing/delayed"),
+            ("data_inputs_volume", "Volume (records, sizes)"),
+            ("data_inputs_growth", "Growth rate"),
+            ("data_inputs_retention", "Retention (how long kept)"),
+        ]),
+        ("B. Data Outputs", ("part6_data_integration", "data_outputs"), [
+            ("data_outputs_types", "Outputs produced"),
+            ("data_outputs_destinations", "Destinations / consumers"),
+            ("data_outputs_format", "Formats & delivery"),
+            ("data_outputs_export", "Export process; time; reformatting"),
+            ("data_outputs_post", "Post-process usage"),
+            ("data_outputs_retention", "Output retention"),
+        ]),
+        ("C. Data Storage", ("part6_data_integration", "data_storage"), [
+            ("data_storage_locations", "Storage locations (DB, Databricks, filesystem)"),
+            ("data_storage_access", "Access controls"),
+            ("data_storage_backup", "Backup approach"),
+            ("data_storage_recovery", "Recovery approach"),
+        ]),
+        ("D. Integration Points", ("part6_data_integration", "integration_points"), [
+            ("integrations_nuton", "Nuton products/systems integrations & reliability"),
+            ("integrations_external", "External systems integrations (Databricks/PI/AVEVA/etc)"),
+            ("integrations_desired", "Desired integrations not present"),
+        ]),
+    ]),
+    ("wrapup", "Part 5: Wrap-Up", [
+        (None, ("part7_wrapup", "maturity_scores"), [
+            ("maturity_development", "Development maturity (1–5)", "maturity"),
+            ("maturity_operational", "Operational maturity (1–5)", "maturity"),
+            ("maturity_data", "Data maturity (1–5)", "maturity"),
+            ("maturity_integration", "Integration maturity (1–5)", "maturity"),
+            ("maturity_documentation", "Documentation maturity (1–5)", "maturity"),
+        ]),
+        (None, ("part7_wrapup",), [
+            ("prioritization_improvement", "One thing to fix/improve"),
+            ("critical_unknowns", "Critical unknowns not asked"),
+            ("predict_platform_fit", "Fit to Predict platform vision"),
+            ("summary_validation", "Summary/validation notes"),
+            ("quotes", "Verbatim quotes (Speaker | timestamp | quote per line)", "quotes"),
+        ]),
+    ]),
+]
+
+
+def parse_quotes(text):
+    """Parse one 'Speaker | timestamp | quote' per line into quote objects."""
+    qs = []
+    for line in text.splitlines():
+        if not line.strip():
+            continue
+        parts = [p.strip() for p in line.split("|")]
+        qs.append({'speaker': parts[0] if parts else '', 'timestamp': parts[1] if len(parts)>1 else '', 'quote': parts[2] if len(parts)>2 else parts[-1]})
+    return qs
+
+
+def change_cell(value):
+    """A storage.Change value as a table cell: '' for none, strings as they are, anything else as JSON."""
+    return '' if value is None else value if isinstance(value, str) else json.dumps(value)
+
+
+def render_session_field(label, kind, value, key, on_change=None, args=None):
+    """Render one session question, initialized from its stored value."""
+    if kind == 'maturity':
+        try:
+            default = int(value)
+        except Exception:
+            default = 3
+        st.slider(label, min_value=1, max_value=5, value=default, key=key, on_change=on_change, args=args)
+    elif kind == 'quotes':
+        text = '\n'.join([f"{q.get('speaker')}|{q.get('timestamp')}|{q.get('quote')}" for q in value or []])
+        st.text_area(label, value=text, key=key, on_change=on_change, args=args)
+    else:
+        st.text_area(label, value=value or '', key=key, on_change=on_change, args=args)
+
+
+def technical_part_values(key_prefix, groups):
+    """The technical_session answers of one part, read from its widgets."""
+    session = {}
+    for _, path, fields in groups:
+        section = session
+        for name in path:
+            section = section.setdefault(name, {})
+        for field, _, *kind in fields:
+            value = st.session_state.get(f"{key_prefix}{field}")
+            section[field] = parse_quotes(value or '') if kind == ['quotes'] else value
+    return session
+
+
+def record_autosave(form_key, product_id, values):
+    """Hand a form's current answers to the autosaver, which writes what changed since the form was opened."""
+    base = st.session_state.get('form_bases', {}).get(form_key)
+    get_autosaver().record(autosave_session(), form_key, product_id, base['values'] if base else {}, values)
+
+
+def autosave_technical_part(product_id, form_key, key_prefix, groups):
+    """Widget callback in autosave mode: buffer the part's answers."""
+    record_autosave(form_key, product_id, {'technical_session': technical_part_values(key_prefix, groups)})
+
+
+def render_autosave_status(key):
+    """One line on what autosave has still to write for this session, with a button to write it now."""
+    autosaver = get_autosaver()
+    session = autosave_session()
+    status, pending = autosaver.status(session), autosaver.pending(session)
+    text_col, button_col = st.columns([5, 1])
+    if status['error']:
+        text_col.warning(f"Autosave failed, retrying: {status['error']}")
+    elif pending:
+        text_col.caption(f"Autosave: {pending} field(s) waiting to be saved")
+    elif status['saved_at']:
+        text_col.caption(f"Autosave: all changes saved at {datetime.fromtimestamp(status['saved_at']).strftime('%H:%M:%S')}")
+    else:
+        text_col.caption("Autosave is on: changes are saved a moment after you make them.")
+    # Flushing in the callback lets this run already show the result
+    button_col.button("Save now", key=f"autosave-now-{key}", disabled=not pending, on_click=autosaver.flush, args=(session,))
+
+
+def save_technical_part(product_id, product_name, form_key, key_prefix, groups):
+    """Form callback: save one Operator/Developer session part from its widget values."""
+    session = technical_part_values(key_prefix, groups)
+    payload = {'product_id': product_id, 'product_name': product_name, 'technical_session': session}
+    changes = save_product_form(form_key, key_prefix, product_id, payload)
+    if changes is not None:
+        # Callbacks cannot draw into a fragment; the fragment shows this on its rerun
+        st.session_state[f"{form_key}-status"] = "Saved Technical data for product" if changes else "No changes to save"
+
+
+@st.fragment
+def render_technical_part(product_id, product_name, part_key, title, groups):
+    """One Operator/Developer session part as its own fragment and form.
+
+    The questions are only built while the part is open, and opening or
+    saving it reruns this fragment alone instead of the whole page. Each part
+    saves just its own fields. In autosave mode there is no form: every
+    changed answer goes to the autosaver instead.
+    """
+    if not st.toggle(title, key=f"{product_id}-Technical-open-{part_key}"):
+        return
+    form_key = f"edit-form-{product_id}-Technical-{part_key}"
+    key_prefix = f"{product_id}-Technical-{part_key}-"
+    product = get_product_data(product_id)
+    remember_form_base(form_key, product)
+    autosaving = st.session_state.get('autosave')
+    with st.container() if autosaving else st.form(form_key):
+        for heading, path, fields in groups:
+            if heading:
+                st.markdown(f"#### {heading}")
+            stored = product.get('technical_session', {})
+            for name in path:
+                stored = stored.get(name, {})
+            for field, label, *kind in fields:
+                render_session_field(
+                    label, kind[0] if kind else 'text', stored.get(field), f"{key_prefix}{field}",
+                    on_change=autosave_technical_part if autosaving else None,
+                    args=(product_id, form_key, key_prefix, groups),
+                )
+        if autosaving:
+            render_autosave_status(form_key)
+            return
+        # Saving in the callback lets the fragment rerun re-initialize the reset widgets
+        st.form_submit_button(
+            f"Save {title.split(':')[0]}",
+            on_click=save_technical_part, args=(product_id, product_name, form_key, key_prefix, groups),
+        )
+    status = st.session_state.pop(f"{form_key}-status", None)
+    if status:
+        st.success(status)
+    render_save_conflict(form_key)
+
+
+def technical_field_parts():
+    """Map each technical session leaf path to (part key, question label)."""
+    fields = {}
+    for part_key, _, groups in TECHNICAL_SESSION_PARTS:
+        for _, path, group_fields in groups:
+            for field, label, *_ in group_fields:
+                fields[('technical_session',) + path + (field,)] = (part_key, label)
+    return fields
+
+
+def render_search_hit(hit, summary, field_parts):
+    """One search result: the product, its matching answers and links into the session editors."""
+    pid = hit['product_id']
+    with st.container(border=True):
+        title_col, tech_col, bo_col = st.columns([4, 1, 1])
+        title_col.markdown(f"**{summary.get('product_name') or pid}** · {summary.get('business_owner', '')}")
+        sections = {path[0] for path in hit['paths']}
+        if tech_col.button("Operator/Dev", key=f"search-tech-{pid}", disabled='technical_session' not in sections):
+            # Open the parts that hold the matches
+            for path in hit['paths']:
+                if path in field_parts:
+                    st.session_state[f"{pid}-Technical-open-{field_parts[path][0]}"] = True
+            st.session_state['editing_product'] = pid
+            st.session_state['page'] = 'Product Operator/Developer Session'
+            st.rerun()
+        if bo_col.button("BO/User", key=f"search-bo-{pid}", disabled='business_owner_session' not in sections):
+            st.session_state['editing_product'] = pid
+            st.session_state['page'] = 'Product Business Owner Session'
+            st.rerun()
+        for path, text in hit['snippets']:
+            label = field_parts[path][1] if path in field_parts else ' › '.join(path[1:]).replace('_', ' ')
+            st.markdown(f"*{label}* — {text}")
+        if len(hit['paths']) > len(hit['snippets']):
+            st.caption(f"+ {len(hit['paths']) - len(hit['snippets'])} more matching answers")
+
+
 def main():
     ensure_dirs()
-    # Migrate existing data to remove deprecated fields
-    migrate_remove_last_updated()
 
     st.title("Workshop Product Page Editor")
     st.sidebar.header("Navigation")
     # Navigation buttons
     nav = {
         'Products': st.sidebar.button('Products', key='nav_products'),
+        'Progress': st.sidebar.button('Progress', key='nav_progress'),
+        'Search': st.sidebar.button('Search', key='nav_search'),
         'Export Backup': st.sidebar.button('Export Backup', key='nav_export'),
+        'Export All': st.sidebar.button('Export All', key='nav_export_all'),
     }
     
+    st.session_state.setdefault('autosave', AUTOSAVE_DEFAULT)
+    st.sidebar.toggle(
+        "Autosave", key="autosave",
+        help="Save session answers a moment after each change instead of with the Save buttons",
+        # Edits buffered so far are written before the editors switch back to forms
+        on_change=lambda: get_autosaver().close(autosave_session()),
+    )
+
     # Import products from CSV
     st.sidebar.markdown("---")
     if st.sidebar.button('Import from CSV', key='import_csv'):
-        import_products_from_csv()
-        st.sidebar.success("✅ Products imported from CSV")
+        status = []
+        if not PRODUCT_CATALOG_FILE.exists():
+            status.append(('warning', f"No catalog found at {PRODUCT_CATALOG_FILE}"))
+        else:
+            try:
+                counts = import_products_from_csv()
+            except catalog.CatalogFormatError as e:
+                status.append(('error', str(e)))
+            else:
+                status.append(('success', (
+                    f"✅ Catalog imported: {counts['added']} added, {counts['updated']} updated, {counts['unchanged']} unchanged"
+                )))
+                for pid, names in counts['collisions'].items():
+                    status.append(('warning', f"{' / '.join(names)} all map to product id '{pid}'; the last row was imported"))
+        st.session_state['import_status'] = status
         st.rerun()
+    for kind, message in st.session_state.pop('import_status', []):
+        getattr(st.sidebar, kind)(message)
+    integrity_problems = get_merkle().problems()
+    if integrity_problems:
+        st.sidebar.warning(f"{len(integrity_problems)} product(s) did not match their last save when the store was loaded; see Export Backup.")
     
     # Determine current page
     if 'page' not in st.session_state:
@@ -636,7 +1002,19 @@ def main():
     for k, v in nav.items():
         if v:
             st.session_state['page'] = k
-    page = st.session_state['page']    
+    # Hidden page, reached with ?page=Diagnostics
+    if st.query_params.get('page') == 'Diagnostics':
+        st.session_state['page'] = 'Diagnostics'
+        del st.query_params['page']
+    page = st.session_state['page']
+    # Time this page's render; a run cut short by st.rerun() is not recorded
+    page_started = time.perf_counter()
+    if st.session_state.get('form_bases_page') != page:
+        # Forms opened on another page are gone; their bases and conflicts go with them, and autosaved edits are written now
+        get_autosaver().close(autosave_session())
+        st.session_state['form_bases_page'] = page
+        st.session_state['form_bases'] = {}
+        st.session_state.pop('save_conflict', None)
     # Highlight active page in sidebar
     st.sidebar.markdown("---")
     st.sidebar.markdown(f"**Current: {page}**")
@@ -679,62 +1057,106 @@ def main():
                 st.session_state['page'] = 'Add Product'
                 st.rerun()
         
-        products = load_products()
-        if not products:
-            st.info("No products found yet. Click 'Add Product' to create one.")
+        # Filtering, sorting and paging happen in the repository; only one page of rows is sent
+        repo = get_repository()
+        facets = repo.product_facets()
+        sort_fields = {'Catalog order': None, 'Product Name': 'product_name', 'Business Owner': 'business_owner', 'Workstream': 'workstream'}
+        first_page = lambda: st.session_state.update({'products-page': 1})
+        filter_cols = st.columns([3, 3, 2, 1])
+        owners = filter_cols[0].multiselect("Business Owner", facets['business_owner'], key="products-owner", on_change=first_page)
+        workstreams = filter_cols[1].multiselect("Workstream", facets['workstream'], key="products-workstream", on_change=first_page)
+        sort_label = filter_cols[2].selectbox("Sort by", list(sort_fields), key="products-sort", on_change=first_page)
+        page_size = filter_cols[3].selectbox("Rows per page", [25, 50, 100], key="products-page-size", on_change=first_page)
+        descending = st.toggle("Descending", key="products-descending", on_change=first_page)
+        query = {
+            'filters': {'business_owner': owners, 'workstream': workstreams},
+            'sort': sort_fields[sort_label],
+            'descending': descending,
+        }
+        page_no = st.session_state.get('products-page', 1)
+        rows, total = repo.query_products(offset=(page_no - 1) * page_size, limit=page_size, **query)
+        page_count = max(1, -(-total // page_size))
+        if page_no > page_count:
+            # Deletes or a narrower filter can leave us past the last page
+            page_no = st.session_state['products-page'] = page_count
+            rows, total = repo.query_products(offset=(page_no - 1) * page_size, limit=page_size, **query)
+
+        if not total:
+            st.info("No products found. Click 'Add Product' to create one or clear the filters.")
+            selected = []
         else:
-            valid_products = [p for p in products if p.get('product_id') and p.get('product_name')]
-            if not valid_products:
-                st.info("No products found yet. Use 'Add Product' to create one.")
-            else:
-                # Column headers
-                header_cols = st.columns([4, 3, 1, 1, 1])
-                header_cols[0].write("**Product Name**")
-                header_cols[1].write("**Business Owner**")
-                header_cols[2].write("**Operator/Dev**")
-                header_cols[3].write("**BO/User**")
-                header_cols[4].write("")
-                
-                for p in valid_products:
-                    owner = p.get('business_owner', 'Unknown')
-                    bg_color = get_owner_color(owner)
-                    
-                    # Create row with background color on business owner cell
-                    cols = st.columns([4, 3, 1, 1, 1])
-                    cols[0].write(p.get("product_name"))
-                    cols[1].markdown(f'<div style="background-color: {bg_color}; color: white; padding: 8px; border-radius: 5px;">{owner}</div>', unsafe_allow_html=True)
-                    if cols[2].button("Edit", key=f"edit-{p.get('product_id')}"):
-                        st.session_state['editing_product'] = p.get('product_id')
-                        st.session_state['page'] = 'Product Operator/Developer Session'
-                        st.rerun()
-                    if cols[3].button("Edit", key=f"edit-bo-{p.get('product_id')}"):
-                        st.session_state['editing_product'] = p.get('product_id')
-                        st.session_state['page'] = 'Product Business Owner Session'
-                        st.rerun()
-                    if cols[4].button("Delete", key=f"delete-{p.get('product_id')}"):
-                        st.session_state['delete_product_id'] = p.get('product_id')
-                        st.session_state['show_delete_confirm'] = True
+            table = pd.DataFrame(rows, columns=['product_id', 'product_name', 'business_owner', 'workstream'])
+            progress = get_completeness()
+            table['progress'] = [progress.percent(row['product_id']) for row in rows]
+            styled = table.style.map(
+                lambda owner: f"background-color: {get_owner_color(owner or 'Unknown')}; color: white",
+                subset=['business_owner'],
+            )
+            # A new key per query and page drops a selection made on other rows
+            table_key = hashlib.md5(repr((query, page_no, page_size, total)).encode()).hexdigest()[:12]
+            event = st.dataframe(
+                styled,
+                hide_index=True,
+                column_order=['product_name', 'business_owner', 'workstream', 'progress'],
+                column_config={
+                    'product_name': "Product Name",
+                    'business_owner': "Business Owner",
+                    'workstream': "Workstream",
+                    'progress': st.column_config.ProgressColumn("Progress", min_value=0, max_value=100, format="%d%%"),
+                },
+                on_select="rerun",
+                selection_mode="multi-row",
+                key=f"products-table-{table_key}",
+            )
+            selected = [rows[i]['product_id'] for i in event.selection.rows]
+            page_col, count_col = st.columns([1, 5])
+            page_col.number_input("Page", min_value=1, max_value=page_count, key="products-page")
+            count_col.caption(f"Showing {(page_no - 1) * page_size + 1}–{(page_no - 1) * page_size + len(rows)} of {total} products")
+
+        # Actions on the selected rows
+        action_cols = st.columns(5)
+        single = selected[0] if len(selected) == 1 else None
+        if action_cols[0].button("Edit Operator/Dev", key="products-edit-technical", disabled=not single):
+            st.session_state['editing_product'] = single
+            st.session_state['page'] = 'Product Operator/Developer Session'
+            st.rerun()
+        if action_cols[1].button("Edit BO/User", key="products-edit-bo", disabled=not single):
+            st.session_state['editing_product'] = single
+            st.session_state['page'] = 'Product Business Owner Session'
+            st.rerun()
+        if action_cols[2].button(f"Delete selected ({len(selected)})", key="products-delete", disabled=not selected):
+            st.session_state['delete_product_ids'] = selected
+            st.session_state['show_delete_confirm'] = True
+            st.rerun()
+        if action_cols[3].button("History", key="products-history", disabled=not single):
+            st.session_state['history_product'] = single
+            st.session_state['page'] = 'History'
+            st.rerun()
+        with action_cols[4].popover("Reassign selected", disabled=not selected):
+            with st.form("products-reassign"):
+                new_owner = st.text_input("Business Owner", help="Leave blank to keep the current value")
+                new_workstream = st.text_input("Workstream", help="Leave blank to keep the current value")
+                if st.form_submit_button("Apply to selected"):
+                    fields = {k: v.strip() for k, v in {'business_owner': new_owner, 'workstream': new_workstream}.items() if v.strip()}
+                    if fields:
+                        save_products_data({pid: dict(fields) for pid in selected})
                         st.rerun()
 
-            # Confirmation dialog for delete
-            delete_pid = st.session_state.get('delete_product_id')
-            if st.session_state.get('show_delete_confirm') and delete_pid:
-                st.warning(f"Are you sure you want to delete product '{delete_pid}' and all its associated data? This cannot be undone.")
-                confirm, cancel = st.columns(2)
-                if confirm.button("Confirm Delete", key="confirm-delete"):
-                    # Remove product from aggregated data
-                    aggregated = load_aggregated_data()
-                    if delete_pid in aggregated.get("products", {}):
-                        del aggregated["products"][delete_pid]
-                    save_aggregated_data(aggregated)
-                    st.success(f"Product '{delete_pid}' deleted.")
-                    st.session_state['delete_product_id'] = None
-                    st.session_state['show_delete_confirm'] = False
-                    st.rerun()
-                if cancel.button("Cancel", key="cancel-delete"):
-                    st.session_state['delete_product_id'] = None
-                    st.session_state['show_delete_confirm'] = False
-                    st.rerun()
+        # Confirmation dialog for delete
+        delete_pids = st.session_state.get('delete_product_ids') or []
+        if st.session_state.get('show_delete_confirm') and delete_pids:
+            st.warning(f"Are you sure you want to delete {len(delete_pids)} product(s) ({', '.join(delete_pids)}) and all their associated data? This cannot be undone.")
+            confirm, cancel = st.columns(2)
+            if confirm.button("Confirm Delete", key="confirm-delete"):
+                delete_products_data(delete_pids)
+                st.success(f"Deleted {len(delete_pids)} product(s).")
+                st.session_state['delete_product_ids'] = None
+                st.session_state['show_delete_confirm'] = False
+                st.rerun()
+            if cancel.button("Cancel", key="cancel-delete"):
+                st.session_state['delete_product_ids'] = None
+                st.session_state['show_delete_confirm'] = False
+                st.rerun()
 
     elif page == 'Product Operator/Developer Session':
         editing_pid = st.session_state.get('editing_product')
@@ -744,11 +1166,10 @@ def main():
                 st.session_state['page'] = 'Products'
                 st.rerun()
             return
-        products = load_products()
         product_data = get_product_data(editing_pid)
         
-        # Get product info from the products list (has CSV data)
-        product_info = next((p for p in products if p.get('product_id') == editing_pid), None)
+        # Name, owner and workstream from the summary index (has CSV data)
+        product_info = load_product_summary(editing_pid)
         
         if not product_data and not product_info:
             st.error("Selected product not found. Please select another product.")
@@ -770,6 +1191,7 @@ def main():
         
         # Product Information - Always visible at top
         with st.expander("📝 Product Information", expanded=True):
+            remember_form_base(f"metadata-form-{editing_pid}", product_data)
             with st.form(f"metadata-form-{editing_pid}"):
                 meta_col1, meta_col2 = st.columns(2)
                 with meta_col1:
@@ -790,369 +1212,18 @@ def main():
                         'primary_operator': primary_operator,
                         'primary_developer': primary_developer,
                     }
-                    save_product_data(editing_pid, metadata_update)
-                    st.success("Product information saved")
+                    changes = save_product_form(f"metadata-form-{editing_pid}", f"{editing_pid}-meta-", editing_pid, metadata_update)
+                    if changes is not None:
+                        st.success("Product information saved" if changes else "No changes to save")
                     st.rerun()
+            render_save_conflict(f"metadata-form-{editing_pid}")
         
         st.markdown("---")
-        # Use product data directly
-        existing = product_data
-
-        def render_technical_form(existing):
-            # Extract nested technical_session data
-            tech_session = existing.get('technical_session', {}) if existing else {}
-            part1 = tech_session.get('part1_overview', {})
-            part2 = tech_session.get('part2_technical_stack', {})
-            part3 = tech_session.get('part3_development_deployment', {})
-            part4 = tech_session.get('part4_challenges', {})
-            part5 = tech_session.get('part5_operation_deepdive', {})
-            part5_usage = part5.get('usage_access', {})
-            part5_pain = part5.get('pain_points_workarounds', {})
-            part5_gap = part5.get('gap_analysis', {})
-            part6 = tech_session.get('part6_data_integration', {})
-            part6_inputs = part6.get('data_inputs', {})
-            part6_outputs = part6.get('data_outputs', {})
-            part6_storage = part6.get('data_storage', {})
-            part6_integration = part6.get('integration_points', {})
-            part7 = tech_session.get('part7_wrapup', {})
-            part7_maturity = part7.get('maturity_scores', {})
-            
-            with st.form(f"edit-form-{editing_pid}-Technical"):
-                st.write("Editing Technical session")
-                
-                st.markdown("### Session Data")
-                if False:  # This is here to preserve the indentation for the technical section below
-                    # Part 1: Context & Business Process
-                    st.markdown("**Part 1: Context & Business Process**")
-                    context_role = st.text_area("Role in technology delivery process", value=existing.get('context_role','') if existing else '', key=f"{editing_pid}-Technical-context_role")
-                    context_stages = st.text_area("Stages involved", value=existing.get('context_stages','') if existing else '', key=f"{editing_pid}-Technical-context_stages")
-                    context_decisions = st.text_area("Decisions made", value=existing.get('context_decisions','') if existing else '', key=f"{editing_pid}-Technical-context_decisions")
-                    context_deliverables = st.text_area("Key deliverables", value=existing.get('context_deliverables','') if existing else '', key=f"{editing_pid}-Technical-context_deliverables")
-                    context_workflow = st.text_area("Typical workflow/process", value=existing.get('context_workflow','') if existing else '', key=f"{editing_pid}-Technical-context_workflow")
-                    context_steps = st.text_area("Workflow steps", value=existing.get('context_steps','') if existing else '', key=f"{editing_pid}-Technical-context_steps")
-                    context_info_needed = st.text_area("Information needed at each step", value=existing.get('context_info_needed','') if existing else '', key=f"{editing_pid}-Technical-context_info_needed")
-                    context_decision_points = st.text_area("Decision points", value=existing.get('context_decision_points','') if existing else '', key=f"{editing_pid}-Technical-context_decision_points")
-                    context_partner_impact = st.text_area("Impact on partner timeline", value=existing.get('context_partner_impact','') if existing else '', key=f"{editing_pid}-Technical-context_partner_impact")
-                    context_partner_confidence = st.text_area("What builds partner confidence", value=existing.get('context_partner_confidence','') if existing else '', key=f"{editing_pid}-Technical-context_partner_confidence")
-                    context_partner_frustration = st.text_area("Where partners get frustrated", value=existing.get('context_partner_frustration','') if existing else '', key=f"{editing_pid}-Technical-context_partner_frustration")
-
-                    # Part 2: Product Portfolio Review
-                    st.markdown("**Part 2: Product Portfolio Review**")
-                    product_purpose = st.text_area("Purpose of product", value=existing.get('product_purpose','') if existing else '', key=f"{editing_pid}-Technical-product_purpose")
-                    product_why_created = st.text_area("Why was it created?", value=existing.get('product_why_created','') if existing else '', key=f"{editing_pid}-Technical-product_why_created")
-                    product_impact = st.text_area("Business impact when product works well vs not", value=existing.get('product_impact','') if existing else '', key=f"{editing_pid}-Technical-product_impact")
-                    product_time_saved = st.text_area("Time saved/lost", value=existing.get('product_time_saved','') if existing else '', key=f"{editing_pid}-Technical-product_time_saved")
-                    product_quality = st.text_area("Quality of decisions", value=existing.get('product_quality','') if existing else '', key=f"{editing_pid}-Technical-product_quality")
-                    product_partner_confidence = st.text_area("Partner confidence", value=existing.get('product_partner_confidence','') if existing else '', key=f"{editing_pid}-Technical-product_partner_confidence")
-
-                    # Section B.1: Use overview
-                    st.markdown("**Section B.1: Use overview**")
-                    use_purpose = st.text_area("What do you use the product for?", value=existing.get('use_purpose','') if existing else '', key=f"{editing_pid}-Technical-use_purpose")
-                    use_frequency = st.text_area("How often do you use it?", value=existing.get('use_frequency','') if existing else '', key=f"{editing_pid}-Technical-use_frequency")
-                    use_who = st.text_area("Who else uses it?", value=existing.get('use_who','') if existing else '', key=f"{editing_pid}-Technical-use_who")
-                    use_workflow_stage = st.text_area("Where does this fit in your workflow?", value=existing.get('use_workflow_stage','') if existing else '', key=f"{editing_pid}-Technical-use_workflow_stage")
-                    use_decisions = st.text_area("What decisions do you make based on this product's outputs?", value=existing.get('use_decisions','') if existing else '', key=f"{editing_pid}-Technical-use_decisions")
-                    use_critical = st.text_area("Are those critical decisions?", value=existing.get('use_critical','') if existing else '', key=f"{editing_pid}-Technical-use_critical")
-                    use_confidence = st.text_area("Do you have confidence in the outputs?", value=existing.get('use_confidence','') if existing else '', key=f"{editing_pid}-Technical-use_confidence")
-                    use_decisions_without = st.text_area("Have you ever made decisions without this product? Why?", value=existing.get('use_decisions_without','') if existing else '', key=f"{editing_pid}-Technical-use_decisions_without")
-                    use_not_direct = st.text_area("Why do you not use this product directly?", value=existing.get('use_not_direct','') if existing else '', key=f"{editing_pid}-Technical-use_not_direct")
-
-                    # Section B.2: Pain Points & Gaps
-                    st.markdown("**Section B.2: Pain Points & Gaps**")
-                    pain_frustrations = st.text_area("What frustrates you about this product or process?", value=existing.get('pain_frustrations','') if existing else '', key=f"{editing_pid}-Technical-pain_frustrations")
-                    pain_slows = st.text_area("What slows you down?", value=existing.get('pain_slows','') if existing else '', key=f"{editing_pid}-Technical-pain_slows")
-                    pain_extra_work = st.text_area("What creates extra work?", value=existing.get('pain_extra_work','') if existing else '', key=f"{editing_pid}-Technical-pain_extra_work")
-                    pain_rework = st.text_area("What causes rework or errors?", value=existing.get('pain_rework','') if existing else '', key=f"{editing_pid}-Technical-pain_rework")
-                    pain_missing_content = st.text_area("Are the outputs accurate, complete, useful?", value=existing.get('pain_missing_content','') if existing else '', key=f"{editing_pid}-Technical-pain_missing_content")
-                    pain_timeline = st.text_area("Does it deliver results fast enough?", value=existing.get('pain_timeline','') if existing else '', key=f"{editing_pid}-Technical-pain_timeline")
-                    pain_usability = st.text_area("Is it easy to use or does it require special skills?", value=existing.get('pain_usability','') if existing else '', key=f"{editing_pid}-Technical-pain_usability")
-                    pain_info_needed = st.text_area("Information you need but can't get?", value=existing.get('pain_info_needed','') if existing else '', key=f"{editing_pid}-Technical-pain_info_needed")
-                    pain_decisions_needed = st.text_area("Decisions you need to make but lack data for?", value=existing.get('pain_decisions_needed','') if existing else '', key=f"{editing_pid}-Technical-pain_decisions_needed")
-                    pain_manual_work = st.text_area("Manual work you do that should be automated?", value=existing.get('pain_manual_work','') if existing else '', key=f"{editing_pid}-Technical-pain_manual_work")
-                    pain_workarounds = st.text_area("Do you have workarounds or manual processes to deal with limitations?", value=existing.get('pain_workarounds','') if existing else '', key=f"{editing_pid}-Technical-pain_workarounds")
-                    pain_time_added = st.text_area("How much time do they add?", value=existing.get('pain_time_added','') if existing else '', key=f"{editing_pid}-Technical-pain_time_added")
-                    pain_why_necessary = st.text_area("Why are they necessary?", value=existing.get('pain_why_necessary','') if existing else '', key=f"{editing_pid}-Technical-pain_why_necessary")
-
-                else:
-                    # Technical session — comprehensive form per provided structure
-                    with st.expander("Part 1: Developer’s Product Overview", expanded=False):
-                        overview_product_desc = st.text_area("What is the product and why does it exist?", value=(part1.get('overview_product_desc', '') if existing else ''), key=f"{editing_pid}-Technical-overview_product_desc")
-                        overview_problem_solved = st.text_area("What problems does it solve?", value=(part1.get('overview_problem_solved', '') if existing else ''), key=f"{editing_pid}-Technical-overview_problem_solved")
-                        overview_process_fit = st.text_area("Where does it fit in the delivery process?", value=(part1.get('overview_process_fit', '') if existing else ''), key=f"{editing_pid}-Technical-overview_process_fit")
-
-                        overview_history = st.text_area("History & evolution", value=(part1.get('overview_history', '') if existing else ''), key=f"{editing_pid}-Technical-overview_history")
-                        overview_alignment = st.text_area("Alignment notes from other participants", value=(part1.get('overview_alignment', '') if existing else ''), key=f"{editing_pid}-Technical-overview_alignment")
-
-                    with st.expander("Part 2: Development Deep-Dive", expanded=False):
-                        st.markdown("#### A. Technical Stack")
-                        tech_languages_versions = st.text_area("Languages & versions", value=(part2.get('tech_languages_versions', '') if existing else ''), key=f"{editing_pid}-Technical-tech_languages_versions")
-                        tech_frameworks_libs = st.text_area("Frameworks & libraries", value=(part2.get('tech_frameworks_libs', '') if existing else ''), key=f"{editing_pid}-Technical-tech_frameworks_libs")
-                        tech_commercial_tools = st.text_area("Commercial packages/tools", value=(part2.get('tech_commercial_tools', '') if existing else ''), key=f"{editing_pid}-Technical-tech_commercial_tools")
-                        tech_dependencies_external = st.text_area("External dependencies/services", value=(part2.get('tech_dependencies_external', '') if existing else ''), key=f"{editing_pid}-Technical-tech_dependencies_external")
-                        tech_dependencies_internal = st.text_area("Internal dependencies (Nuton systems)", value=(part2.get('tech_dependencies_internal', '') if existing else ''), key=f"{editing_pid}-Technical-tech_dependencies_internal")
-                        tech_runtime_env = st.text_area("Intended runtime (local/server/cloud)", value=(part2.get('tech_runtime_env', '') if existing else ''), key=f"{editing_pid}-Technical-tech_runtime_env")
-                        tech_os_requirements = st.text_area("OS requirements", value=(part2.get('tech_os_requirements', '') if existing else ''), key=f"{editing_pid}-Technical-tech_os_requirements")
-                        tech_hardware_needs = st.text_area("Special hardware needs", value=(part2.get('tech_hardware_needs', '') if existing else ''), key=f"{editing_pid}-Technical-tech_hardware_needs")
-
-                        st.markdown("#### B. Development Environment & Practices")
-                        dev_feature_request = st.text_area("How are features requested and prioritized?", value=(part3.get('dev_feature_request', '') if existing else ''), key=f"{editing_pid}-Technical-dev_feature_request")
-                        dev_roadmap = st.text_area("Roadmap (exists/how managed)", value=(part3.get('dev_roadmap', '') if existing else ''), key=f"{editing_pid}-Technical-dev_roadmap")
-                        dev_version_control = st.text_area("Version control (tool/location)", value=(part3.get('dev_version_control', '') if existing else ''), key=f"{editing_pid}-Technical-dev_version_control")
-                        dev_code_reviews = st.text_area("Code reviews", value=(part3.get('dev_code_reviews', '') if existing else ''), key=f"{editing_pid}-Technical-dev_code_reviews")
-                        dev_testing = st.text_area("Testing approach (unit/integration/regression/manual)", value=(part3.get('dev_testing', '') if existing else ''), key=f"{editing_pid}-Technical-dev_testing")
-                        dev_docs = st.text_area("Documentation approach", value=(part3.get('dev_docs', '') if existing else ''), key=f"{editing_pid}-Technical-dev_docs")
-                        dev_deploy_process = st.text_area("Deploy process & frequency", value=(part3.get('dev_deploy_process', '') if existing else ''), key=f"{editing_pid}-Technical-dev_deploy_process")
-                        dev_deploy_roles = st.text_area("Who can deploy", value=(part3.get('dev_deploy_roles', '') if existing else ''), key=f"{editing_pid}-Technical-dev_deploy_roles")
-                        dev_deploy_duration = st.text_area("Deployment duration", value=(part3.get('dev_deploy_duration', '') if existing else ''), key=f"{editing_pid}-Technical-dev_deploy_duration")
-                        dev_operator_coordination = st.text_area("Coordination with Operators during deploys", value=(part3.get('dev_operator_coordination', '') if existing else ''), key=f"{editing_pid}-Technical-dev_operator_coordination")
-                        dev_operator_comms = st.text_area("Operator comms about changes", value=(part3.get('dev_operator_comms', '') if existing else ''), key=f"{editing_pid}-Technical-dev_operator_comms")
-
-                        st.markdown("#### C. Technical Challenges")
-                        challenges_limitations = st.text_area("Technical limitations/constraints", value=(part4.get('challenges_limitations', '') if existing else ''), key=f"{editing_pid}-Technical-challenges_limitations")
-                        challenges_rewrite = st.text_area("What would you do differently if rebuilding?", value=(part4.get('challenges_rewrite', '') if existing else ''), key=f"{editing_pid}-Technical-challenges_rewrite")
-                        challenges_tech_debt = st.text_area("Technical debt / issues", value=(part4.get('challenges_tech_debt', '') if existing else ''), key=f"{editing_pid}-Technical-challenges_tech_debt")
-                        challenges_maintainability = st.text_area("Who else could maintain / training time", value=(part4.get('challenges_maintainability', '') if existing else ''), key=f"{editing_pid}-Technical-challenges_maintainability")
-                        challenges_docs_training = st.text_area("Docs availability / training", value=(part4.get('challenges_docs_training', '') if existing else ''), key=f"{editing_pid}-Technical-challenges_docs_training")
-
-                    with st.expander("Part 3: Operation Deep-Dive", expanded=False):
-                        st.markdown("#### A. Usage & Access")
-                        usage_frequency = st.text_area("Usage frequency (daily/weekly/per project)", value=(part5_usage.get('usage_frequency', '') if existing else ''), key=f"{editing_pid}-Technical-usage_frequency")
-                        usage_tasks = st.text_area("Tasks performed", value=(part5_usage.get('usage_tasks', '') if existing else ''), key=f"{editing_pid}-Technical-usage_tasks")
-                        usage_duration = st.text_area("Typical duration", value=(part5_usage.get('usage_duration', '') if existing else ''), key=f"{editing_pid}-Technical-usage_duration")
-                        access_method = st.text_area("Access method (desktop/web/CLI)", value=(part5_usage.get('access_method', '') if existing else ''), key=f"{editing_pid}-Technical-access_method")
-                        access_permissions = st.text_area("Access/permissions needed", value=(part5_usage.get('access_permissions', '') if existing else ''), key=f"{editing_pid}-Technical-access_permissions")
-                        access_locations = st.text_area("Locations usable (any/specific)", value=(part5_usage.get('access_locations', '') if existing else ''), key=f"{editing_pid}-Technical-access_locations")
-                        training_type = st.text_area("Training type & provider", value=(part5_usage.get('training_type', '') if existing else ''), key=f"{editing_pid}-Technical-training_type")
-                        training_duration = st.text_area("Time to proficiency", value=(part5_usage.get('training_duration', '') if existing else ''), key=f"{editing_pid}-Technical-training_duration")
-                        training_docs = st.text_area("Docs/user guides availability", value=(part5_usage.get('training_docs', '') if existing else ''), key=f"{editing_pid}-Technical-training_docs")
-
-                        st.markdown("#### B. Pain Points & Workarounds")
-                        ops_pain_points = st.text_area("Biggest frustrations", value=(part5_pain.get('ops_pain_points', '') if existing else ''), key=f"{editing_pid}-Technical-ops_pain_points")
-                        ops_slowdowns = st.text_area("Where it slows you down / extra work", value=(part5_pain.get('ops_slowdowns', '') if existing else ''), key=f"{editing_pid}-Technical-ops_slowdowns")
-                        ops_workarounds = st.text_area("Workarounds / manual steps", value=(part5_pain.get('ops_workarounds', '') if existing else ''), key=f"{editing_pid}-Technical-ops_workarounds")
-                        ops_failure_detection = st.text_area("Failure detection (how you know)", value=(part5_pain.get('ops_failure_detection', '') if existing else ''), key=f"{editing_pid}-Technical-ops_failure_detection")
-                        ops_self_debug = st.text_area("Self-debug info used", value=(part5_pain.get('ops_self_debug', '') if existing else ''), key=f"{editing_pid}-Technical-ops_self_debug")
-                        ops_support_contact = st.text_area("Who you contact for help", value=(part5_pain.get('ops_support_contact', '') if existing else ''), key=f"{editing_pid}-Technical-ops_support_contact")
-                        ops_resolution_time = st.text_area("Typical resolution time", value=(part5_pain.get('ops_resolution_time', '') if existing else ''), key=f"{editing_pid}-Technical-ops_resolution_time")
-                        ops_missing_features = st.text_area("Missing features / wishlist", value=(part5_pain.get('ops_missing_features', '') if existing else ''), key=f"{editing_pid}-Technical-ops_missing_features")
-
-                        st.markdown("#### C. Gap Analysis")
-                        gap_output_quality = st.text_area("Output content/quality sufficiency", value=(part5_gap.get('gap_output_quality', '') if existing else ''), key=f"{editing_pid}-Technical-gap_output_quality")
-                        gap_timeline_speed = st.text_area("Timeline/speed sufficiency", value=(part5_gap.get('gap_timeline_speed', '') if existing else ''), key=f"{editing_pid}-Technical-gap_timeline_speed")
-                        gap_unavailability = st.text_area("Times you need but can't use; why", value=(part5_gap.get('gap_unavailability', '') if existing else ''), key=f"{editing_pid}-Technical-gap_unavailability")
-                        gap_alternatives = st.text_area("Alternative methods used; when/why", value=(part5_gap.get('gap_alternatives', '') if existing else ''), key=f"{editing_pid}-Technical-gap_alternatives")
-
-                    with st.expander("Part 4: Data and Integration", expanded=False):
-                        st.markdown("#### A. Data Inputs")
-                        data_inputs_sources = st.text_area("Sources", value=(part6_inputs.get('data_inputs_sources', '') if existing else ''), key=f"{editing_pid}-Technical-data_inputs_sources")
-                        data_inputs_format = st.text_area("Formats", value=(part6_inputs.get('data_inputs_format', '') if existing else ''), key=f"{editing_pid}-Technical-data_inputs_format")
-                        data_inputs_frequency = st.text_area("Frequency", value=(part6_inputs.get('data_inputs_frequency', '') if existing else ''), key=f"{editing_pid}-Technical-data_inputs_frequency")
-                        data_inputs_ingestion = st.text_area("Ingestion process (auto/manual)", value=(part6_inputs.get('data_inputs_ingestion', '') if existing else ''), key=f"{editing_pid}-Technical-data_inputs_ingestion")
-                        data_inputs_time = st.text_area("Time to ingest", value=(part6_inputs.get('data_inputs_time', '') if existing else ''), key=f"{editing_pid}-Technical-data_inputs_time")
-                        data_inputs_prep = st.text_area("Preparation/cleaning", value=(part6_inputs.get('data_inputs_prep', '') if existing else ''), key=f"{editing_pid}-Technical-data_inputs_prep")
-                        data_inputs_failure = st.text_area("Behavior if wrong/missing/delayed", value=(part6_inputs.get('data_inputs_failure', '') if existing else ''), key=f"{editing_pid}-Technical-data_inputs_failure")
-                        data_inputs_volume = st.text_area("Volume (records, sizes)", value=(part6_inputs.get('data_inputs_volume', '') if existing else ''), key=f"{editing_pid}-Technical-data_inputs_volume")
-                        data_inputs_growth = st.text_area("Growth rate", value=(part6_inputs.get('data_inputs_growth', '') if existing else ''), key=f"{editing_pid}-Technical-data_inputs_growth")
-                        data_inputs_retention = st.text_area("Retention (how long kept)", value=(part6_inputs.get('data_inputs_retention', '') if existing else ''), key=f"{editing_pid}-Technical-data_inputs_retention")
-
-                        st.markdown("#### B. Data Outputs")
-                        data_outputs_types = st.text_area("Outputs produced", value=(part6_outputs.get('data_outputs_types', '') if existing else ''), key=f"{editing_pid}-Technical-data_outputs_types")
-                        data_outputs_destinations = st.text_area("Destinations / consumers", value=(part6_outputs.get('data_outputs_destinations', '') if existing else ''), key=f"{editing_pid}-Technical-data_outputs_destinations")
-                        data_outputs_format = st.text_area("Formats & delivery", value=(part6_outputs.get('data_outputs_format', '') if existing else ''), key=f"{editing_pid}-Technical-data_outputs_format")
-                        data_outputs_export = st.text_area("Export process; time; reformatting", value=(part6_outputs.get('data_outputs_export', '') if existing else ''), key=f"{editing_pid}-Technical-data_outputs_export")
-                        data_outputs_post = st.text_area("Post-process usage", value=(part6_outputs.get('data_outputs_post', '') if existing else ''), key=f"{editing_pid}-Technical-data_outputs_post")
-                        data_outputs_retention = st.text_area("Output retention", value=(part6_outputs.get('data_outputs_retention', '') if existing else ''), key=f"{editing_pid}-Technical-data_outputs_retention")
-
-                        st.markdown("#### C. Data Storage")
-                        data_storage_locations = st.text_area("Storage locations (DB, Databricks, filesystem)", value=(part6_storage.get('data_storage_locations', '') if existing else ''), key=f"{editing_pid}-Technical-data_storage_locations")
-                        data_storage_access = st.text_area("Access controls", value=(part6_storage.get('data_storage_access', '') if existing else ''), key=f"{editing_pid}-Technical-data_storage_access")
-                        data_storage_backup = st.text_area("Backup approach", value=(part6_storage.get('data_storage_backup', '') if existing else ''), key=f"{editing_pid}-Technical-data_storage_backup")
-                        data_storage_recovery = st.text_area("Recovery approach", value=(part6_storage.get('data_storage_recovery', '') if existing else ''), key=f"{editing_pid}-Technical-data_storage_recovery")
-
-                        st.markdown("#### D. Integration Points")
-                        integrations_nuton = st.text_area("Nuton products/systems integrations & reliability", value=(part6_integration.get('integrations_nuton', '') if existing else ''), key=f"{editing_pid}-Technical-integrations_nuton")
-                        integrations_external = st.text_area("External systems integrations (Databricks/PI/AVEVA/etc)", value=(part6_integration.get('integrations_external', '') if existing else ''), key=f"{editing_pid}-Technical-integrations_external")
-                        integrations_desired = st.text_area("Desired integrations not present", value=(part6_integration.get('integrations_desired', '') if existing else ''), key=f"{editing_pid}-Technical-integrations_desired")
-
-                    with st.expander("Part 5: Wrap-Up", expanded=False):
-                        # Maturity scoring sliders (1–5)
-                        maturity_dev_default = 3
-                        maturity_ops_default = 3
-                        maturity_data_default = 3
-                        maturity_integ_default = 3
-                        maturity_docs_default = 3
-                        if existing:
-                            try:
-                                maturity_dev_default = int(existing.get('maturity_development', maturity_dev_default))
-                            except Exception:
-                                pass
-                            try:
-                                maturity_ops_default = int(existing.get('maturity_operational', maturity_ops_default))
-                            except Exception:
-                                pass
-                            try:
-                                maturity_data_default = int(existing.get('maturity_data', maturity_data_default))
-                            except Exception:
-                                pass
-                            try:
-                                maturity_integ_default = int(existing.get('maturity_integration', maturity_integ_default))
-                            except Exception:
-                                pass
-                            try:
-                                maturity_docs_default = int(existing.get('maturity_documentation', maturity_docs_default))
-                            except Exception:
-                                pass
-
-                        maturity_development = st.slider("Development maturity (1–5)", min_value=1, max_value=5, value=maturity_dev_default, key=f"{editing_pid}-Technical-maturity_development")
-                        maturity_operational = st.slider("Operational maturity (1–5)", min_value=1, max_value=5, value=maturity_ops_default, key=f"{editing_pid}-Technical-maturity_operational")
-                        maturity_data = st.slider("Data maturity (1–5)", min_value=1, max_value=5, value=maturity_data_default, key=f"{editing_pid}-Technical-maturity_data")
-                        maturity_integration = st.slider("Integration maturity (1–5)", min_value=1, max_value=5, value=maturity_integ_default, key=f"{editing_pid}-Technical-maturity_integration")
-                        maturity_documentation = st.slider("Documentation maturity (1–5)", min_value=1, max_value=5, value=maturity_docs_default, key=f"{editing_pid}-Technical-maturity_documentation")
-
-                        prioritization_improvement = st.text_area("One thing to fix/improve", value=(part7.get('prioritization_improvement', '') if existing else ''), key=f"{editing_pid}-Technical-prioritization_improvement")
-                        critical_unknowns = st.text_area("Critical unknowns not asked", value=(part7.get('critical_unknowns', '') if existing else ''), key=f"{editing_pid}-Technical-critical_unknowns")
-                        predict_platform_fit = st.text_area("Fit to Predict platform vision", value=(part7.get('predict_platform_fit', '') if existing else ''), key=f"{editing_pid}-Technical-predict_platform_fit")
-                        summary_validation = st.text_area("Summary/validation notes", value=(part7.get('summary_validation', '') if existing else ''), key=f"{editing_pid}-Technical-summary_validation")
-                        quotes = st.text_area("Verbatim quotes (Speaker | timestamp | quote per line)", value='\n'.join([f"{q.get('speaker')}|{q.get('timestamp')}|{q.get('quote')}" for q in part7.get('quotes', [])]) if existing else '', key=f"{editing_pid}-Technical-quotes")
-
-                submitted = st.form_submit_button("Save Technical session")
-                if submitted:
-                    # Parse quotes
-                    qs = []
-                    for line in quotes.splitlines():
-                        if not line.strip():
-                            continue
-                        parts = [p.strip() for p in line.split("|")]
-                        qs.append({'speaker': parts[0] if parts else '', 'timestamp': parts[1] if len(parts)>1 else '', 'quote': parts[2] if len(parts)>2 else parts[-1]})
-                    
-                    # Build nested technical_session structure
-                    product_data = {
-                        'product_id': editing_pid,
-                        'product_name': display_info.get('product_name', ''),
-                        'technical_session': {
-                            'part1_overview': {
-                                'overview_product_desc': overview_product_desc,
-                                'overview_problem_solved': overview_problem_solved,
-                                'overview_process_fit': overview_process_fit,
-                                'overview_history': overview_history,
-                                'overview_alignment': overview_alignment,
-                            },
-                            'part2_technical_stack': {
-                                'tech_languages_versions': tech_languages_versions,
-                                'tech_frameworks_libs': tech_frameworks_libs,
-                                'tech_commercial_tools': tech_commercial_tools,
-                                'tech_dependencies_external': tech_dependencies_external,
-                                'tech_dependencies_internal': tech_dependencies_internal,
-                                'tech_runtime_env': tech_runtime_env,
-                                'tech_os_requirements': tech_os_requirements,
-                                'tech_hardware_needs': tech_hardware_needs,
-                            },
-                            'part3_development_deployment': {
-                                'dev_feature_request': dev_feature_request,
-                                'dev_roadmap': dev_roadmap,
-                                'dev_version_control': dev_version_control,
-                                'dev_code_reviews': dev_code_reviews,
-                                'dev_testing': dev_testing,
-                                'dev_docs': dev_docs,
-                                'dev_deploy_process': dev_deploy_process,
-                                'dev_deploy_roles': dev_deploy_roles,
-                                'dev_deploy_duration': dev_deploy_duration,
-                                'dev_operator_coordination': dev_operator_coordination,
-                                'dev_operator_comms': dev_operator_comms,
-                            },
-                            'part4_challenges': {
-                                'challenges_limitations': challenges_limitations,
-                                'challenges_rewrite': challenges_rewrite,
-                                'challenges_tech_debt': challenges_tech_debt,
-                                'challenges_maintainability': challenges_maintainability,
-                                'challenges_docs_training': challenges_docs_training,
-                            },
-                            'part5_operation_deepdive': {
-                                'usage_access': {
-                                    'usage_frequency': usage_frequency,
-                                    'usage_tasks': usage_tasks,
-                                    'usage_duration': usage_duration,
-                                    'access_method': access_method,
-                                    'access_permissions': access_permissions,
-                                    'access_locations': access_locations,
-                                    'training_type': training_type,
-                                    'training_duration': training_duration,
-                                    'training_docs': training_docs,
-                                },
-                                'pain_points_workarounds': {
-                                    'ops_pain_points': ops_pain_points,
-                                    'ops_slowdowns': ops_slowdowns,
-                                    'ops_workarounds': ops_workarounds,
-                                    'ops_failure_detection': ops_failure_detection,
-                                    'ops_self_debug': ops_self_debug,
-                                    'ops_support_contact': ops_support_contact,
-                                    'ops_resolution_time': ops_resolution_time,
-                                    'ops_missing_features': ops_missing_features,
-                                },
-                                'gap_analysis': {
-                                    'gap_output_quality': gap_output_quality,
-                                    'gap_timeline_speed': gap_timeline_speed,
-                                    'gap_unavailability': gap_unavailability,
-                                    'gap_alternatives': gap_alternatives,
-                                },
-                            },
-                            'part6_data_integration': {
-                                'data_inputs': {
-                                    'data_inputs_sources': data_inputs_sources,
-                                    'data_inputs_format': data_inputs_format,
-                                    'data_inputs_frequency': data_inputs_frequency,
-                                    'data_inputs_ingestion': data_inputs_ingestion,
-                                    'data_inputs_time': data_inputs_time,
-                                    'data_inputs_prep': data_inputs_prep,
-                                    'data_inputs_failure': data_inputs_failure,
-                                    'data_inputs_volume': data_inputs_volume,
-                                    'data_inputs_growth': data_inputs_growth,
-                                    'data_inputs_retention': data_inputs_retention,
-                                },
-                                'data_outputs': {
-                                    'data_outputs_types': data_outputs_types,
-                                    'data_outputs_destinations': data_outputs_destinations,
-                                    'data_outputs_format': data_outputs_format,
-                                    'data_outputs_export': data_outputs_export,
-                                    'data_outputs_post': data_outputs_post,
-                                    'data_outputs_retention': data_outputs_retention,
-                                },
-                                'data_storage': {
-                                    'data_storage_locations': data_storage_locations,
-                                    'data_storage_access': data_storage_access,
-                                    'data_storage_backup': data_storage_backup,
-                                    'data_storage_recovery': data_storage_recovery,
-                                },
-                                'integration_points': {
-                                    'integrations_nuton': integrations_nuton,
-                                    'integrations_external': integrations_external,
-                                    'integrations_desired': integrations_desired,
-                                },
-                            },
-                            'part7_wrapup': {
-                                'maturity_scores': {
-                                    'maturity_development': maturity_development,
-                                    'maturity_operational': maturity_operational,
-                                    'maturity_data': maturity_data,
-                                    'maturity_integration': maturity_integration,
-                                    'maturity_documentation': maturity_documentation,
-                                },
-                                'prioritization_improvement': prioritization_improvement,
-                                'critical_unknowns': critical_unknowns,
-                                'predict_platform_fit': predict_platform_fit,
-                                'summary_validation': summary_validation,
-                                'quotes': qs,
-                            },
-                        },
-                    }
-                    
-                    save_product_data(editing_pid, product_data)
-                    st.success("Saved Technical data for product")
-                    st.rerun()
-
-        # Render only Technical form
         with st.expander("Technical Session (Operator/Developer)", expanded=True):
-            render_technical_form(existing)
+            st.markdown("### Session Data")
+            # Each part is a fragment: open one to edit it and save it on its own
+            for part_key, title, groups in TECHNICAL_SESSION_PARTS:
+                render_technical_part(editing_pid, display_info.get('product_name', ''), part_key, title, groups)
 
     elif page == 'Product Business Owner Session':
         editing_pid = st.session_state.get('editing_product')
@@ -1162,9 +1233,8 @@ def main():
                 st.session_state['page'] = 'Products'
                 st.rerun()
             return
-        products = load_products()
         product_data = get_product_data(editing_pid)
-        product_info = next((p for p in products if p.get('product_id') == editing_pid), None)
+        product_info = load_product_summary(editing_pid)
         if not product_data and not product_info:
             st.error("Selected product not found. Please select another product.")
             if st.button("Go to Products"):
@@ -1184,7 +1254,10 @@ def main():
         existing_bo = (product_data or {}).get('business_owner_session', {})
 
         # Build BO form mirroring the owner-level session, but saved under the product
-        with st.form(f"bo-session-{editing_pid}"):
+        remember_form_base(f"bo-session-{editing_pid}", product_data)
+        # In autosave mode there is no form, so every change reruns the page and is handed to the autosaver below
+        autosaving = st.session_state.get('autosave')
+        with st.container() if autosaving else st.form(f"bo-session-{editing_pid}"):
             part1 = existing_bo.get('part1_context_business_process', {})
             part2 = existing_bo.get('part2_product_portfolio_review', {})
             part2a = part2.get('section_a_business_owner', {})
@@ -1334,8 +1407,8 @@ def main():
                 summary_critical_not_discussed = st.text_area("Anything critical not discussed?", value=part6.get('summary_critical_not_discussed',''), key=f"{editing_pid}-bo-summary_critical_not_discussed")
                 summary_ensure_understanding = st.text_area("Anything to ensure we understand?", value=part6.get('summary_ensure_understanding',''), key=f"{editing_pid}-bo-summary_ensure_understanding")
 
-            submitted = st.form_submit_button("Save Business Owner session")
-            if submitted:
+            submitted = False if autosaving else st.form_submit_button("Save Business Owner session")
+            if submitted or autosaving:
                 owner_session = {
                     'part1_context_business_process': {
                         'context_role': context_role,
@@ -1477,39 +1550,258 @@ def main():
                     },
                 }
 
-                save_product_data(editing_pid, {'business_owner_session': owner_session})
-                st.success("Saved Business Owner/User data for product")
-                st.rerun()
+                if autosaving:
+                    record_autosave(f"bo-session-{editing_pid}", editing_pid, {'business_owner_session': owner_session})
+                    render_autosave_status(f"bo-session-{editing_pid}")
+                else:
+                    changes = save_product_form(f"bo-session-{editing_pid}", f"{editing_pid}-bo-", editing_pid, {'business_owner_session': owner_session})
+                    if changes is not None:
+                        st.success("Saved Business Owner/User data for product" if changes else "No changes to save")
+                    st.rerun()
+        render_save_conflict(f"bo-session-{editing_pid}")
+
+    elif page == 'Progress':
+        st.header("Workshop progress")
+        # Counts are kept current by every save, so nothing here reads the session answers
+        index = get_completeness()
+        sections = index.portfolio()
+        products = [p for p in load_product_summaries() if p['product_name']]
+        filled, total = sum(r['filled'] for r in sections), sum(r['total'] for r in sections)
+        col1, col2, col3 = st.columns(3)
+        col1.metric("Products", len(products))
+        col2.metric("Fields answered", f"{100 * filled // max(1, total)}%")
+        col3.metric("Products not started", sum(1 for p in products if not index.percent(p['product_id'])))
+
+        st.subheader("By section")
+        st.dataframe(pd.DataFrame([{
+            'section': completeness.section_label(r['section']),
+            'answered': f"{r['filled']:,} / {r['total']:,}",
+            'progress': 100 * r['filled'] // max(1, r['total']),
+            'not_started': r['not_started'],
+        } for r in sections]), hide_index=True, column_config={
+            'section': "Section",
+            'answered': "Fields answered",
+            'progress': st.column_config.ProgressColumn("Progress", min_value=0, max_value=100, format="%d%%"),
+            'not_started': "Products not started",
+        })
+
+        st.subheader("By product")
+        owners = st.multiselect("Business Owner", get_repository().product_facets()['business_owner'], key="progress-owner")
+        shown = [p for p in products if not owners or p['business_owner'] in owners]
+        if not shown:
+            st.info("No products to show.")
+        else:
+            counts = index.progress([p['product_id'] for p in shown])
+            labels = {section: completeness.section_label(section) for section in index.sections}
+            matrix = pd.DataFrame([{
+                'Product': p['product_name'],
+                'Business Owner': p['business_owner'],
+                'Overall': index.percent(p['product_id']),
+                **{labels[section]: 100 * count // max(1, len(index.sections[section])) for section, count in counts[p['product_id']].items()},
+            } for p in shown]).sort_values('Overall', kind='stable')
+            # Sections nobody has started on for a product stand out
+            st.dataframe(
+                matrix.style.map(lambda v: 'background-color: #ffcdd2' if v == 0 else '', subset=list(labels.values())),
+                hide_index=True,
+                column_config={
+                    'Overall': st.column_config.ProgressColumn("Overall", min_value=0, max_value=100, format="%d%%"),
+                    **{label: st.column_config.NumberColumn(label, format="%d%%") for label in labels.values()},
+                },
+            )
+
+    elif page == 'History':
+        st.header("Revision history")
+        names = {p['product_id']: p['product_name'] or p['product_id'] for p in load_product_summaries()}
+        if st.session_state.get('history_product') not in names:
+            st.session_state['history_product'] = next(iter(names), None)
+        pid = st.selectbox("Product", list(names), format_func=names.get, key="history_product")
+        # Only this product's log is read; revisions themselves are loaded when compared or restored
+        revisions = get_history().revisions(pid) if pid else []
+        if not revisions:
+            st.info("No revisions recorded for this product yet. Every save from now on is kept here.")
+        else:
+            describe = lambda r: {'delete': "Deleted", 'create': "Created"}.get(r['op']) or ", ".join(
+                completeness.section_label(tuple(part.split('.', 1))) for part in r['parts']
+            ) or "Product details"
+            event = st.dataframe(pd.DataFrame([{
+                'revision': r['revision'],
+                'saved': datetime.fromtimestamp(r['at']).strftime('%Y-%m-%d %H:%M:%S'),
+                'changed': describe(r),
+            } for r in revisions]), hide_index=True, on_select="rerun", selection_mode="single-row",
+                key=f"history-table-{pid}-{len(revisions)}", column_config={
+                'revision': "Revision", 'saved': "Saved", 'changed': "Changed",
+            })
+            if not event.selection.rows:
+                st.caption("Select a revision to see what it changed or to restore it.")
+            else:
+                i = event.selection.rows[0]
+                chosen = revisions[i]
+                against = st.radio(
+                    "Compare", ['previous', 'current'], horizontal=True, key="history-compare",
+                    format_func={'previous': "With the revision before it", 'current': "With the latest revision"}.get,
+                )
+                if against == 'previous':
+                    old, new = (revisions[i + 1]['tree'] if i + 1 < len(revisions) else None), chosen['tree']
+                else:
+                    old, new = chosen['tree'], revisions[0]['tree']
+                changes = get_history().diff(old, new)
+                if not changes:
+                    st.info("No differences.")
+                else:
+                    st.dataframe(pd.DataFrame([{
+                        'field': '.'.join(c.path), 'before': change_cell(c.old), 'after': change_cell(c.new),
+                    } for c in changes]), hide_index=True)
+                if chosen['tree'] and i > 0 and st.button(f"Restore revision {chosen['revision']}", key="history-restore"):
+                    get_history().restore(get_writer(), pid, chosen['tree'])
+                    st.session_state['history_status'] = f"Restored revision {chosen['revision']} as a new revision."
+                    st.rerun()
+        status = st.session_state.pop('history_status', None)
+        if status:
+            st.success(status)
+
+    elif page == 'Search':
+        st.header("Search session answers")
+        query = st.text_input("Search", key="search-query", placeholder="e.g. manual Excel export, Databricks")
+        if query:
+            started = time.perf_counter()
+            hits = search.get_index(get_repository()).search(query)
+            elapsed = (time.perf_counter() - started) * 1000
+            st.caption(f"{len(hits)} product(s) found in {elapsed:.0f} ms")
+            summaries = {p['product_id']: p for p in load_product_summaries()}
+            field_parts = technical_field_parts()
+            for hit in hits:
+                render_search_hit(hit, summaries.get(hit['product_id'], {}), field_parts)
 
     elif page == 'Export Backup':
         st.header("Backup & Restore")
-        aggregated = load_aggregated_data()
+        if integrity_problems:
+            reasons = {
+                'changed': "Changed outside the app",
+                'older': "Older than its last save",
+                'missing': "Missing from the store",
+            }
+            st.error(
+                f"{len(integrity_problems)} product(s) did not match the hashes of their last save when the store was loaded. "
+                "Restore them from a backup or their History, or accept the data as it is."
+            )
+            st.dataframe(pd.DataFrame([
+                {'product': pid, 'problem': reasons[problem]} for pid, problem in integrity_problems.items()
+            ]), hide_index=True)
+            if st.button("Accept current data", key="integrity-accept"):
+                get_merkle().accept()
+                st.rerun()
         col1, col2 = st.columns(2)
         with col1:
             st.subheader("Export Backup")
-            backup_str = json.dumps(aggregated, indent=2)
-            fname = f"aggregated-backup-{datetime.now(timezone.utc).strftime('%Y%m%dT%H%M%SZ')}.json"
-            st.download_button("Download Backup (JSON)", backup_str, file_name=fname, mime="application/json")
+            formats = {'gzip': "Compressed JSON (.json.gz)", 'zstd': "Zstandard JSON (.json.zst)", 'none': "Plain JSON (.json)"}
+            compression = st.selectbox("Format", list(backup.COMPRESSIONS), format_func=formats.get, key="backup-compression")
+            # Nothing is serialized until a backup is asked for
+            if st.button("Prepare backup", key="backup-prepare"):
+                previous = st.session_state.pop('backup_export', None)
+                if previous and os.path.exists(previous['path']):
+                    os.remove(previous['path'])
+                started = time.perf_counter()
+                index = get_merkle()
+                path = backup.export_backup(get_writer(), compression, extra_meta=lambda: {'merkle': index.header()})
+                st.session_state['backup_export'] = {
+                    'path': path,
+                    'compression': compression,
+                    'file_name': f"aggregated-backup-{datetime.now(timezone.utc).strftime('%Y%m%dT%H%M%SZ')}{backup.COMPRESSIONS[compression]}",
+                    'seconds': time.perf_counter() - started,
+                }
+            export = st.session_state.get('backup_export')
+            if export and os.path.exists(export['path']):
+                st.caption(f"Prepared in {export['seconds']:.1f} s · {os.path.getsize(export['path']) / 1024:,.0f} KiB")
+                with open(export['path'], 'rb') as f:
+                    st.download_button("Download Backup", f, file_name=export['file_name'], mime=backup.MIME_TYPES[export['compression']])
         with col2:
             st.subheader("Restore Backup")
-            uploaded = st.file_uploader("Select backup JSON to restore", type=["json"], key="restore_backup")
+            uploaded = st.file_uploader("Select backup JSON to restore", type=["json", "gz", "zst"], key="restore_backup")
             if uploaded is not None:
-                try:
-                    content = uploaded.read().decode("utf-8")
-                    data = json.loads(content)
-                    # Basic validation
-                    if not isinstance(data, dict) or 'products' not in data:
-                        st.error("Invalid backup format: expected key 'products'.")
+                # Validate once per upload, streaming; the report lists every problem at once
+                report = st.session_state.get('restore_report')
+                if not report or report['file_id'] != uploaded.file_id:
+                    uploaded.seek(0)
+                    try:
+                        report = backup.check_backup(backup.open_upload(uploaded.name, uploaded), get_empty_product_template())
+                    except Exception as e:
+                        report = {'products': 0, 'schema_version': 0, 'errors': [f"Failed to read backup: {e}"], 'warnings': []}
+                    report['file_id'] = uploaded.file_id
+                    st.session_state['restore_report'] = report
+                st.caption(f"{report['products']} products in backup")
+                if report['errors']:
+                    st.error(f"{len(report['errors'])} problem(s) found; fix the backup and upload it again.")
+                    st.code('\n'.join(report['errors']), language=None)
+                if report['warnings']:
+                    with st.expander(f"{len(report['warnings'])} warning(s)"):
+                        st.code('\n'.join(report['warnings']), language=None)
+                mode = st.radio(
+                    "Restore mode",
+                    ['merge', 'replace'],
+                    format_func={'merge': "Merge into current data (add and update products)", 'replace': "Replace all data with the backup"}.get,
+                    key="restore_mode",
+                )
+                if st.button("Restore", key="restore_apply", disabled=bool(report['errors'])):
+                    uploaded.seek(0)
+                    upload = backup.open_upload(uploaded.name, uploaded)
+                    if mode == 'replace':
+                        # One atomic write: the store is either fully replaced or left as it was
+                        with st.spinner(f"Replacing all data with {report['products']} products..."):
+                            counts = backup.restore_backup(get_writer(), upload, get_empty_product_template(), report['schema_version'], mode=mode)
                     else:
-                        save_aggregated_data(data)
-                        st.success("Backup restored to aggregated.json")
-                        st.rerun()
+                        bar = st.progress(0.0)
+                        counts = backup.restore_backup(
+                            get_writer(), upload, get_empty_product_template(), report['schema_version'], mode=mode,
+                            progress=lambda done: bar.progress(min(1.0, done / max(1, report['products']))),
+                        )
+                    st.success(
+                        f"Backup restored: {counts['created']} created, {counts['updated']} updated, "
+                        f"{counts['unchanged']} unchanged, {counts['deleted']} deleted."
+                    )
+        st.divider()
+        st.subheader("Compare with backup")
+        compared = st.file_uploader("Select backup to compare with the current data", type=["json", "gz", "zst"], key="compare_backup")
+        if compared is not None:
+            # Compared again only when the upload or the store's root hash changes
+            root = get_merkle().root()
+            result = st.session_state.get('compare_result')
+            if not result or result['file_id'] != compared.file_id or result['root'] != root:
+                compared.seek(0)
+                started = time.perf_counter()
+                try:
+                    result = get_merkle().compare_backup(get_repository(), backup.iter_backup(backup.open_upload(compared.name, compared)))
                 except Exception as e:
-                    st.error(f"Failed to load backup: {e}")
+                    result = {'error': f"Failed to read backup: {e}"}
+                result.update(file_id=compared.file_id, root=root, seconds=time.perf_counter() - started)
+                st.session_state['compare_result'] = result
+            if result.get('error'):
+                st.error(result['error'])
+            else:
+                if result['used_header'] and not result['read']:
+                    st.caption(f"Compared in {result['seconds'] * 1000:.0f} ms using the backup's root hash")
+                else:
+                    st.caption(
+                        f"Compared in {result['seconds'] * 1000:.0f} ms · {result['hashed']} of {result['read']} backup products hashed"
+                        + (" (groups whose hashes match were skipped)" if result['used_header'] else "")
+                    )
+                if result['identical']:
+                    st.success("The current data matches this backup.")
+                else:
+                    metric_cols = st.columns(3)
+                    metric_cols[0].metric("Changed products", len(result['changed']))
+                    metric_cols[1].metric("Only in current data", len(result['only_in_store']))
+                    metric_cols[2].metric("Only in backup", len(result['only_in_backup']))
+                    rows = [
+                        {'product': pid, 'field': '.'.join(c.path), 'current': change_cell(c.old), 'backup': change_cell(c.new)}
+                        for pid, changes in result['changed'].items() for c in changes
+                    ]
+                    rows += [{'product': pid, 'field': "(whole product)", 'current': "present", 'backup': ""} for pid in result['only_in_store']]
+                    rows += [{'product': pid, 'field': "(whole product)", 'current': "", 'backup': "present"} for pid in result['only_in_backup']]
+                    st.dataframe(pd.DataFrame(rows), hide_index=True)
 
     elif page == "Products":
         st.header("Products (latest session only)")
-        products = load_products()
+        products = load_product_summaries()
         if not products:
             st.info("No products found yet. Create a session for a product in 'Create Session'.")
         else:
@@ -1551,14 +1843,100 @@ def main():
 
     elif page == "Export All":
         st.header("Export All Products")
-        products = load_products()
-        if not products:
+        st.caption("One row per product and one column per session field, for analysis in notebooks or spreadsheets.")
+        export = columnar.get_export(get_repository(), get_empty_product_template())
+        # Built once per store revision and shared by every session until the next save
+        df = export.frame()
+        if df.empty:
             st.info("No products to export.")
         else:
-            df = pd.DataFrame(products)
-            st.download_button("Download All Products CSV", df.to_csv(index=False), file_name="all-products.csv")
-            st.dataframe(df)
+            formats = {'csv': "CSV", 'parquet': "Parquet", 'feather': "Feather (Arrow)"}
+            fmt = st.radio("Format", list(columnar.FORMATS), format_func=formats.get, horizontal=True, key="export-all-format")
+            suffix, mime = columnar.FORMATS[fmt]
+            st.download_button(
+                f"Download All Products {formats[fmt]}", export.export(fmt),
+                file_name=f"all-products{suffix}", mime=mime, key="export-all-download",
+            )
+            st.caption(f"{len(df)} products × {len(df.columns)} columns")
+            st.dataframe(df, hide_index=True)
+
+    elif page == "Diagnostics":
+        st.header("Diagnostics")
+        if not diagnostics.ENABLED:
+            st.info("Recording is off (WORKSHOP_DIAGNOSTICS=0).")
+        files = [f for f in DATA_DIR.rglob('*') if f.is_file()]
+        col1, col2, col3 = st.columns(3)
+        col1.metric("Products", len(load_product_summaries()))
+        col2.metric("Store size", f"{sum(f.stat().st_size for f in files) / 2**20:,.1f} MiB")
+        col3.metric("Storage mode", STORAGE_MODE)
+        stats = diagnostics.snapshot()
+        if not stats:
+            st.info("Nothing recorded yet in this process.")
+        else:
+            st.caption("Since the process started (or the last reset). Latencies are estimated from log-spaced histogram buckets.")
+            st.dataframe(pd.DataFrame(stats), hide_index=True, column_config={
+                'total_s': st.column_config.NumberColumn("total (s)", format="%.3f"),
+                **{c: st.column_config.NumberColumn(c.replace('_ms', ' (ms)'), format="%.2f") for c in ['p50_ms', 'p95_ms', 'p99_ms', 'max_ms']},
+            })
+            operation = st.selectbox("Latency histogram", [row['operation'] for row in stats], key="diagnostics-operation")
+            buckets = diagnostics.histogram(operation)
+            # Trim empty buckets at both ends
+            used = [i for i, (_, count) in enumerate(buckets) if count]
+            buckets = buckets[used[0]:used[-1] + 1] if used else []
+            st.bar_chart(pd.DataFrame({
+                'latency': [f"≤ {bound * 1e3:g} ms" if bound else "longer" for bound, _ in buckets],
+                'calls': [count for _, count in buckets],
+            }), x='latency', y='calls', sort=False)
+            if st.button("Reset counters", key="diagnostics-reset"):
+                diagnostics.reset()
+                st.rerun()
+
+        st.subheader("Profiles")
+        captures = profiling.captures()
+        if not captures:
+            st.info(
+                f"No profiled reruns yet. Add ?profile=1 to the URL to profile this session's reruns (?profile=0 stops), "
+                f"or start the app with WORKSHOP_PROFILE=1 to profile every rerun. The last {profiling.KEEP} are kept."
+            )
+        else:
+            st.dataframe(pd.DataFrame([{
+                'id': c['id'],
+                'time': datetime.fromtimestamp(c['started']).strftime('%H:%M:%S'),
+                'page': c['page'],
+                'session': c['session'],
+                'seconds': round(c['seconds'], 3),
+                'peak MiB': round(c['peak_bytes'] / 2**20, 1),
+            } for c in captures]), hide_index=True)
+            capture_id = st.selectbox(
+                "Profile", [c['id'] for c in captures], key="diagnostics-profile",
+                format_func=lambda i: next(f"#{c['id']} {c['page']} ({c['seconds']:.2f} s)" for c in captures if c['id'] == i),
+            )
+            capture = profiling.get(capture_id)
+            if capture is None:
+                st.info("That profile has rotated out of the buffer.")
+            else:
+                name = f"profile-{capture['id']}-{capture['page'].lower().replace(' ', '-') or 'page'}"
+                col1, col2 = st.columns(2)
+                col1.download_button("Download .pstats", profiling.pstats_bytes(capture), file_name=f"{name}.pstats", key="diagnostics-pstats")
+                col2.download_button("Download collapsed stacks", profiling.collapsed_stacks(capture), file_name=f"{name}.folded", key="diagnostics-folded")
+                st.markdown("**Slowest functions (cumulative)**")
+                st.dataframe(pd.DataFrame(profiling.top_functions(capture)), hide_index=True)
+                st.markdown("**Largest allocation sites still alive at the end of the rerun**")
+                st.dataframe(pd.DataFrame(capture['allocations']), hide_index=True)
+
+    diagnostics.record(f"page: {page}", time.perf_counter() - page_started)
+
+
+def run_main():
+    """Run main(), under the profiler when WORKSHOP_PROFILE=1 or this session asked for it with ?profile=1."""
+    flag = st.query_params.get('profile')
+    if flag is not None:
+        st.session_state['profile'] = flag not in ('0', 'off', 'false')
+    if not (profiling.ENABLED or st.session_state.get('profile')):
+        return main()
+    session = st.session_state.setdefault('profile_session', uuid.uuid4().hex[:8])
+    return profiling.run(main, lambda: st.session_state.get('page', ''), session)
 
 
 if __name__ == '__main__':
-    main()
+    run_main()
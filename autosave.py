@@ -0,0 +1,169 @@
+"""Debounced autosave of session answers.
+
+In autosave mode the session editors hand their current answers to
+Autosaver.record() on every widget change. The edits are held in memory
+per browser session and form, and a background thread writes them once the
+form has been quiet for DEBOUNCE_SECONDS, or MAX_DELAY_SECONDS after its
+first unsaved edit while typing goes on. flush() writes a session's edits
+straight away; the app calls close() when the user navigates. Every flush is one
+StoreWriter call holding all due edits, i.e. one merged write (one journal
+fsync or transaction), not a write per keystroke.
+
+Only fields the user changed from the values the editor was opened with
+are written, so answers someone else saved meanwhile survive unless this
+user changed the same field.
+"""
+import atexit
+import logging
+import os
+import threading
+import time
+
+import storage
+
+logger = logging.getLogger(__name__)
+
+DEBOUNCE_SECONDS = float(os.environ.get("WORKSHOP_AUTOSAVE_DEBOUNCE", "2"))
+MAX_DELAY_SECONDS = 10.0
+
+
+class Autosaver:
+    """Pending edits per (browser session, form), written by one flush thread."""
+
+    def __init__(self, writer, template):
+        self.writer = writer
+        self.template = template
+        self._cond = threading.Condition()
+        # Held from taking edits until they are durable, so an older flush can never land after a newer one
+        self._write_lock = threading.Lock()
+        self._forms = {}  # (session, form_key) -> {"product_id", "touched", "recorded"}
+        self._pending = {}  # (session, form_key) -> {"product_id", "patch", "first", "last"}
+        self._status = {}  # session -> {"saved_at", "error"}
+        self._thread = threading.Thread(target=self._run, name="autosave-flush", daemon=True)
+        self._thread.start()
+
+    def record(self, session, form_key, product_id, base, values):
+        """Buffer the current answers of a form; base holds the values it was opened with.
+
+        Leaves of values that differ from base are saved, and so is every
+        leaf this form changed before, so reverting a field saves it too.
+        """
+        changed = {
+            path for path, value in storage.iter_leaves(values)
+            if not storage.same_answer(value, _get(base, path))
+        }
+        key = (session, form_key)
+        with self._cond:
+            form = self._forms.setdefault(key, {"product_id": product_id, "touched": set(), "recorded": {}})
+            form["touched"] |= changed
+            patch = storage.changes_to_patch([storage.Change(path, None, _get(values, path)) for path in sorted(form["touched"])])
+            if patch == form["recorded"]:
+                return
+            form["recorded"] = patch
+            now = time.monotonic()
+            entry = self._pending.setdefault(key, {"product_id": product_id, "first": now})
+            entry.update(patch=patch, last=now)
+            self._cond.notify()
+
+    def close(self, session):
+        """Write a session's pending edits and forget its forms, e.g. when the user leaves the page."""
+        self.flush(session)
+        with self._cond:
+            for key in [key for key in self._forms if key[0] == session]:
+                del self._forms[key]
+
+    def pending(self, session):
+        """Number of fields of this session waiting to be written."""
+        with self._cond:
+            return sum(
+                sum(1 for _ in storage.iter_leaves(entry["patch"]))
+                for (owner, _), entry in self._pending.items() if owner == session
+            )
+
+    def status(self, session):
+        """{"saved_at": time.time() of the last write or None, "error": message of a failed one or None}."""
+        with self._cond:
+            return dict(self._status.get(session, {"saved_at": None, "error": None}))
+
+    def flush(self, session=None):
+        """Write the pending edits of one session (all sessions if None) now, and wait until they are durable."""
+        with self._write_lock:
+            with self._cond:
+                keys = [key for key in self._pending if session is None or key[0] == session]
+                entries = {key: self._pending.pop(key) for key in keys}
+            self._write(entries)
+
+    def _run(self):
+        while True:
+            with self._write_lock:
+                with self._cond:
+                    now = time.monotonic()
+                    due = {
+                        key: entry for key, entry in self._pending.items()
+                        if now - entry["last"] >= DEBOUNCE_SECONDS or now - entry["first"] >= MAX_DELAY_SECONDS
+                    }
+                    for key in due:
+                        del self._pending[key]
+                self._write(due)
+            with self._cond:
+                if not self._pending:
+                    self._cond.wait()
+                    continue
+                now = time.monotonic()
+                wake = min(min(e["last"] + DEBOUNCE_SECONDS, e["first"] + MAX_DELAY_SECONDS) for e in self._pending.values())
+                self._cond.wait(max(0.05, wake - now))
+
+    def _write(self, entries):
+        if not entries:
+            return
+        # Edits of several forms or sessions to one product become one patch, later edits winning
+        patches = {}
+        for _, entry in sorted(entries.items(), key=lambda item: item[1]["last"]):
+            _merge(patches.setdefault(entry["product_id"], {}), entry["patch"])
+        template = self.template
+        try:
+            self.writer.submit(lambda repo: [repo.save_product(pid, patch, template=template) for pid, patch in patches.items()])
+        except Exception as e:
+            logger.exception("Autosave failed; retrying in %s s", DEBOUNCE_SECONDS)
+            with self._cond:
+                for key, entry in entries.items():
+                    # Keep a newer edit that came in while this write was failing
+                    self._pending.setdefault(key, dict(entry, last=time.monotonic()))
+                    self._status[key[0]] = dict(self._status.get(key[0], {"saved_at": None}), error=str(e))
+            return
+        with self._cond:
+            for session in {key[0] for key in entries}:
+                self._status[session] = {"saved_at": time.time(), "error": None}
+
+
+def _get(data, path):
+    for key in path:
+        if not isinstance(data, dict) or key not in data:
+            return None
+        data = data[key]
+    return data
+
+
+def _merge(target, patch):
+    # Dicts are copied, as the patches are still the forms' recorded values
+    for key, value in patch.items():
+        if isinstance(value, dict):
+            if not isinstance(target.get(key), dict):
+                target[key] = {}
+            _merge(target[key], value)
+        else:
+            target[key] = value
+
+
+_autosavers = {}
+_autosavers_lock = threading.Lock()
+
+
+def get_autosaver(writer, template):
+    """The process-wide autosaver feeding writer; whatever is pending is flushed when the process exits."""
+    with _autosavers_lock:
+        autosaver = _autosavers.get(id(writer))
+        if autosaver is None:
+            autosaver = _autosavers[id(writer)] = Autosaver(writer, template)
+            atexit.register(autosaver.flush)
+        return autosaver
@@ -0,0 +1,386 @@
+"""Streaming backup export and restore for the workshop store.
+
+A backup is the aggregated document (``{"products": {...}, ...}``), the same
+shape as data/aggregated.json. It is written one product at a time straight
+into a (optionally compressed) temp file, and read back the same way: the
+restore pipeline pull-parses the upload product by product, so memory stays
+at about one product whatever the size of the backup.
+"""
+import codecs
+import gzip
+import json
+import os
+import tempfile
+import time
+from collections import Counter
+
+import merkle
+import migrations
+
+try:
+    import zstandard
+except ImportError:  # optional: pip install zstandard
+    zstandard = None
+
+EXPORT_PREFIX = "workshop-backup-"
+# Prepared exports older than this are removed the next time one is made
+EXPORT_MAX_AGE = 3600
+
+# Compression name -> file suffix
+COMPRESSIONS = {"gzip": ".json.gz", "none": ".json"}
+if zstandard is not None:
+    COMPRESSIONS["zstd"] = ".json.zst"
+
+MIME_TYPES = {"gzip": "application/gzip", "none": "application/json", "zstd": "application/zstd"}
+
+
+def _dumps(value):
+    # Compact encoding: no indentation or spaces, non-ASCII text kept as UTF-8
+    return json.dumps(value, ensure_ascii=False, separators=(",", ":"))
+
+
+def iter_backup_chunks(source, extra_meta=None):
+    """Yield the backup document as text chunks, one product per chunk; extra_meta adds top-level fields.
+
+    source is a repository or a storage.StoreSnapshot of one.
+    """
+    yield "{"
+    for key, value in dict(source.document_meta(), **(extra_meta or {})).items():
+        yield f"{_dumps(key)}:{_dumps(value)},"
+    yield '"products":{'
+    separator = ""
+    for pid, product in source.iter_products():
+        yield f"{separator}{_dumps(pid)}:{_dumps(product)}"
+        separator = ","
+    yield "}}"
+
+
+def open_compressed(path, compression, mode="rb"):
+    """Open a backup file for binary reading or writing with the given compression."""
+    if compression == "gzip":
+        # A low level is much faster and costs little on repetitive JSON
+        return gzip.open(path, mode, compresslevel=5)
+    if compression == "zstd":
+        if zstandard is None:
+            raise ValueError("zstd backups need the optional 'zstandard' package")
+        if "w" in mode:
+            return zstandard.ZstdCompressor(level=3).stream_writer(open(path, "wb"))
+        return zstandard.ZstdDecompressor().stream_reader(open(path, "rb"))
+    if compression == "none":
+        return open(path, mode)
+    raise ValueError(f"Unknown backup compression {compression!r}")
+
+
+def write_backup(source, path, compression="gzip", extra_meta=None):
+    """Stream a repository or storage.StoreSnapshot into a backup file at path."""
+    with open_compressed(path, compression, "wb") as out:
+        for chunk in iter_backup_chunks(source, extra_meta):
+            out.write(chunk.encode("utf-8"))
+
+
+def open_upload(name, fileobj):
+    """Wrap an uploaded backup in a decompressing binary reader chosen by its file name."""
+    if name.endswith(".gz"):
+        return gzip.GzipFile(fileobj=fileobj, mode="rb")
+    if name.endswith(".zst"):
+        if zstandard is None:
+            raise ValueError("zstd backups need the optional 'zstandard' package")
+        return zstandard.ZstdDecompressor().stream_reader(fileobj)
+    return fileobj
+
+
+def export_backup(writer, compression="gzip", directory=None, extra_meta=None):
+    """Write a backup of the writer's repository to a new temp file and return its path.
+
+    A snapshot of the store is taken between two write batches (see
+    storage.StoreWriter.read()), then encoded and compressed on the calling
+    thread, so saves and page reads carry on while the file is written.
+    extra_meta, a function returning more top-level fields (e.g. the Merkle
+    header), is called together with taking the snapshot, so those fields
+    describe exactly the exported products.
+    """
+    cleanup_exports(directory)
+    fd, path = tempfile.mkstemp(prefix=EXPORT_PREFIX, suffix=COMPRESSIONS[compression], dir=directory)
+    os.close(fd)
+    try:
+        meta, snapshot = writer.read(lambda repo: (extra_meta and extra_meta(), repo.snapshot()))
+        with snapshot:
+            write_backup(snapshot, path, compression, meta)
+    except BaseException:
+        os.remove(path)
+        raise
+    return path
+
+
+def cleanup_exports(directory=None, max_age=EXPORT_MAX_AGE):
+    """Remove prepared exports that are older than max_age seconds."""
+    directory = directory or tempfile.gettempdir()
+    cutoff = time.time() - max_age
+    for name in os.listdir(directory):
+        if name.startswith(EXPORT_PREFIX):
+            path = os.path.join(directory, name)
+            try:
+                if os.path.getmtime(path) < cutoff:
+                    os.remove(path)
+            except OSError:
+                pass
+
+
+class BackupFormatError(ValueError):
+    """The backup is not a well-formed aggregated document."""
+
+
+class _JsonStream:
+    """Pull parser for the top two levels of a JSON document, read in chunks.
+
+    Values below that (a product, a top-level field) are decoded whole with
+    json, so the buffer only ever holds about one of them.
+    """
+
+    CHUNK = 1 << 20
+
+    def __init__(self, fileobj, max_value_chars):
+        self._file = fileobj
+        self._decoder = codecs.getincrementaldecoder("utf-8")()
+        self._max_value_chars = max_value_chars
+        self._buf = ""
+        self._pos = 0
+        self._eof = False
+
+    def _more(self):
+        if self._eof:
+            return False
+        data = self._file.read(self.CHUNK)
+        self._buf = self._buf[self._pos:] + self._decoder.decode(data or b"", final=not data)
+        self._pos = 0
+        self._eof = not data
+        return True
+
+    def peek(self):
+        """Return the next non-blank character without consuming it ('' at the end)."""
+        while True:
+            while self._pos < len(self._buf) and self._buf[self._pos] in " \t\r\n":
+                self._pos += 1
+            if self._pos < len(self._buf):
+                return self._buf[self._pos]
+            if not self._more():
+                return ""
+
+    def expect(self, char, what):
+        found = self.peek()
+        if found != char:
+            raise BackupFormatError(f"Expected {what}, found {found or 'end of file'!r}")
+        self._pos += 1
+
+    def value(self):
+        self.peek()
+        while True:
+            try:
+                value, end = json.JSONDecoder().raw_decode(self._buf, self._pos)
+            except json.JSONDecodeError as e:
+                if self._eof:
+                    raise BackupFormatError(f"Invalid JSON: {e.msg}") from None
+                if len(self._buf) - self._pos > self._max_value_chars:
+                    raise BackupFormatError(f"A value is larger than {self._max_value_chars:,} characters") from None
+                self._more()
+                continue
+            # A number cut off at the end of the buffer may continue in the next chunk
+            if end == len(self._buf) and self._more():
+                continue
+            self._pos = end
+            return value
+
+
+def iter_backup(fileobj, max_value_chars=64 << 20):
+    """Yield ("meta", key, value) and ("product", product_id, product) from a backup, one at a time."""
+    stream = _JsonStream(fileobj, max_value_chars)
+    stream.expect("{", "a JSON object")
+    if stream.peek() == "}":
+        stream.expect("}", "'}'")
+    else:
+        while True:
+            key = stream.value()
+            if not isinstance(key, str):
+                raise BackupFormatError("Expected a field name")
+            stream.expect(":", "':'")
+            if key == "products":
+                if stream.peek() != "{":
+                    raise BackupFormatError("'products' must be an object keyed by product id")
+                stream.expect("{", "'{'")
+                if stream.peek() == "}":
+                    stream.expect("}", "'}'")
+                else:
+                    while True:
+                        pid = stream.value()
+                        stream.expect(":", "':'")
+                        yield "product", pid, stream.value()
+                        if stream.peek() != ",":
+                            stream.expect("}", "',' or '}' after a product")
+                            break
+                        stream.expect(",", "','")
+            else:
+                yield "meta", key, stream.value()
+            if stream.peek() != ",":
+                stream.expect("}", "',' or '}'")
+                break
+            stream.expect(",", "','")
+    if stream.peek():
+        raise BackupFormatError("Unexpected data after the backup document")
+
+
+def _kind(value):
+    if isinstance(value, dict):
+        return "an object"
+    if isinstance(value, list):
+        return "a list"
+    if isinstance(value, str):
+        return "text"
+    if isinstance(value, bool):
+        return "true/false"
+    if isinstance(value, (int, float)):
+        return "a number"
+    return "null"
+
+
+def _check(template, value, path, pid, errors, warnings):
+    for key, item in value.items():
+        where = f"{pid}: {' › '.join(path + (key,))}"
+        if key not in template:
+            if path or key != "revision":
+                warnings.append(f"{where} is not part of the product template")
+            continue
+        expected = template[key]
+        if isinstance(expected, dict) and isinstance(item, dict):
+            _check(expected, item, path + (key,), pid, errors, warnings)
+        elif _kind(expected) != _kind(item):
+            errors.append(f"{where}: expected {_kind(expected)}, got {_kind(item)}")
+
+
+def validate_product(pid, product, template):
+    """Check one backup product against the product template; returns (errors, warnings)."""
+    errors, warnings = [], []
+    if not isinstance(pid, str) or not pid.strip():
+        return [f"{pid!r}: product ids must be non-empty text"], warnings
+    if not isinstance(product, dict):
+        return [f"{pid}: expected an object, got {_kind(product)}"], warnings
+    if product.get("product_id") not in (None, "", pid):
+        errors.append(f"{pid}: product_id is {product['product_id']!r}, not the key it is stored under")
+    revision = product.get("revision", 0)
+    if isinstance(revision, bool) or not isinstance(revision, int) or revision < 0:
+        errors.append(f"{pid}: revision must be a non-negative whole number")
+    _check(template, product, (), pid, errors, warnings)
+    return errors, warnings
+
+
+def check_backup(fileobj, template):
+    """Validate a whole backup in one streaming pass and report every problem found.
+
+    A backup carrying Merkle hashes is also checked against them, so a file
+    damaged after export is refused.
+
+    Returns {"products", "schema_version", "errors", "warnings"}; the backup
+    can be restored when errors is empty.
+    """
+    report = {"products": 0, "schema_version": 0, "errors": [], "warnings": []}
+    seen = set()
+    header, hashes = None, {}
+    try:
+        for kind, key, value in iter_backup(fileobj):
+            if kind == "meta":
+                if key == "schema_version":
+                    if isinstance(value, bool) or not isinstance(value, int) or value > migrations.SCHEMA_VERSION:
+                        report["errors"].append(f"schema_version {value!r} is not one this app can read (up to {migrations.SCHEMA_VERSION})")
+                    else:
+                        report["schema_version"] = value
+                elif key == "merkle":
+                    if isinstance(value, dict) and value.get("version") == merkle.HASH_VERSION and isinstance(value.get("buckets"), dict):
+                        header = value
+                    else:
+                        report["warnings"].append("The backup's 'merkle' hashes are not in a format this app reads; its content is not verified")
+                else:
+                    report["warnings"].append(f"Top-level field '{key}' is not used by this app and will not be restored")
+                continue
+            report["products"] += 1
+            if key in seen:
+                report["errors"].append(f"{key}: appears more than once")
+            seen.add(key)
+            if header is not None and isinstance(key, str) and isinstance(value, dict):
+                # Hashed as written, before migrations, as the export hashed it
+                hashes.setdefault(merkle.bucket_of(key), {})[key] = merkle.product_tree(value)[0]
+            if isinstance(value, dict):
+                # Judge products as they will be restored, i.e. after migrations
+                migrations.migrate_product(value, report["schema_version"])
+            errors, warnings = validate_product(key, value, template)
+            report["errors"].extend(errors)
+            report["warnings"].extend(warnings)
+    except BackupFormatError as e:
+        report["errors"].append(str(e))
+        return report
+    if header is not None:
+        buckets = {b: merkle.bucket_hash(products) for b, products in hashes.items()}
+        if merkle.root_hash(buckets) != header.get("root"):
+            differing = {b for b in set(buckets) | set(header["buckets"]) if buckets.get(b) != header["buckets"].get(b)}
+            report["errors"].append(
+                f"The products do not match the backup's 'merkle' hashes ({len(differing)} product group(s) differ): "
+                "the file was damaged or edited after export. If it was edited on purpose, remove the 'merkle' field."
+            )
+    return report
+
+
+RESTORE_BATCH = 50
+
+
+def restore_backup(writer, fileobj, template, schema_version, mode="merge", progress=None):
+    """Write a checked backup into the store.
+
+    mode "merge" upserts, a batch of RESTORE_BATCH products at a time: each
+    product is deep-merged into the stored one (or created from template).
+    mode "replace" makes the store match the backup in one atomic write
+    (repo.replace_products()): products are stored as-is and products missing
+    from the backup are deleted, so a failure leaves the store untouched and
+    no save lands halfway. The upload is then read on the writer thread, and
+    saves wait for the whole restore. Products from an older schema_version
+    are migrated on the way. progress(done) is called after each merge batch,
+    and once at the end of a replace. Returns counts of created, updated,
+    unchanged and deleted products.
+    """
+    if mode not in ("merge", "replace"):
+        raise ValueError(f"Unknown restore mode {mode!r}")
+
+    def products():
+        for kind, pid, product in iter_backup(fileobj):
+            if kind == "product":
+                product = migrations.migrate_product(product, schema_version)
+                product.setdefault("product_id", pid)
+                yield pid, product
+
+    if mode == "replace":
+        counts = writer.submit(lambda repo: repo.replace_products(products()))
+        if progress:
+            progress(sum(counts.values()) - counts["deleted"])
+        return counts
+
+    counts = Counter(created=0, updated=0, unchanged=0, deleted=0)
+    done = 0
+
+    def apply(batch):
+        def run(repo):
+            for pid, product in batch:
+                existed = repo.get_product(pid) is not None
+                product.pop("revision", None)
+                changes = repo.save_product(pid, product, template=template)
+                counts["updated" if existed and changes else "unchanged" if existed else "created"] += 1
+        writer.submit(run)
+        if progress:
+            progress(done)
+
+    batch = []
+    for item in products():
+        done += 1
+        batch.append(item)
+        if len(batch) >= RESTORE_BATCH:
+            apply(batch)
+            batch = []
+    if batch:
+        apply(batch)
+    return dict(counts)
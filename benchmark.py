@@ -0,0 +1,418 @@
+"""Benchmark suite for the workshop app.
+
+Run with: python benchmark.py [--products N] [--owners N] [--modes json,sqlite] [--only store,search] [--json results.json]
+Compare two saved runs with: python benchmark.py --compare old.json new.json
+
+Every timing is printed and, with --json, written as machine-readable results
+(group, name, seconds per call) so runs of different versions can be diffed.
+"""
+import argparse
+import contextlib
+import copy
+import csv
+import itertools
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import timeit
+import types
+from datetime import datetime, timezone
+from pathlib import Path
+
+import backup
+import catalog
+import columnar
+import search
+import storage
+
+APP_PATH = Path(__file__).resolve().parent / "app.py"
+
+WORDS = (
+    "data export manual excel databricks pipeline model partner report deploy python workaround licence "
+    "server cloud tool process review schedule quality delay heap leach copper recovery assay plant "
+    "dashboard forecast operator developer validation handover notebook sql spreadsheet email weekly "
+    "monthly sample lab results integration api access support training documentation risk backlog"
+).split()
+
+
+def legacy_deep_merge(target, source):
+    """The recursive merge used before storage.merge_changes(); always rewrites every leaf."""
+    for key, value in source.items():
+        if key in target and isinstance(target[key], dict) and isinstance(value, dict):
+            legacy_deep_merge(target[key], value)
+        else:
+            target[key] = value
+    return target
+
+
+def synthetic_product(sections=8, fields=40, depth=2):
+    """A product shaped like the session templates: a few sections of nested text fields."""
+    def branch(level, prefix):
+        if level == depth:
+            return {f"{prefix}_field_{i}": f"some answer text for {prefix} {i}" for i in range(fields)}
+        return {f"{prefix}_part_{i}": branch(level + 1, f"{prefix}_{i}") for i in range(3)}
+    product = {"product_id": "bench", "product_name": "Bench", "revision": 1}
+    for s in range(sections):
+        product[f"section_{s}"] = branch(0, f"s{s}")
+    return product
+
+
+def blank(tree):
+    """The same nested shape with every answer empty, like get_empty_product_template()."""
+    return {key: blank(value) if isinstance(value, dict) else "" for key, value in tree.items()}
+
+
+def edited(product, every):
+    """A full form payload where every n-th leaf differs from the stored product."""
+    payload = copy.deepcopy(product)
+    for i, (path, value) in enumerate(storage.iter_leaves(product)):
+        if every and i % every == 0 and isinstance(value, str):
+            storage._set_path(payload, path, value + " (edited)")
+    return payload
+
+
+def save_changes(product, payload):
+    """What a save now persists: nothing for a no-op, otherwise only the changed leaves."""
+    changes = storage.merge_changes(product, payload, apply=False)
+    return json.dumps(storage.changes_to_patch(changes)) if changes else None
+
+
+def synthetic_answers(count, seed=0):
+    """Products whose session answers are random sentences from a small vocabulary."""
+    rng = random.Random(seed)
+    words = ("data export manual excel databricks pipeline model partner report deploy python "
+             "workaround licence server cloud tool process review schedule quality delay").split()
+    sentence = lambda: " ".join(rng.choice(words) for _ in range(rng.randint(5, 30)))
+    return {
+        f"product-{i}": {
+            "technical_session": {f"part{p}": {f"q{q}": sentence() for q in range(15)} for p in range(5)},
+            "business_owner_session": {f"part{p}": {f"q{q}": sentence() for q in range(10)} for p in range(3)},
+        }
+        for i in range(count)
+    }
+
+
+def synthetic_text(rng, low=20, high=120):
+    """A few sentences of workshop-answer-like prose."""
+    words = [rng.choice(WORDS) for _ in range(rng.randint(low, high))]
+    sentences = [words[i:i + 12] for i in range(0, len(words), 12)]
+    return " ".join(" ".join(chunk).capitalize() + "." for chunk in sentences)
+
+
+def synthetic_store(products, owners, template, seed=0):
+    """An aggregated document of fully answered products spread over many owners.
+
+    Every leaf of template is filled: text with a few sentences, numbers with a
+    1-5 score and lists with a handful of quotes.
+    """
+    rng = random.Random(seed)
+    people = [f"Owner {i}" for i in range(owners)]
+
+    def fill(value):
+        if isinstance(value, dict):
+            return {key: fill(item) for key, item in value.items()}
+        if isinstance(value, bool):
+            return value
+        if isinstance(value, int):
+            return rng.randint(1, 5)
+        if isinstance(value, list):
+            return [{"speaker": rng.choice(people), "timestamp": f"{rng.randint(0, 59):02d}:{rng.randint(0, 59):02d}",
+                     "quote": synthetic_text(rng, 8, 30)} for _ in range(rng.randint(1, 5))]
+        return synthetic_text(rng)
+
+    document = {"products": {}}
+    for i in range(products):
+        name = f"Product {i} Model"
+        product = fill(template)
+        product.update({
+            "product_id": f"product-{i}-model", "product_name": name, "revision": 1,
+            "workstream": f"WS{rng.randint(1, 8)} - Workstream", "business_owner": rng.choice(people),
+            "existing_users": rng.choice(people), "primary_operator": rng.choice(people),
+            "primary_developer": rng.choice(people),
+        })
+        document["products"][product["product_id"]] = product
+    return document
+
+
+CATALOG_HEADER = [
+    "Platform / Product", "Workstream", "Alan's Initial Description", "Business owner", "Existing user(s)",
+    "Target future user(s)", "Existing primary operator", "Secondary operator", "Target future operator(s)",
+    "Blocker(s) for Future Operator(s)", "Existing primary developer(s)", "Existing Secondary Developer(s)",
+]
+
+
+def synthetic_catalog(path, rows, seed=0):
+    """Write a catalog CSV shaped like the Notion export, with a platform row every 50 rows."""
+    rng = random.Random(seed)
+    people = [f"Person {i}" for i in range(40)]
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        out = csv.writer(f)
+        out.writerow(CATALOG_HEADER)
+        for i in range(rows):
+            if i % 50 == 0:
+                out.writerow([f"Area {i} Platform", "WS1 - Platforms", "N/A"] + [""] * 9)
+                continue
+            out.writerow([
+                f"Product {i} Model", f"WS{rng.randint(1, 8)} - Workstream", "A description, with a comma",
+                rng.choice(people), "Users", "", rng.choice(people), "", "", "", rng.choice(people), "",
+            ])
+
+
+def legacy_load_catalog(path):
+    """The row-by-row, fixed-index CSV parse used before catalog.read_catalog()."""
+    products = []
+    with open(path, "r", encoding="utf-8-sig") as f:
+        rows = list(csv.reader(f))
+    for row in rows[1:]:
+        if not row or all(c.strip() == "" for c in row):
+            continue
+        name = row[0].strip()
+        if not name or "Platform" in name and "N/A" in (row[2] if len(row) > 2 else ""):
+            continue
+        products.append({
+            "product_name": name,
+            "workstream": row[1].strip() if len(row) > 1 else "",
+            "business_owner": row[3].strip() if len(row) > 3 else "",
+            "existing_users": row[4].strip() if len(row) > 4 else "",
+            "primary_operator": row[6].strip() if len(row) > 6 else "",
+            "primary_developer": row[10].strip() if len(row) > 10 else "",
+        })
+    return products
+
+
+def write_catalog(path, document):
+    """Write a catalog CSV listing the products of an aggregated document."""
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        out = csv.writer(f)
+        out.writerow(CATALOG_HEADER)
+        for product in document["products"].values():
+            out.writerow([
+                product["product_name"], product["workstream"], "", product["business_owner"],
+                product["existing_users"], "", product["primary_operator"], "", "", "",
+                product["primary_developer"], "",
+            ])
+
+
+RESULTS = []
+_group = ""
+
+
+def record(name, seconds, **extra):
+    RESULTS.append({"group": _group, "name": name, "seconds": seconds, **extra})
+
+
+def bench(label, fn, number):
+    seconds = min(timeit.repeat(fn, number=number, repeat=5)) / number
+    print(f"  {label:<48} {seconds * 1e6:12.1f} µs")
+    record(label, seconds, number=number)
+
+
+def bench_once(label, fn):
+    seconds = timeit.timeit(fn, number=1)
+    print(f"  {label:<48} {seconds * 1e3:12.1f} ms")
+    record(label, seconds, number=1)
+
+
+def bench_rows(label, fn, rows, repeat=3):
+    seconds = min(timeit.repeat(fn, number=1, repeat=repeat))
+    print(f"  {label:<48} {rows / seconds:12,.0f} rows/s")
+    record(label, seconds, rows=rows, rows_per_second=rows / seconds)
+
+
+@contextlib.contextmanager
+def _working_dir(path):
+    previous = os.getcwd()
+    os.chdir(path)
+    try:
+        yield
+    finally:
+        os.chdir(previous)
+
+
+def bench_merge(args):
+    product = synthetic_product()
+    leaves = sum(1 for _ in storage.iter_leaves(product))
+    print(f"deep merge of a {leaves}-leaf product")
+    for name, every in [("no-op save", 0), ("1% of leaves changed", 100), ("all leaves changed", 1)]:
+        payload = edited(product, every)
+        changes = storage.merge_changes(copy.deepcopy(product), payload, apply=False)
+        print(f"{name}: {len(changes)} changed leaves")
+        target = copy.deepcopy(product)
+        patch = storage.changes_to_patch(changes)
+        print(f"  journal entry: {len(json.dumps(payload)):,} bytes before, {len(json.dumps(patch)):,} bytes now")
+        bench(f"legacy deep_merge, {name}", lambda: legacy_deep_merge(target, payload), 200)
+        bench(f"merge_changes, {name}", lambda: storage.merge_changes(product, payload, apply=False), 200)
+        # End to end, a save merges and then serializes what gets persisted
+        bench(f"legacy merge + serialize, {name}", lambda: json.dumps(legacy_deep_merge(target, payload)), 200)
+        bench(f"merge_changes + serialize, {name}", lambda: save_changes(product, payload), 200)
+
+
+def bench_search(args):
+    products = synthetic_answers(args.products)
+    index = search.SearchIndex()
+    print(f"search index over {len(products)} products ({len(products) * 105} answers)")
+    bench_once("build", lambda: index.build(types.SimpleNamespace(iter_products=products.items)))
+    for query in ["databricks", "manual excel export", "licence server cloud deploy"]:
+        bench(f"search {query!r}", lambda: index.search(query), 5)
+    changes = storage.merge_changes(products["product-0"], {"technical_session": {"part0": {"q0": "new answer about databricks"}}})
+    bench("incremental update", lambda: index.on_store_change("product-0", changes, None), 200)
+
+
+def bench_columnar(args):
+    products = synthetic_answers(args.products)
+    template = {"product_id": "", "technical_session": products["product-0"]["technical_session"]}
+    print(f"columnar export of {len(products)} products")
+    bench_once("flatten", lambda: columnar.flatten_products(products.items(), template))
+    frame = columnar.flatten_products(products.items(), template)
+    for fmt in columnar.FORMATS:
+        bench(f"write {fmt}", lambda: columnar.write_table(frame, fmt), 1)
+
+
+def bench_catalog(args):
+    rows = args.catalog_rows
+    template = {field: "" for field in catalog.CATALOG_FIELDS}
+    template["technical_session"] = blank(synthetic_product()["section_0"])
+    with tempfile.TemporaryDirectory() as tmp:
+        path = Path(tmp) / "catalog.csv"
+        synthetic_catalog(path, rows)
+        print(f"catalog import of {rows:,} rows")
+        bench_rows("legacy csv parse", lambda: legacy_load_catalog(path), rows)
+        bench_rows("catalog.read_catalog", lambda: catalog.read_catalog(path), rows)
+        for mode in args.modes:
+            data_dir = Path(tmp) / mode
+            data_dir.mkdir()
+            storage.ensure_store(mode, data_dir)
+            writer = storage.get_writer(mode, data_dir)
+            state = data_dir / "catalog_sync.json"
+            bench_rows(f"first sync ({mode})", lambda: catalog.sync_catalog(writer, path, state, template), rows, repeat=1)
+            bench_rows(f"unchanged re-sync ({mode})", lambda: catalog.sync_catalog(writer, path, state, template), rows)
+
+
+def bench_store(args):
+    """The app's own helpers and the Products page against a synthetic store, per backend."""
+    # Importing app outside `streamlit run` only logs a warning; main() does not run
+    import app
+    from streamlit.testing.v1 import AppTest
+
+    template = app.get_empty_product_template()
+    document = synthetic_store(args.products, args.owners, template)
+    pids = list(document["products"])
+    text_path = next(path for path, value in storage.iter_leaves(template["technical_session"]) if isinstance(value, str))
+    size = len(json.dumps(document))
+    print(f"store of {len(pids)} products, {args.owners} owners, {size / 2**20:.1f} MiB of JSON")
+    for mode in args.modes:
+        with tempfile.TemporaryDirectory() as tmp, _working_dir(tmp):
+            os.environ["WORKSHOP_STORAGE"] = app.STORAGE_MODE = mode
+            app.ensure_dirs()
+            app.get_writer().submit(lambda repo: repo.replace(copy.deepcopy(document)))
+            print(f"{mode}:")
+            bench(f"load_aggregated_data ({mode})", app.load_aggregated_data, 3)
+
+            counter = itertools.count()
+
+            def save():
+                i = next(counter)
+                payload = {}
+                storage._set_path(payload, ("technical_session",) + text_path, f"edited answer {i}")
+                app.save_product_data(pids[i % len(pids)], payload)
+            bench(f"save_product_data ({mode})", save, 20)
+
+            # A full form payload with one edited field, merged into the stored product
+            product = app.get_product_data(pids[0])
+            payload = copy.deepcopy(product)
+            storage._set_path(payload, ("technical_session",) + text_path, "one edited answer")
+            bench(f"merge_changes, full form ({mode})", lambda: storage.merge_changes(product, payload, apply=False), 100)
+
+            write_catalog(app.PRODUCT_CATALOG_FILE, document)
+            bench_once(f"import_products_from_csv, first ({mode})", app.import_products_from_csv)
+            bench(f"import_products_from_csv, unchanged ({mode})", app.import_products_from_csv, 3)
+
+            paths = []
+            bench_once(f"backup export ({mode})", lambda: paths.append(backup.export_backup(app.get_writer())))
+
+            def restore():
+                with backup.open_compressed(paths[0], "gzip") as f:
+                    report = backup.check_backup(f, template)
+                with backup.open_compressed(paths[0], "gzip") as f:
+                    backup.restore_backup(app.get_writer(), f, template, report["schema_version"])
+            bench_once(f"backup check + restore ({mode})", restore)
+            for path in paths:
+                os.remove(path)
+
+            at = AppTest.from_file(str(APP_PATH), default_timeout=600)
+            bench_once(f"Products page, first run ({mode})", at.run)
+            if at.exception:
+                raise RuntimeError(f"Products page failed: {at.exception}")
+            bench(f"Products page, rerun ({mode})", at.run, 1)
+
+
+GROUPS = {
+    "merge": bench_merge,
+    "search": bench_search,
+    "columnar": bench_columnar,
+    "catalog": bench_catalog,
+    "store": bench_store,
+}
+
+
+def git_revision():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=APP_PATH.parent, capture_output=True, text=True, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(old_path, new_path, threshold=1.2):
+    """Print per-benchmark ratios between two --json runs; returns True if nothing got slower than threshold."""
+    old, new = (json.loads(Path(p).read_text()) for p in (old_path, new_path))
+    before = {(r["group"], r["name"]): r["seconds"] for r in old["results"]}
+    ok = True
+    print(f"{old.get('git') or old_path} -> {new.get('git') or new_path}")
+    for result in new["results"]:
+        key = (result["group"], result["name"])
+        if key not in before:
+            continue
+        ratio = result["seconds"] / before[key] if before[key] else float("inf")
+        flag = "  SLOWER" if ratio > threshold else ""
+        ok = ok and not flag
+        print(f"  {result['group']:<9} {result['name']:<44} {ratio:6.2f}x{flag}")
+    return ok
+
+
+def main(argv=None):
+    global _group
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--products", type=int, default=1000, help="products in synthetic stores")
+    parser.add_argument("--owners", type=int, default=50, help="business owners in synthetic stores")
+    parser.add_argument("--catalog-rows", type=int, default=20000, help="rows in the synthetic catalog CSV")
+    parser.add_argument("--modes", default=",".join(storage.REPOSITORY_TYPES), help="storage backends to run against")
+    parser.add_argument("--only", default=",".join(GROUPS), help=f"groups to run ({', '.join(GROUPS)})")
+    parser.add_argument("--json", help="write the results to this file")
+    parser.add_argument("--compare", nargs=2, metavar=("OLD", "NEW"), help="compare two --json result files")
+    args = parser.parse_args(argv)
+    if args.compare:
+        return 0 if compare(*args.compare) else 1
+    args.modes = args.modes.split(",")
+    for name in args.only.split(","):
+        _group = name
+        GROUPS[name](args)
+    if args.json:
+        Path(args.json).write_text(json.dumps({
+            "git": git_revision(),
+            "created": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "params": {k: v for k, v in vars(args).items() if k not in ("json", "compare")},
+            "results": RESULTS,
+        }, indent=2))
+        print(f"results written to {args.json}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,171 @@
+"""Bulk, incremental import of the Product Catalog CSV into the store.
+
+The catalog (a Notion export) is read with pandas, using pyarrow's
+multithreaded CSV parser when it is installed, and its columns are matched
+by header name, so reordered or extra columns do not matter. The
+platform-row filter, slugs and the comparison with the last sync are column
+operations rather than row by row.
+
+The last synced catalog is remembered in a small sidecar file
+(data/catalog_sync.json): a fingerprint of the whole file plus, per product,
+the values of its catalog row. Re-importing an unchanged file is then a hash
+check, and a changed file only touches the products, and the metadata
+fields, whose rows actually changed.
+"""
+import csv
+import hashlib
+
+import pandas as pd
+
+import storage
+
+try:
+    import pyarrow
+except ImportError:  # optional: pip install pyarrow (faster CSV parsing)
+    pyarrow = None
+
+# Product field -> accepted catalog headers (compared case-insensitively)
+CATALOG_COLUMNS = {
+    "product_name": ("Platform / Product", "Product", "Product name"),
+    "workstream": ("Workstream",),
+    "business_owner": ("Business owner",),
+    "existing_users": ("Existing user(s)", "Existing users"),
+    "primary_operator": ("Existing primary operator", "Primary operator"),
+    "primary_developer": ("Existing primary developer(s)", "Primary developer"),
+}
+
+# Product fields that come from the catalog; everything else is captured in the app
+CATALOG_FIELDS = tuple(CATALOG_COLUMNS)
+
+# Platform rows are marked "N/A" in the description column instead of naming a product
+DESCRIPTION_HEADERS = ("Alan's Initial Description", "Description")
+
+
+class CatalogFormatError(ValueError):
+    """The catalog lacks a column the importer needs."""
+
+
+def file_fingerprint(path):
+    """sha256 of a file's bytes, read in chunks."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def slugify(names):
+    """Vectorized slugify of a Series of names; matches app.slugify()."""
+    return (
+        names.str.lower().str.strip()
+        .str.replace(r"[^a-z0-9]+", "-", regex=True)
+        .str.strip("-")
+    )
+
+
+def _wanted_columns(path, wanted):
+    # The pyarrow parser needs the columns by name, so they are picked from the header row first
+    with open(path, newline="", encoding="utf-8-sig") as f:
+        header = next(csv.reader(f), [])
+    return [column for column in header if column.strip().casefold() in wanted]
+
+
+def _find_column(frame, headers):
+    wanted = {h.casefold() for h in headers}
+    return next((column for column in frame.columns if column.strip().casefold() in wanted), None)
+
+
+def read_catalog(path):
+    """Read the catalog into a frame indexed by product_id.
+
+    Columns are CATALOG_FIELDS. Empty and platform rows are dropped. Returns
+    (frame, collisions), where collisions maps a product_id to the distinct
+    product names that slugify to it; the last row for a product_id wins.
+    """
+    wanted = {h.casefold() for headers in (*CATALOG_COLUMNS.values(), DESCRIPTION_HEADERS) for h in headers}
+    # Only the mapped columns are converted; the long free-text ones are skipped by the parser
+    raw = pd.read_csv(
+        path, dtype=str, keep_default_na=False, encoding="utf-8-sig",
+        usecols=_wanted_columns(path, wanted), engine="pyarrow" if pyarrow is not None else "c",
+    )
+    frame = pd.DataFrame(index=raw.index)
+    for field, headers in CATALOG_COLUMNS.items():
+        column = _find_column(raw, headers)
+        if column is None and field == "product_name":
+            raise CatalogFormatError(f"The catalog has no product name column (one of: {', '.join(headers)})")
+        frame[field] = raw[column].str.strip() if column is not None else ""
+    description = _find_column(raw, DESCRIPTION_HEADERS)
+    names = frame["product_name"]
+    skip = names.eq("")
+    if description is not None:
+        skip |= names.str.contains("Platform", regex=False) & raw[description].str.contains("N/A", regex=False)
+    frame = frame[~skip]
+    frame.insert(0, "product_id", slugify(frame["product_name"]))
+    frame = frame[frame["product_id"].ne("")]
+
+    clashing = frame[frame["product_id"].duplicated(keep=False)]
+    collisions = {
+        pid: list(dict.fromkeys(group))
+        for pid, group in clashing.groupby("product_id", sort=False)["product_name"]
+    }
+    frame = frame.drop_duplicates("product_id", keep="last").set_index("product_id")
+    return frame, collisions
+
+
+def sync_catalog(writer, catalog_path, state_path, template):
+    """Upsert the catalog rows that changed since the last sync.
+
+    The catalog is not even parsed when the file is unchanged and every
+    product it listed is still in the store. New products are created from
+    template; for existing ones only the fields whose catalog value changed
+    are saved, so edits made in the app to other fields are kept. Products
+    the sync state does not know yet (stored before the first sync) only get
+    the catalog fields they have no value for. All writes
+    go to the writer as one batch, i.e. one transaction or journal commit.
+    Returns counts of added, updated and unchanged products, plus the slug
+    collisions found (see read_catalog()).
+    """
+    counts = {"added": 0, "updated": 0, "unchanged": 0, "collisions": {}}
+    file_digest = file_fingerprint(catalog_path)
+    state = storage.file_cache.read(state_path) or {}
+    synced = state.get("rows", {})
+    stored = {row["product_id"] for row in writer.repo.list_products()}
+    if state.get("file") == file_digest and stored.issuperset(synced):
+        counts["unchanged"] = len(synced)
+        return counts
+
+    frame, counts["collisions"] = read_catalog(catalog_path)
+    fields = list(CATALOG_FIELDS)
+    # Rows the last sync did not see come out of the reindex as NaN, i.e. changed
+    previous = pd.DataFrame.from_dict(
+        {pid: row.get("values", {}) for pid, row in synced.items()}, orient="index", columns=fields, dtype=object,
+    ).reindex(frame.index)
+    pending = frame[fields].ne(previous).any(axis=1) | ~frame.index.isin(list(stored))
+    counts["unchanged"] = int((~pending).sum())
+    rows = frame.loc[pending, fields].astype(object).to_dict("index")
+    # save_product() stores a pruned copy of the template; pruning it once here leaves little to copy per product
+    template = storage.prune_empty(template)
+
+    def run(repo):
+        for pid, row in rows.items():
+            stored_product = repo.get_product(pid)
+            if stored_product is None:
+                repo.save_product(pid, dict(row, product_id=pid), template=template)
+                counts["added"] += 1
+                continue
+            values = synced.get(pid, {}).get("values")
+            if values:
+                # Rows seen by an earlier sync only push the fields that changed since
+                patch = {f: v for f, v in row.items() if values.get(f) != v}
+            else:
+                # No sync state yet: the stored values may be edits made in the app, so only fill blanks
+                patch = {f: v for f, v in row.items() if storage.is_empty(stored_product.get(f))}
+            counts["updated" if repo.save_product(pid, patch) else "unchanged"] += 1
+
+    if rows:
+        writer.submit(run)
+    storage.file_cache.write(state_path, {
+        "file": file_digest,
+        "rows": {pid: {"values": values} for pid, values in frame[fields].to_dict("index").items()},
+    }, indent=None)
+    return counts
@@ -0,0 +1,131 @@
+"""Flattened, columnar export of every product for analytics notebooks.
+
+Each leaf path of the product template becomes one typed column, named by
+its dotted path (``technical_session.part1_overview.overview_product_desc``),
+so a notebook can filter and aggregate answers without unpacking nested
+dicts. The table is built once per store revision: it is kept until a save,
+delete or restore reaches the repository's listeners, and written to
+CSV, Parquet or Feather from there.
+"""
+import io
+import json
+import threading
+
+import pandas as pd
+
+import storage
+
+try:
+    import pyarrow
+except ImportError:  # optional: pip install pyarrow (Parquet and Feather)
+    pyarrow = None
+
+# Format name -> (file suffix, MIME type)
+FORMATS = {"csv": (".csv", "text/csv")}
+if pyarrow is not None:
+    FORMATS["parquet"] = (".parquet", "application/vnd.apache.parquet")
+    FORMATS["feather"] = (".feather", "application/vnd.apache.arrow.file")
+
+SEPARATOR = "."
+
+
+def template_columns(template):
+    """(column, template value) for every leaf of the product template, in template order."""
+    return [(SEPARATOR.join(path), value) for path, value in storage.iter_leaves(template)]
+
+
+def _as_text(column):
+    # Lists and objects (quotes, unexpected values) become JSON text
+    return column.map(lambda v: json.dumps(v, ensure_ascii=False) if isinstance(v, (list, dict)) else v).astype("string")
+
+
+def flatten_products(products, template):
+    """One row per product, one typed column per leaf path.
+
+    Template columns come first and are typed from the template (text,
+    nullable integers, or JSON text for lists), with unanswered fields holding
+    the template's empty value; leaves that are not in the template follow as
+    text.
+    """
+    frame = pd.json_normalize(
+        [dict(storage.with_defaults(template, product), product_id=pid) for pid, product in products], sep=SEPARATOR,
+    )
+    columns = template_columns(template)
+    known = {name for name, _ in columns}
+    extra = sorted(c for c in frame.columns if c not in known and c != "revision")
+    frame = frame.reindex(columns=[name for name, _ in columns] + ["revision"] + extra)
+    for name, value in columns:
+        if isinstance(value, bool):
+            frame[name] = frame[name].astype("boolean")
+        elif isinstance(value, int):
+            frame[name] = pd.to_numeric(frame[name], errors="coerce").astype("Int64")
+        elif isinstance(value, float):
+            frame[name] = pd.to_numeric(frame[name], errors="coerce").astype("Float64")
+        else:
+            frame[name] = _as_text(frame[name])
+    frame["revision"] = pd.to_numeric(frame["revision"], errors="coerce").astype("Int64")
+    for name in extra:
+        frame[name] = _as_text(frame[name])
+    return frame
+
+
+def write_table(frame, fmt):
+    """Serialize a flattened table to bytes in one of FORMATS."""
+    if fmt not in FORMATS:
+        raise ValueError(f"Unknown export format {fmt!r}; expected one of {sorted(FORMATS)}")
+    if fmt == "csv":
+        return frame.to_csv(index=False).encode("utf-8")
+    buffer = io.BytesIO()
+    if fmt == "parquet":
+        frame.to_parquet(buffer, index=False)
+    else:
+        frame.to_feather(buffer)
+    return buffer.getvalue()
+
+
+class ColumnarExport:
+    """The flattened table of one repository, rebuilt only after the store changed."""
+
+    def __init__(self, repo, template):
+        self._repo = repo
+        self._template = template
+        self._lock = threading.Lock()
+        # Bumped by every store notification; a cached table is valid for one revision
+        self.revision = 0
+        self._frame = None
+        self._files = {}
+
+    def on_store_change(self, product_id, changes, repo):
+        with self._lock:
+            self.revision += 1
+            self._frame, self._files = None, {}
+
+    def frame(self):
+        """The flattened table for the current store revision."""
+        with self._lock:
+            if self._frame is not None:
+                return self._frame
+            revision = self.revision
+        frame = flatten_products(self._repo.iter_products(), self._template)
+        with self._lock:
+            # A save that landed while we were building makes this table stale already
+            if revision == self.revision:
+                self._frame = frame
+        return frame
+
+    def export(self, fmt):
+        """The table serialized as fmt, cached alongside the table."""
+        with self._lock:
+            data = self._files.get(fmt)
+            revision = self.revision
+        if data is None:
+            data = write_table(self.frame(), fmt)
+            with self._lock:
+                if revision == self.revision:
+                    self._files[fmt] = data
+        return data
+
+
+def get_export(repo, template):
+    """The process-wide columnar export for repo, subscribed to its changes."""
+    return storage.attach_index(repo, "columnar", lambda: ColumnarExport(repo, template))
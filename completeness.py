@@ -0,0 +1,128 @@
+"""Workshop progress: how many fields of each session part every product has answered.
+
+The fields of a part are the leaves of the product template's technical
+session and of the business owner template's parts (its owner_name and
+products_covered belong to the owner, not to a product). The counts are
+built once per process and then kept current from the paths each save
+changed (see storage.StoreRepository.subscribe), so neither the progress
+column nor the dashboard walks the session answers.
+"""
+import re
+
+import storage
+
+TECHNICAL_SESSION = "technical_session"
+BUSINESS_OWNER_SESSION = "business_owner_session"
+SESSION_LABELS = {TECHNICAL_SESSION: "Operator/Dev", BUSINESS_OWNER_SESSION: "BO/User"}
+
+
+def section_fields(product_template, owner_template):
+    """Map each (session, part) to {full leaf path: template default}, in template order."""
+    sessions = {
+        TECHNICAL_SESSION: product_template.get(TECHNICAL_SESSION, {}),
+        BUSINESS_OWNER_SESSION: {k: v for k, v in owner_template.items() if isinstance(v, dict)},
+    }
+    return {
+        (session, part): dict(storage.iter_leaves(fields, (session, part)))
+        for session, parts in sessions.items()
+        for part, fields in parts.items()
+        if isinstance(fields, dict)
+    }
+
+
+def section_label(section):
+    """'Operator/Dev · Part 2: Technical stack' for ('technical_session', 'part2_technical_stack')."""
+    session, part = section
+    match = re.fullmatch(r"part(\d+)_(.+)", part)
+    name = f"Part {match[1]}: {match[2].replace('_', ' ').capitalize()}" if match else part
+    return f"{SESSION_LABELS.get(session, session)} · {name}"
+
+
+class CompletenessIndex(storage.StoreIndex):
+    """Answered field paths per product and section, with a running total per section."""
+
+    def __init__(self, sections):
+        super().__init__()
+        self.sections = sections
+        self._fields = {path: (section, default) for section, fields in sections.items() for path, default in fields.items()}
+        self._answered = {}  # product_id -> {section: set of answered paths}
+        self._filled = dict.fromkeys(sections, 0)
+
+    def _scan(self, repo):
+        answered, filled = {}, dict.fromkeys(self.sections, 0)
+        for pid, product in repo.iter_products():
+            answered[pid] = {}
+            for session in {session for session, _ in self.sections}:
+                for path, value in storage.iter_leaves(product.get(session) or {}, (session,)):
+                    self._set(answered[pid], filled, path, value)
+        return answered, filled
+
+    def _install(self, state):
+        self._answered, self._filled = state
+
+    def _apply(self, product_id, changes, product):
+        if changes is None:
+            for section, paths in self._answered.pop(product_id, {}).items():
+                self._filled[section] -= len(paths)
+            return
+        answered = self._answered.setdefault(product_id, {})
+        for change in changes:
+            if isinstance(change.old, dict) or isinstance(change.new, dict):
+                # A subtree was replaced wholesale; forget the fields that lived under it
+                depth = len(change.path)
+                for path in [p for paths in answered.values() for p in paths if p[:depth] == change.path]:
+                    self._set(answered, self._filled, path, None)
+                if isinstance(change.new, dict):
+                    for path, value in storage.iter_leaves(change.new, change.path):
+                        self._set(answered, self._filled, path, value)
+            else:
+                self._set(answered, self._filled, change.path, change.new)
+
+    def _set(self, answered, filled, path, value):
+        field = self._fields.get(path)
+        if field is None:
+            return
+        section, default = field
+        paths = answered.setdefault(section, set())
+        if storage.is_answered(value, default):
+            if path not in paths:
+                paths.add(path)
+                filled[section] += 1
+        elif path in paths:
+            paths.discard(path)
+            filled[section] -= 1
+
+    def percent(self, product_id):
+        """Percent of all session fields a product has answered."""
+        with self._lock:
+            filled = sum(len(paths) for paths in self._answered.get(product_id, {}).values())
+        return round(100 * filled / max(1, len(self._fields)))
+
+    def progress(self, product_ids):
+        """{product_id: {section: answered count}} for the given products."""
+        with self._lock:
+            return {
+                pid: {section: len(self._answered.get(pid, {}).get(section, ())) for section in self.sections}
+                for pid in product_ids
+            }
+
+    def portfolio(self):
+        """One row per section: answered fields over all products, and products that have not started it."""
+        with self._lock:
+            products = len(self._answered)
+            started = dict.fromkeys(self.sections, 0)
+            for sections in self._answered.values():
+                for section, paths in sections.items():
+                    if paths:
+                        started[section] += 1
+            return [{
+                "section": section,
+                "filled": self._filled[section],
+                "total": products * len(fields),
+                "not_started": products - started[section],
+            } for section, fields in self.sections.items()]
+
+
+def get_index(repo, product_template, owner_template):
+    """The process-wide completeness index for repo, built on first use and then kept current."""
+    return storage.attach_index(repo, "completeness", lambda: CompletenessIndex(section_fields(product_template, owner_template)))
@@ -0,0 +1,152 @@
+"""Process-wide latency and I/O counters behind the hidden Diagnostics page.
+
+Each operation (a storage helper, a file or database access, a page render)
+keeps a call count, bytes read/written and a latency histogram with
+log-spaced buckets, so memory stays fixed however long the process runs and
+p50/p95/p99 can be read off at any time.
+
+Set WORKSHOP_DIAGNOSTICS=0 to turn recording off: timed() then returns the
+function unchanged and span()/record() return straight away.
+"""
+import bisect
+import functools
+import os
+import threading
+import time
+
+ENABLED = os.environ.get("WORKSHOP_DIAGNOSTICS", "1") != "0"
+
+# Upper bounds of the latency buckets in seconds: 50 µs doubling up to ~26 s, then one overflow bucket
+BUCKETS = tuple(5e-5 * 2 ** i for i in range(20))
+
+
+class Stat:
+    """Counters and latency histogram of one operation."""
+
+    __slots__ = ("calls", "seconds", "max", "bytes_read", "bytes_written", "histogram")
+
+    def __init__(self):
+        self.calls = 0
+        self.seconds = 0.0
+        self.max = 0.0
+        self.bytes_read = 0
+        self.bytes_written = 0
+        self.histogram = [0] * (len(BUCKETS) + 1)
+
+    def percentile(self, q):
+        """Latency below which a fraction q of calls fell, interpolated within its bucket."""
+        if not self.calls:
+            return 0.0
+        rank = q * self.calls
+        seen = 0
+        for i, count in enumerate(self.histogram):
+            if count and seen + count >= rank:
+                low = BUCKETS[i - 1] if i else 0.0
+                high = BUCKETS[i] if i < len(BUCKETS) else self.max
+                return min(self.max, low + (high - low) * (rank - seen) / count)
+            seen += count
+        return self.max
+
+
+_stats = {}
+_lock = threading.Lock()
+
+
+def record(name, seconds, bytes_read=0, bytes_written=0):
+    """Add one call of operation name."""
+    if not ENABLED:
+        return
+    with _lock:
+        stat = _stats.get(name)
+        if stat is None:
+            stat = _stats[name] = Stat()
+        stat.calls += 1
+        stat.seconds += seconds
+        stat.max = max(stat.max, seconds)
+        stat.bytes_read += bytes_read
+        stat.bytes_written += bytes_written
+        stat.histogram[bisect.bisect_left(BUCKETS, seconds)] += 1
+
+
+class _Span:
+    __slots__ = ("name", "bytes_read", "bytes_written", "_started")
+
+    def __init__(self, name):
+        self.name = name
+        self.bytes_read = 0
+        self.bytes_written = 0
+
+    def __enter__(self):
+        self._started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        record(self.name, time.perf_counter() - self._started, self.bytes_read, self.bytes_written)
+
+
+class _NullSpan:
+    __slots__ = ("bytes_read", "bytes_written")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        pass
+
+
+_NULL_SPAN = _NullSpan()
+
+
+def span(name):
+    """Context manager timing a block; set .bytes_read / .bytes_written on it to count I/O."""
+    return _Span(name) if ENABLED else _NULL_SPAN
+
+
+def timed(name):
+    """Decorator recording every call of a function as operation name."""
+    def decorate(fn):
+        if not ENABLED:
+            return fn
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            started = time.perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                record(name, time.perf_counter() - started)
+        return wrapper
+    return decorate
+
+
+def snapshot():
+    """One summary row per operation, slowest total time first."""
+    with _lock:
+        rows = [
+            {
+                "operation": name,
+                "calls": stat.calls,
+                "total_s": stat.seconds,
+                "p50_ms": stat.percentile(0.50) * 1e3,
+                "p95_ms": stat.percentile(0.95) * 1e3,
+                "p99_ms": stat.percentile(0.99) * 1e3,
+                "max_ms": stat.max * 1e3,
+                "bytes_read": stat.bytes_read,
+                "bytes_written": stat.bytes_written,
+            }
+            for name, stat in _stats.items()
+        ]
+    return sorted(rows, key=lambda row: -row["total_s"])
+
+
+def histogram(name):
+    """(bucket upper bound in seconds, calls) pairs of an operation; the last bound is None (overflow)."""
+    with _lock:
+        stat = _stats.get(name)
+        counts = list(stat.histogram) if stat else []
+    return list(zip(BUCKETS + (None,), counts))
+
+
+def reset():
+    with _lock:
+        _stats.clear()
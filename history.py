@@ -0,0 +1,248 @@
+"""Revision history of every product, in a content-addressed object store.
+
+Each stored revision is a tree of JSON objects under data/history/objects,
+named by the SHA-256 of their content: a product node holds the product's
+top-level fields and the hashes of its session nodes, which hold the hashes
+of their parts; a part (e.g. technical_session.part1_overview) is stored
+whole. An object is written once and shared by every revision that has the
+same content, so a save only adds the parts it changed plus two small
+nodes.
+
+data/history/log/<product>.jsonl lists a product's revisions, one line
+each, with the tree hash and the parts that changed. Listing history reads
+only that file, and diff() loads just the subtrees whose hashes differ.
+
+Revisions are recorded from the repository's save notifications (see
+storage.StoreRepository.subscribe) on the writer thread. History is a
+convenience copy: it is not fsync'd, so a crash can lose its last entries
+but never the store's data.
+"""
+import hashlib
+import json
+import os
+import threading
+import time
+from pathlib import Path
+
+import storage
+
+# Depth below the product whose dicts are stored as one object: 0 product, 1 session, 2 part
+PART_DEPTH = 2
+
+
+def _encode(obj):
+    return json.dumps(obj, sort_keys=True, separators=(",", ":")).encode("utf-8")
+
+
+class History:
+    """Append-only revision log per product, backed by a content-addressed object store."""
+
+    def __init__(self, data_dir):
+        self.root = Path(data_dir) / "history"
+        self.objects_dir = self.root / "objects"
+        self.log_dir = self.root / "log"
+        self._lock = threading.Lock()
+        # product_id -> {"tree": hash, "parts": {(session, part): hash}} of its last logged revision
+        self._heads = {}
+
+    # --- object store ---
+
+    def _object_path(self, digest):
+        return self.objects_dir / digest[:2] / f"{digest[2:]}.json"
+
+    def put_object(self, obj):
+        """Store obj once and return its hash."""
+        raw = _encode(obj)
+        digest = hashlib.sha256(raw).hexdigest()
+        path = self._object_path(digest)
+        if not path.exists():
+            path.parent.mkdir(parents=True, exist_ok=True)
+            tmp_path = path.with_name(path.name + ".tmp")
+            tmp_path.write_bytes(raw)
+            os.replace(tmp_path, path)
+        return digest
+
+    def get_object(self, digest):
+        return json.loads(self._object_path(digest).read_bytes())
+
+    # --- trees ---
+
+    def _store(self, product, parts, changed):
+        """Store a product as a tree, re-hashing only the parts in changed (None: all); returns (hash, part hashes)."""
+        hashes = {}
+        sessions = {}
+        for session, value in product.items():
+            if not isinstance(value, dict):
+                continue
+            children = {}
+            for part, body in value.items():
+                if not isinstance(body, dict):
+                    continue
+                key = (session, part)
+                if changed is None or key in changed or key not in parts:
+                    hashes[key] = self.put_object(body)
+                else:
+                    hashes[key] = parts[key]
+                children[part] = hashes[key]
+            sessions[session] = self.put_object({
+                "values": {k: v for k, v in value.items() if not isinstance(v, dict)},
+                "children": children,
+            })
+        tree = self.put_object({
+            "values": {k: v for k, v in product.items() if not isinstance(v, dict) and k != "revision"},
+            "children": sessions,
+        })
+        return tree, hashes
+
+    def _load_node(self, digest, depth=0):
+        if depth == PART_DEPTH:
+            return self.get_object(digest)
+        node = self.get_object(digest)
+        data = dict(node["values"])
+        for key, child in node["children"].items():
+            data[key] = self._load_node(child, depth + 1)
+        return data
+
+    def load(self, tree):
+        """The product stored as tree (without its revision)."""
+        return self._load_node(tree)
+
+    def diff(self, old_tree, new_tree):
+        """storage.Change list turning the product at old_tree into new_tree, descending only into subtrees that differ."""
+        return self._diff_nodes(old_tree, new_tree, (), 0)
+
+    def _diff_nodes(self, old, new, prefix, depth):
+        if old == new:
+            return []
+        if depth == PART_DEPTH or old is None or new is None:
+            # A part, or a subtree that exists on one side only: compare its leaves
+            old_data = {} if old is None else self._load_node(old, depth)
+            new_data = {} if new is None else self._load_node(new, depth)
+            return [storage.Change(prefix + change.path, change.old, change.new) for change in storage.diff_leaves(old_data, new_data)]
+        old_node, new_node = self.get_object(old), self.get_object(new)
+        changes = [
+            storage.Change(prefix + change.path, change.old, change.new)
+            for change in storage.diff_leaves(old_node["values"], new_node["values"])
+        ]
+        for key in list(old_node["children"]) + [k for k in new_node["children"] if k not in old_node["children"]]:
+            changes.extend(self._diff_nodes(
+                old_node["children"].get(key), new_node["children"].get(key), prefix + (key,), depth + 1,
+            ))
+        return changes
+
+    # --- per-product log ---
+
+    def _log_path(self, product_id):
+        return self.log_dir / f"{storage.product_file_stem(product_id)}.jsonl"
+
+    def revisions(self, product_id):
+        """The logged revisions of a product, newest first: {"product_id", "revision", "tree", "at", "op", "parts"}.
+
+        op is "create", "save" or "delete" (tree is None for a delete).
+        """
+        path = self._log_path(product_id)
+        if not path.exists():
+            return []
+        entries = []
+        for line in path.read_bytes().splitlines():
+            try:
+                entries.append(json.loads(line))
+            except ValueError:
+                continue  # an interrupted append
+        return entries[::-1]
+
+    def _head(self, product_id):
+        head = self._heads.get(product_id)
+        if head is None:
+            last = next(iter(self.revisions(product_id)), None)
+            head = {"tree": None, "parts": {}}
+            if last and last["tree"]:
+                # Only the product and session nodes of the last revision are read
+                node = self.get_object(last["tree"])
+                for session, digest in node["children"].items():
+                    for part, part_digest in self.get_object(digest)["children"].items():
+                        head["parts"][(session, part)] = part_digest
+                head["tree"] = last["tree"]
+            self._heads[product_id] = head
+        return head
+
+    def _append(self, product_id, entry):
+        path = self._log_path(product_id)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with open(path, "ab") as f:
+            f.write(json.dumps(entry, separators=(",", ":")).encode("utf-8") + b"\n")
+
+    def record(self, product_id, product, changes=None):
+        """Log product as a new revision unless its content is the last logged one.
+
+        changes (the save's storage.Change list) limits re-hashing to the
+        parts they touch; None re-hashes everything.
+        """
+        with self._lock:
+            head = self._head(product_id)
+            changed = None if changes is None else {change.path[:2] for change in changes if len(change.path) > 2}
+            if changes is not None and any(
+                len(change.path) <= 2 and (isinstance(change.old, dict) or isinstance(change.new, dict)) for change in changes
+            ):
+                changed = None  # a whole session or part was replaced
+            tree, parts = self._store(product, head["parts"], changed)
+            if tree == head["tree"]:
+                return
+            touched = sorted({k for k in parts if parts[k] != head["parts"].get(k)} | (head["parts"].keys() - parts.keys()))
+            self._append(product_id, {
+                "product_id": product_id,
+                "revision": product.get("revision", 0),
+                "tree": tree,
+                "at": time.time(),
+                "op": "save" if head["tree"] else "create",
+                "parts": [".".join(key) for key in touched],
+            })
+            self._heads[product_id] = {"tree": tree, "parts": parts}
+
+    def record_delete(self, product_id):
+        with self._lock:
+            head = self._head(product_id)
+            if head["tree"] is None:
+                return
+            self._append(product_id, {"product_id": product_id, "revision": None, "tree": None, "at": time.time(), "op": "delete", "parts": []})
+            self._heads[product_id] = {"tree": None, "parts": {}}
+
+    def restore(self, writer, product_id, tree):
+        """Save a product back to the content of tree as a new revision; returns the changed leaves.
+
+        Leaves the stored product has and tree lacks are cleared, so this is
+        one ordinary save (conflict-free, as it runs on the writer thread).
+        """
+        target = self.load(tree)
+
+        def run(repo):
+            current = {k: v for k, v in (repo.get_product(product_id) or {}).items() if k != "revision"}
+            return repo.save_product(product_id, storage.changes_to_patch(storage.diff_leaves(current, target)))
+
+        return writer.submit(run)
+
+    def on_store_change(self, product_id, changes, repo):
+        if product_id is None:
+            # Whole store replaced: log whatever differs from the last revisions, and the products that are gone
+            seen = set()
+            for pid, product in repo.iter_products():
+                seen.add(self._log_path(pid))
+                self.record(pid, product)
+            for path in self.log_dir.glob("*.jsonl") if self.log_dir.exists() else ():
+                if path not in seen:
+                    last = path.read_bytes().splitlines()[-1:]
+                    try:
+                        self.record_delete(json.loads(last[0])["product_id"])
+                    except (IndexError, ValueError, KeyError):
+                        continue
+        elif changes is None:
+            self.record_delete(product_id)
+        elif changes:
+            product = repo.get_product(product_id)
+            if product is not None:
+                self.record(product_id, product, changes)
+
+
+def get_history(repo, data_dir):
+    """The process-wide history of repo, subscribed to its saves from the first call on."""
+    return storage.attach_index(repo, "history", lambda: History(data_dir))
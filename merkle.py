@@ -0,0 +1,299 @@
+"""Merkle hashes of the store, for integrity checks and comparing stores and backups.
+
+Every product has a hash tree: a leaf's hash covers its value, a part's
+(e.g. technical_session.part1_overview) its leaves, a session's its parts
+and top-level answers, and a product's its sessions and fields (revision
+excluded, empty leaves ignored, as the store does not keep them). Products
+are grouped into 256 buckets by a hash of their id, and the store's root
+hash covers the bucket hashes. Two trees are compared top-down, descending
+only where hashes differ, so finding d differences costs about d buckets'
+and d products' worth of hashing rather than the whole store.
+
+MerkleIndex keeps the tree of one repository current from its save
+notifications (see storage.StoreRepository.subscribe), re-hashing only the
+parts a save touched. Each save's product hash is appended to
+data/merkle.jsonl; on the next start the store is re-hashed and checked
+against it, so data changed or lost outside the app (a damaged or edited
+file) is reported rather than silently served. Exported backups carry the
+root and bucket hashes under "merkle" (see backup.iter_backup_chunks), which
+lets compare_backup() skip every bucket that matches and backup.check_backup()
+detect a damaged file.
+"""
+import hashlib
+import json
+import os
+from pathlib import Path
+
+import migrations
+import storage
+
+# Bump when the hashing below changes; backups with another version are hashed from their products
+HASH_VERSION = 1
+# Depth below the product whose dicts are hashed whole: 0 product, 1 session, 2 part
+PART_DEPTH = 2
+
+
+def _encode(value):
+    return json.dumps(value, sort_keys=True, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+def _node_hash(children):
+    """Hash of a dict from its children's hashes."""
+    return hashlib.sha256(b"N" + _encode(children)).hexdigest()
+
+
+def _value_hash(value):
+    # None for an empty leaf or a dict of them, which the store does not keep
+    if isinstance(value, dict):
+        children = {key: digest for key, digest in ((key, _value_hash(item)) for key, item in value.items()) if digest}
+        return _node_hash(children) if children else None
+    return None if storage.is_empty(value) else hashlib.sha256(b"L" + _encode(value)).hexdigest()
+
+
+def _tree(value, depth, previous, dirty):
+    if not isinstance(value, dict) or depth >= PART_DEPTH:
+        digest = _value_hash(value)
+        return (digest, None) if digest else None
+    children = {}
+    for key, item in value.items():
+        prev = previous[1].get(key) if previous is not None and previous[1] is not None else None
+        sub = None if dirty is None else {path[1:] for path in dirty if path[:1] == (key,)}
+        if prev is not None and sub is not None and not sub:
+            children[key] = prev  # untouched by the save
+            continue
+        node = _tree(item, depth + 1, prev, None if sub is None or () in sub else sub)
+        if node is not None:
+            children[key] = node
+    return (_node_hash({key: node[0] for key, node in children.items()}), children) if children else None
+
+
+def product_tree(product, previous=None, changes=None):
+    """A product's hash tree: (hash, {key: child tree}) down to its parts, (hash, None) for parts and leaves.
+
+    With previous (the product's tree before a save) and changes (the save's
+    storage.Change list), only the subtrees the changes touch are re-hashed.
+    """
+    dirty = None if previous is None or changes is None else {change.path[:PART_DEPTH] for change in changes}
+    content = {key: value for key, value in product.items() if key != "revision"}
+    return _tree(content, 0, previous, dirty) or (_node_hash({}), {})
+
+
+def bucket_of(product_id):
+    return hashlib.sha256(product_id.encode("utf-8")).hexdigest()[:2]
+
+
+def bucket_hash(product_hashes):
+    """Hash of one bucket from {product_id: product hash}."""
+    return _node_hash(product_hashes)
+
+
+def root_hash(bucket_hashes):
+    """Hash of a whole store from {bucket: bucket hash} of its non-empty buckets."""
+    return _node_hash(bucket_hashes)
+
+
+def diff_trees(old_tree, new_tree, old, new, prefix=()):
+    """storage.Change list turning product old into new, given their product_tree()s.
+
+    Only children whose hashes differ are visited; below a part the leaves
+    are compared directly.
+    """
+    changes = []
+    old_children, new_children = old_tree[1], new_tree[1]
+    for key in list(old_children) + [k for k in new_children if k not in old_children]:
+        a, b = old_children.get(key), new_children.get(key)
+        if a is not None and b is not None and a[0] == b[0]:
+            continue
+        if a is not None and b is not None and a[1] is not None and b[1] is not None:
+            changes.extend(diff_trees(a, b, old[key], new[key], prefix + (key,)))
+            continue
+        before = storage.prune_empty({key: old[key]} if a is not None else {})
+        after = storage.prune_empty({key: new[key]} if b is not None else {})
+        changes.extend(storage.Change(prefix + change.path, change.old, change.new) for change in storage.diff_leaves(before, after))
+    return changes
+
+
+class MerkleIndex(storage.StoreIndex):
+    """The hash tree of one repository, with its log of saved product hashes.
+
+    With verify, the first build is checked against the log (see problems()).
+    """
+
+    READS_PRODUCT = True
+
+    def __init__(self, log_path, verify=False):
+        super().__init__()
+        self.log_path = Path(log_path)
+        self._verify_next = verify
+        # bucket -> {product_id: product tree}; a bucket's dict is replaced, never edited, so snapshots can share it
+        self._buckets = {}
+        self._bucket_hashes = {}
+        self._revisions = {}  # product_id -> revision
+        self._problems = {}  # product_id -> "changed" | "older" | "missing", found on load
+        self._expected = {}  # product_id -> log entry the store failed to match
+        self._log_lines = 0
+
+    def _scan(self, repo):
+        buckets, revisions = {}, {}
+        for pid, product in repo.iter_products():
+            buckets.setdefault(bucket_of(pid), {})[pid] = product_tree(product)
+            revisions[pid] = product.get("revision", 0)
+        return buckets, revisions
+
+    def _install(self, state):
+        self._buckets, self._revisions = state
+        self._bucket_hashes = {b: bucket_hash({pid: tree[0] for pid, tree in products.items()}) for b, products in self._buckets.items()}
+        self._problems, self._expected = {}, {}
+        if self._verify_next:
+            self._verify_next = False
+            self._verify()
+        self._compact()
+
+    def _read_log(self):
+        entries = {}
+        if self.log_path.exists():
+            for line in self.log_path.read_bytes().splitlines():
+                try:
+                    entry = json.loads(line)
+                    entries[entry["product_id"]] = entry
+                except (ValueError, KeyError, TypeError):
+                    continue  # an interrupted append
+        return entries
+
+    def _verify(self):
+        for pid, entry in self._read_log().items():
+            if entry.get("hash") is None:
+                continue
+            if pid not in self._revisions:
+                problem = "missing"
+            elif self._revisions[pid] < entry["revision"]:
+                problem = "older"
+            elif self._revisions[pid] == entry["revision"] and self._buckets[bucket_of(pid)][pid][0] != entry["hash"]:
+                problem = "changed"
+            else:
+                # Saved after the last logged hash (e.g. a crash before the log was appended)
+                continue
+            self._problems[pid] = problem
+            self._expected[pid] = entry
+
+    def _compact(self):
+        """Rewrite the log with one line per product; products with a problem keep their expected entry."""
+        lines = [
+            self._expected.get(pid) or {"product_id": pid, "revision": revision, "hash": self._buckets[bucket_of(pid)][pid][0]}
+            for pid, revision in self._revisions.items()
+        ]
+        lines.extend(self._expected[pid] for pid in self._expected if pid not in self._revisions)
+        self.log_path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.log_path.with_name(self.log_path.name + ".tmp")
+        tmp_path.write_bytes(b"".join(json.dumps(line, separators=(",", ":")).encode("utf-8") + b"\n" for line in lines))
+        os.replace(tmp_path, self.log_path)
+        self._log_lines = len(lines)
+
+    def _apply(self, product_id, changes, product):
+        if product is None:
+            tree = revision = None
+        else:
+            previous = self._buckets.get(bucket_of(product_id), {}).get(product_id)
+            tree, revision = product_tree(product, previous, changes), product.get("revision", 0)
+        b = bucket_of(product_id)
+        products = dict(self._buckets.get(b, {}))
+        if tree is None:
+            products.pop(product_id, None)
+            self._revisions.pop(product_id, None)
+        else:
+            products[product_id] = tree
+            self._revisions[product_id] = revision
+        if products:
+            self._buckets[b] = products
+            self._bucket_hashes[b] = bucket_hash({pid: t[0] for pid, t in products.items()})
+        else:
+            self._buckets.pop(b, None)
+            self._bucket_hashes.pop(b, None)
+        # A save or delete through the app supersedes whatever was found on load
+        self._problems.pop(product_id, None)
+        self._expected.pop(product_id, None)
+        entry = {"product_id": product_id, "revision": revision, "hash": tree and tree[0]}
+        with open(self.log_path, "ab") as f:
+            f.write(json.dumps(entry, separators=(",", ":")).encode("utf-8") + b"\n")
+        self._log_lines += 1
+        if self._log_lines > 2 * len(self._revisions) + 1000:
+            self._compact()
+
+    def root(self):
+        """The store's root hash."""
+        with self._lock:
+            return root_hash(self._bucket_hashes)
+
+    def header(self):
+        """The hashes exported with a backup: {"version", "root", "buckets"}."""
+        with self._lock:
+            return {"version": HASH_VERSION, "root": root_hash(self._bucket_hashes), "buckets": dict(self._bucket_hashes)}
+
+    def problems(self):
+        """{product_id: "changed" | "older" | "missing"} for products that did not match the log on load.
+
+        "changed": same revision, different content; "older": the store has
+        an earlier revision than was last saved; "missing": the product was
+        saved and never deleted, but is gone.
+        """
+        with self._lock:
+            return dict(self._problems)
+
+    def accept(self):
+        """Take the store as it is now as correct, clearing the problems found on load."""
+        with self._lock:
+            self._problems, self._expected = {}, {}
+            self._compact()
+
+    def compare_backup(self, repo, items):
+        """Compare the store with a backup given as backup.iter_backup() items.
+
+        When the backup carries hashes of this version and schema, buckets
+        whose hash matches are skipped unhashed, and a matching root ends the
+        read right after the header. Returns {"identical", "used_header",
+        "read", "hashed", "changed": {product_id: [storage.Change from store
+        to backup]}, "only_in_store", "only_in_backup"}.
+        """
+        with self._lock:
+            buckets, bucket_hashes = dict(self._buckets), dict(self._bucket_hashes)
+        result = {"identical": False, "used_header": False, "read": 0, "hashed": 0, "changed": {}, "only_in_store": [], "only_in_backup": []}
+        schema_version, differing, seen = 0, None, set()
+        for kind, key, value in items:
+            if kind == "meta":
+                if key == "schema_version" and isinstance(value, int):
+                    schema_version = value
+                elif (key == "merkle" and isinstance(value, dict) and value.get("version") == HASH_VERSION
+                      and isinstance(value.get("buckets"), dict) and schema_version == migrations.SCHEMA_VERSION):
+                    result["used_header"] = True
+                    if value.get("root") == root_hash(bucket_hashes):
+                        result["identical"] = True
+                        return result
+                    theirs = value["buckets"]
+                    differing = {b for b in set(theirs) | set(bucket_hashes) if theirs.get(b) != bucket_hashes.get(b)}
+                continue
+            result["read"] += 1
+            b = bucket_of(key) if isinstance(key, str) else None
+            if b is None or not isinstance(value, dict) or differing is not None and b not in differing:
+                continue
+            seen.add(key)
+            migrations.migrate_product(value, schema_version)
+            tree = product_tree(value)
+            result["hashed"] += 1
+            ours = buckets.get(b, {}).get(key)
+            if ours is None:
+                result["only_in_backup"].append(key)
+            elif ours[0] != tree[0]:
+                # The stored product is re-read, as it may have been saved since the snapshot above
+                current = repo.get_product(key) or {}
+                changes = diff_trees(product_tree(current), tree, current, value)
+                if changes:
+                    result["changed"][key] = changes
+        for b in buckets if differing is None else differing:
+            result["only_in_store"].extend(pid for pid in buckets.get(b, {}) if pid not in seen)
+        result["identical"] = not (result["changed"] or result["only_in_store"] or result["only_in_backup"])
+        return result
+
+
+def get_index(repo, data_dir):
+    """The process-wide Merkle index of repo, built and checked against data/merkle.jsonl on first use."""
+    return storage.attach_index(repo, "merkle", lambda: MerkleIndex(Path(data_dir) / "merkle.jsonl", verify=True))
@@ -0,0 +1,126 @@
+"""Versioned schema migrations for the product store.
+
+The store carries a top-level ``schema_version``. Each migration is a function
+of one product registered under the version it upgrades the store to; they
+run in order, once, the first time a process opens the store (or when an
+older backup is restored). Reruns only check an in-process flag.
+
+Run by hand with: python migrations.py [json|sharded|sqlite] [data_dir]
+"""
+import copy
+import threading
+
+import storage
+
+# Ordered (version, function) pairs; a function takes one product, edits it in place and returns True if it changed
+MIGRATIONS = []
+
+
+def migration(version):
+    """Register a product migration that brings the store up to version."""
+    def register(fn):
+        if MIGRATIONS and version <= MIGRATIONS[-1][0]:
+            raise ValueError(f"Migration {fn.__name__} must have a version above {MIGRATIONS[-1][0]}")
+        MIGRATIONS.append((version, fn))
+        return fn
+    return register
+
+
+@migration(1)
+def remove_last_updated(product):
+    """Drop the deprecated 'last_updated' timestamp."""
+    if "last_updated" not in product:
+        return False
+    del product["last_updated"]
+    return True
+
+
+@migration(2)
+def remove_simple_edit(product):
+    """Drop the retired 'simple_edit' section."""
+    if "simple_edit" not in product:
+        return False
+    del product["simple_edit"]
+    return True
+
+
+@migration(3)
+def drop_empty_leaves(product):
+    """Drop the unanswered fields older versions stored for every template leaf."""
+    pruned = storage.prune_empty(product)
+    if pruned == product:
+        return False
+    product.clear()
+    product.update(pruned)
+    return True
+
+
+SCHEMA_VERSION = MIGRATIONS[-1][0]
+
+
+def migrate_document(document):
+    """Apply all pending migrations to an aggregated document in place.
+
+    Returns the names of the migrations that were run and stamps the document
+    with the current SCHEMA_VERSION.
+    """
+    version = document.get("schema_version", 0)
+    applied = []
+    for target, fn in MIGRATIONS:
+        if target <= version:
+            continue
+        for product in document.get("products", {}).values():
+            if isinstance(product, dict):
+                fn(product)
+        applied.append(fn.__name__)
+    document["schema_version"] = max(version, SCHEMA_VERSION)
+    return applied
+
+
+def migrate_product(product, version):
+    """Apply the migrations above version to one product in place (for streamed restores)."""
+    for target, fn in MIGRATIONS:
+        if target > version:
+            fn(product)
+    return product
+
+
+_migrated = set()
+_migrated_lock = threading.Lock()
+
+
+def migrate_store(repo, writer):
+    """Bring the store behind repo up to SCHEMA_VERSION, once per process.
+
+    The check and the rewrite run on the writer thread, so no save can slip in
+    between reading the old document and replacing it.
+    """
+    if id(repo) in _migrated:
+        return []
+    with _migrated_lock:
+        if id(repo) in _migrated:
+            return []
+
+        def run(repo):
+            document = repo.load()
+            if document.get("schema_version", 0) >= SCHEMA_VERSION:
+                return []
+            # load() may hand out the repository's cached document
+            document = copy.deepcopy(document)
+            applied = migrate_document(document)
+            repo.replace(document)
+            return applied
+
+        applied = writer.submit(run)
+        _migrated.add(id(repo))
+        return applied
+
+
+if __name__ == "__main__":
+    import sys
+
+    mode = sys.argv[1] if len(sys.argv) > 1 else "json"
+    data_dir = sys.argv[2] if len(sys.argv) > 2 else "data"
+    repo = storage.ensure_store(mode, data_dir)
+    applied = migrate_store(repo, storage.get_writer(mode, data_dir))
+    print(f"Schema version {SCHEMA_VERSION}; applied: {', '.join(applied) or 'nothing'}")
@@ -0,0 +1,160 @@
+"""Opt-in profiling of whole reruns with cProfile and tracemalloc.
+
+A profiled rerun keeps its cProfile stats, stack samples of the rerun's
+thread, peak traced memory and top allocation sites in a ring buffer of the
+last KEEP captures, tagged with the page and the session. The Diagnostics
+page lists them and offers each as a .pstats file (for pstats/snakeviz) or as
+collapsed stacks (for flamegraph.pl or speedscope).
+
+The flame graph comes from sampling rather than from cProfile's caller
+totals: those only record one level of callers, and since Python 3.12
+cProfile sees every thread, so the server's own threads end up in them.
+
+Switch it on for every rerun with WORKSHOP_PROFILE=1, or for one session
+with ?profile=1 in the URL. cProfile and tracemalloc are process-wide, so
+only one rerun is profiled at a time; concurrent reruns run unprofiled, and
+allocations made by other sessions meanwhile are counted too.
+"""
+import collections
+import cProfile
+import itertools
+import marshal
+import os
+import sys
+import threading
+import time
+import tracemalloc
+
+ENABLED = os.environ.get("WORKSHOP_PROFILE", "0") not in ("0", "")
+KEEP = int(os.environ.get("WORKSHOP_PROFILE_KEEP", "20"))
+# Frames kept per allocation traceback; more costs memory and time while tracing
+TRACE_FRAMES = 5
+# Seconds between stack samples of the profiled thread
+SAMPLE_INTERVAL = 0.001
+
+_captures = collections.deque(maxlen=KEEP)
+_ids = itertools.count(1)
+_lock = threading.Lock()
+_active = threading.Lock()
+
+
+def run(fn, page, session):
+    """Call fn() under cProfile and tracemalloc and keep the capture; returns fn()'s result.
+
+    page() is called afterwards for the tag, so it can name the page the rerun
+    ended up on. A rerun interrupted by an exception (st.rerun() included) is
+    still captured.
+    """
+    if not _active.acquire(blocking=False):
+        return fn()
+    profile = cProfile.Profile()
+    started_tracing = not tracemalloc.is_tracing()
+    if started_tracing:
+        tracemalloc.start(TRACE_FRAMES)
+    tracemalloc.reset_peak()
+    started_at = time.time()
+    started = time.perf_counter()
+    sampler = _Sampler(threading.get_ident())
+    try:
+        sampler.start()
+        profile.enable()
+        return fn()
+    finally:
+        profile.disable()
+        sampler.stop()
+        seconds = time.perf_counter() - started
+        try:
+            _, peak = tracemalloc.get_traced_memory()
+            allocations = [
+                {"line": str(stat.traceback[0]), "bytes": stat.size, "blocks": stat.count}
+                for stat in tracemalloc.take_snapshot().statistics("lineno")[:15]
+            ]
+        finally:
+            if started_tracing:
+                tracemalloc.stop()
+            _active.release()
+        profile.create_stats()
+        with _lock:
+            _captures.append({
+                "id": next(_ids),
+                "page": page(),
+                "session": session,
+                "started": started_at,
+                "seconds": seconds,
+                "peak_bytes": peak,
+                "allocations": allocations,
+                "stats": profile.stats,
+                "samples": sampler.samples,
+            })
+
+
+# Sampled stacks start below run(), at the profiled function
+_run_code = run.__code__
+
+
+class _Sampler(threading.Thread):
+    """Counts the call stacks of one thread every SAMPLE_INTERVAL seconds."""
+
+    def __init__(self, thread_id):
+        super().__init__(name="workshop-profile-sampler", daemon=True)
+        self.thread_id = thread_id
+        self.samples = collections.Counter()
+        self._stopped = threading.Event()
+
+    def run(self):
+        while not self._stopped.wait(SAMPLE_INTERVAL):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None and frame.f_code is not _run_code:
+                code = frame.f_code
+                stack.append(f"{os.path.basename(code.co_filename)}:{code.co_firstlineno}({code.co_name})")
+                frame = frame.f_back
+            if stack:
+                self.samples[";".join(reversed(stack))] += 1
+
+    def stop(self):
+        self._stopped.set()
+        self.join()
+
+
+def captures():
+    """The kept captures, newest first."""
+    with _lock:
+        return list(reversed(_captures))
+
+
+def get(capture_id):
+    with _lock:
+        return next((c for c in _captures if c["id"] == capture_id), None)
+
+
+def _label(func):
+    filename, line, name = func
+    if filename == "~":
+        return name  # built-in, e.g. <built-in method json.loads>
+    return f"{os.path.basename(filename)}:{line}({name})"
+
+
+def top_functions(capture, limit=30):
+    """The functions with the most cumulative time, as table rows."""
+    rows = [
+        {"function": _label(func), "calls": nc, "self_ms": tt * 1e3, "cumulative_ms": ct * 1e3}
+        for func, (cc, nc, tt, ct, callers) in capture["stats"].items()
+    ]
+    return sorted(rows, key=lambda row: -row["cumulative_ms"])[:limit]
+
+
+def pstats_bytes(capture):
+    """The capture in the marshal format written by pstats.Stats.dump_stats()."""
+    return marshal.dumps(capture["stats"])
+
+
+def collapsed_stacks(capture):
+    """The capture's stack samples as collapsed stacks ("a;b;c microseconds" per line) for flame graphs.
+
+    Samples are weighted by the rerun's wall time over the sample count, as
+    the sampler's wake-ups drift past SAMPLE_INTERVAL under load.
+    """
+    samples = capture["samples"]
+    weight = capture["seconds"] * 1e6 / (sum(samples.values()) or 1)
+    return "".join(f"{stack} {round(count * weight)}\n" for stack, count in samples.items())
@@ -0,0 +1,164 @@
+"""Full-text search over the workshop session answers.
+
+An inverted index maps each token to the products and session fields it
+appears in. It is built once per process from the store and then kept up to
+date from the repository's save/delete notifications (see
+storage.StoreRepository.subscribe), so a query never rescans the store.
+"""
+import math
+import re
+from collections import Counter
+
+import storage
+
+# Sessions whose text answers are searchable
+SEARCHABLE_SECTIONS = ("technical_session", "business_owner_session")
+
+STOPWORDS = frozenset(
+    "a an and are as at be by do does for from has have how in is it its of on or that the this to "
+    "was we what when where which who why will with you your".split()
+)
+
+_TOKEN = re.compile(r"[a-z0-9]+")
+
+
+def tokenize(text):
+    """Lower-case word tokens of text, without stopwords and single characters."""
+    return [t for t in _TOKEN.findall(text.lower()) if len(t) > 1 and t not in STOPWORDS]
+
+
+def leaf_text(value):
+    """The searchable text of a leaf: strings as-is, quote lists joined speaker and quote."""
+    if isinstance(value, str):
+        return value
+    if isinstance(value, list):
+        return "\n".join(leaf_text(v) for v in value)
+    if isinstance(value, dict):
+        return " ".join(leaf_text(v) for v in value.values())
+    return ""
+
+
+def snippet(text, tokens, width=80):
+    """A window of text around the first query token, with matched words in bold."""
+    pattern = re.compile(rf"\b({'|'.join(re.escape(t) for t in tokens)})\w*", re.IGNORECASE)
+    first = pattern.search(text)
+    start = max(0, first.start() - width // 2) if first else 0
+    window = text[start:start + width * 2].replace("\n", " ")
+    window = pattern.sub(lambda m: f"**{m.group(0)}**", window)
+    return ("…" if start else "") + window + ("…" if start + width * 2 < len(text) else "")
+
+
+def _weight(fields):
+    return sum(1 + math.log(count) for count in fields.values())
+
+
+class SearchIndex(storage.StoreIndex):
+    """Inverted index from token to {product_id: {leaf path: term count}}."""
+
+    def __init__(self):
+        super().__init__()
+        self._postings = {}
+        # token -> {product_id: summed log term frequency}, kept alongside the postings for scoring
+        self._weights = {}
+        self._texts = {}
+        self._leaves = {}
+
+    def _scan(self, repo):
+        # Filled in a scratch index, so queries keep using the current one meanwhile
+        fresh = SearchIndex()
+        for pid, product in repo.iter_products():
+            if isinstance(product, dict):
+                for section in SEARCHABLE_SECTIONS:
+                    for path, value in storage.iter_leaves(product.get(section) or {}, (section,)):
+                        fresh._set_leaf(pid, path, leaf_text(value))
+        return fresh._postings, fresh._weights, fresh._texts, fresh._leaves
+
+    def _install(self, state):
+        self._postings, self._weights, self._texts, self._leaves = state
+
+    def _apply(self, product_id, changes, product):
+        if changes is None:
+            for path in list(self._leaves.get(product_id, ())):
+                self._set_leaf(product_id, path, "")
+            return
+        # Re-index only the session leaves a save changed
+        for change in changes:
+            if change.path[0] not in SEARCHABLE_SECTIONS:
+                continue
+            if isinstance(change.old, dict) or isinstance(change.new, dict):
+                # A subtree was replaced wholesale; drop the leaves that lived under it
+                depth = len(change.path)
+                for path in [p for p in self._leaves.get(product_id, ()) if p[:depth] == change.path]:
+                    self._set_leaf(product_id, path, "")
+            if not isinstance(change.new, dict):
+                self._set_leaf(product_id, change.path, leaf_text(change.new))
+
+    def _set_leaf(self, pid, path, text):
+        old = self._texts.pop((pid, path), "")
+        for token in set(tokenize(old)):
+            docs = self._postings.get(token, {})
+            fields = docs.get(pid, {})
+            fields.pop(path, None)
+            if fields:
+                self._weights[token][pid] = _weight(fields)
+            else:
+                docs.pop(pid, None)
+                self._weights[token].pop(pid, None)
+            if not docs:
+                self._postings.pop(token, None)
+                self._weights.pop(token, None)
+        self._leaves.setdefault(pid, set()).discard(path)
+        if not text.strip():
+            if not self._leaves[pid]:
+                del self._leaves[pid]
+            return
+        for token, count in Counter(tokenize(text)).items():
+            fields = self._postings.setdefault(token, {}).setdefault(pid, {})
+            fields[path] = count
+            weights = self._weights.setdefault(token, {})
+            weights[pid] = weights.get(pid, 0) + 1 + math.log(count)
+        self._texts[(pid, path)] = text
+        self._leaves.setdefault(pid, set()).add(path)
+
+    def search(self, query, limit=50, snippets=5):
+        """Rank products for a query.
+
+        Products matching more of the query words come first, then by tf-idf
+        summed over their matching fields. Each hit lists every matching leaf
+        path and a snippet for the best few of them.
+        """
+        tokens = list(dict.fromkeys(tokenize(query)))
+        if not tokens:
+            return []
+        with self._lock:
+            total = max(1, len(self._leaves))
+            scores, matched = Counter(), Counter()
+            for token in tokens:
+                weights = self._weights.get(token, {})
+                if not weights:
+                    continue
+                idf = math.log(1 + total / len(weights))
+                for pid, weight in weights.items():
+                    scores[pid] += idf * weight
+                    matched[pid] += 1
+            ranked = sorted(scores, key=lambda pid: (-matched[pid], -scores[pid], pid))[:limit]
+            hits = []
+            for pid in ranked:
+                # Per-field relevance, only for the products we return
+                fields = Counter()
+                for token in tokens:
+                    for path, count in self._postings.get(token, {}).get(pid, {}).items():
+                        fields[path] += 1 + math.log(count)
+                hits.append({
+                    "product_id": pid,
+                    "score": round(scores[pid], 3),
+                    "matched": matched[pid],
+                    "paths": sorted(fields),
+                    "snippets": [(path, snippet(self._texts[(pid, path)], tokens)) for path, _ in fields.most_common(snippets)],
+                })
+            return hits
+
+
+def get_index(repo):
+    """The process-wide search index for repo, built on first use and then kept current."""
+    return storage.attach_index(repo, "search", SearchIndex)
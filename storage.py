@@ -0,0 +1,1612 @@
+"""Storage backends for the workshop store.
+
+Every backend exposes the same repository interface and speaks the
+aggregated.json document shape (``{"products": {<product_id>: {...}}, ...}``),
+so the helpers in app.py do not care where the data lives:
+
+- ``json``: the single data/aggregated.json file (default).
+- ``sharded``: one file per product under data/products/ plus a manifest.
+- ``sqlite``: data/workshop.db, one row per product and per session section.
+
+Products are stored sparse: only answered fields are kept, and blank ones
+are dropped on every write (see merge_changes()). Readers that need every
+field overlay the product template with with_defaults(). Dense products
+written by older versions read the same way.
+
+This lives in its own module rather than in app.py because Streamlit
+re-executes app.py on every rerun; imported modules are loaded once per
+process, so the caches, locks and connections below are shared by all
+sessions.
+"""
+
+import hashlib
+import json
+import logging
+import os
+import queue
+import re
+import shutil
+import sqlite3
+import threading
+from collections import namedtuple
+from contextlib import contextmanager
+from pathlib import Path
+
+import diagnostics
+
+logger = logging.getLogger(__name__)
+
+_MISSING = object()
+
+# One changed leaf: path is a tuple of keys, old is None for a leaf that did not exist
+Change = namedtuple("Change", "path old new")
+
+
+@diagnostics.timed("merge_changes")
+def merge_changes(target, source, apply=True):
+    """Deep merge source dict into target dict and return the leaves that changed.
+
+    Only values that actually differ are written, so merging a form payload
+    that matches the stored product leaves it untouched and returns an empty
+    list. Empty values ("", [], {} or None, see is_empty()) delete the leaf
+    instead of being stored; the change then has new=None. With apply=False
+    target is not modified (a dry run).
+    """
+    changes = []
+    _merge_into(target, source, (), changes, apply)
+    return changes
+
+
+def _merge_into(target, source, prefix, changes, apply):
+    for key, value in source.items():
+        current = target.get(key, _MISSING)
+        if isinstance(value, dict) and isinstance(current, dict):
+            before = len(changes)
+            _merge_into(current, value, prefix + (key,), changes, apply)
+            if apply and not current and len(changes) > before:
+                del target[key]
+            continue
+        if isinstance(value, dict):
+            value = prune_empty(value)
+        if is_empty(value):
+            # Blank values remove the stored leaf; one that is missing (or blank, in a dense file) stays as it is
+            if current is _MISSING or is_empty(current):
+                continue
+            changes.append(Change(prefix + (key,), current, None))
+            if apply:
+                del target[key]
+            continue
+        if current is not _MISSING and current == value:
+            continue
+        if isinstance(value, dict):
+            changes.extend(Change(path, None, leaf) for path, leaf in iter_leaves(value, prefix + (key,)))
+        else:
+            changes.append(Change(prefix + (key,), None if current is _MISSING else current, value))
+        if apply:
+            target[key] = value
+
+
+def is_empty(value):
+    """True for the values of an unanswered field, which the store does not keep."""
+    return value is None or value == "" or value == [] or value == {}
+
+
+def prune_empty(data):
+    """A copy of a nested dict without its empty leaves, or dicts left empty by removing them."""
+    pruned = {}
+    for key, value in data.items():
+        if isinstance(value, dict):
+            value = prune_empty(value)
+        if not is_empty(value):
+            pruned[key] = value
+    return pruned
+
+
+def _sparse_document(document):
+    products = {pid: prune_empty(product) for pid, product in document.get("products", {}).items()}
+    return dict(document, products=products)
+
+
+def with_defaults(template, data):
+    """data overlaid on template: leaves data lacks come from the template, its other keys are kept.
+
+    Products are stored sparse (see prune_empty()), so this is how readers get
+    the full, dense shape back. Leaves are shared with data, not copied.
+    """
+    merged = {}
+    for key, default in template.items():
+        value = data.get(key, _MISSING)
+        if isinstance(default, dict) and (value is _MISSING or isinstance(value, dict)):
+            merged[key] = with_defaults(default, {} if value is _MISSING else value)
+        elif value is _MISSING:
+            merged[key] = list(default) if isinstance(default, list) else default
+        else:
+            merged[key] = value
+    for key, value in data.items():
+        if key not in merged:
+            merged[key] = value
+    return merged
+
+
+def changes_to_patch(changes):
+    """Turn a list of changes back into a nested patch holding only the new values."""
+    patch = {}
+    for change in changes:
+        _set_path(patch, change.path, change.new)
+    return patch
+
+
+def diff_leaves(old, new):
+    """Changes that turn old into new leaf by leaf; removed leaves get new=None."""
+    old_leaves = dict(iter_leaves(old))
+    new_leaves = dict(iter_leaves(new))
+    changes = [Change(path, old_leaves.get(path), value) for path, value in new_leaves.items()
+               if path not in old_leaves or old_leaves[path] != value]
+    changes.extend(Change(path, value, None) for path, value in old_leaves.items() if path not in new_leaves)
+    return changes
+
+
+def _copy_tree(data):
+    """Copy the dicts of a nested dict; leaves are shared, as saves replace them rather than edit them."""
+    return {key: _copy_tree(value) if isinstance(value, dict) else value for key, value in data.items()}
+
+
+def _created(product):
+    """Changes describing a product that did not exist before."""
+    return [Change(path, None, value) for path, value in iter_leaves(product)]
+
+
+def _get_path(data, path):
+    for key in path:
+        if not isinstance(data, dict) or key not in data:
+            return _MISSING
+        data = data[key]
+    return data
+
+
+def _set_path(data, path, value):
+    for key in path[:-1]:
+        data = data.setdefault(key, {})
+    data[path[-1]] = value
+
+
+def iter_leaves(data, prefix=()):
+    """Yield (path, value) for every non-dict value in a nested dict."""
+    for key, value in data.items():
+        if isinstance(value, dict):
+            yield from iter_leaves(value, prefix + (key,))
+        else:
+            yield prefix + (key,), value
+
+
+def three_way_merge(base, mine, theirs):
+    """Merge the leaves of patch mine into theirs, using base as the common ancestor.
+
+    Returns (patch, conflicts). The patch holds the leaves of mine to apply:
+    those the editor changed while the stored value is still the base one.
+    Leaves the editor left untouched keep their stored value. A leaf changed
+    on both sides to different values is a conflict, reported as
+    ``{"path", "base", "mine", "theirs"}`` (missing values are None). A
+    missing leaf counts as blank, as stored products are sparse.
+    """
+    patch = {}
+    conflicts = []
+    for path, value in iter_leaves(mine):
+        base_value = _get_path(base, path)
+        their_value = _get_path(theirs, path)
+        if same_answer(value, their_value) or same_answer(value, base_value):
+            continue
+        if same_answer(their_value, base_value):
+            _set_path(patch, path, value)
+        else:
+            conflicts.append({
+                "path": path,
+                "base": None if base_value is _MISSING else base_value,
+                "mine": value,
+                "theirs": None if their_value is _MISSING else their_value,
+            })
+    return patch, conflicts
+
+
+def same_answer(a, b):
+    """Whether two leaf values are the same answer: equal, or both empty or missing from a sparse product."""
+    return a == b or (a is _MISSING or is_empty(a)) and (b is _MISSING or is_empty(b))
+
+
+class SaveConflict(Exception):
+    """A save collided with a concurrent save and some fields were changed on both sides.
+
+    ``merged`` holds the non-conflicting part of the save, already resolved
+    against ``current`` (the stored product at ``revision``); nothing has been
+    written yet. Use ``resolution()`` to build the patch for a retry.
+    """
+
+    def __init__(self, product_id, revision, conflicts, merged, current):
+        paths = ", ".join(".".join(c["path"]) for c in conflicts)
+        super().__init__(f"Product {product_id!r} changed concurrently; conflicting fields: {paths}")
+        self.product_id = product_id
+        self.revision = revision
+        self.conflicts = conflicts
+        self.merged = merged
+        self.current = current
+
+    def resolution(self, keep_mine):
+        """Return the patch that resolves every conflict in favor of mine or theirs."""
+        patch = json.loads(json.dumps(self.merged))
+        if keep_mine:
+            for conflict in self.conflicts:
+                _set_path(patch, conflict["path"], conflict["mine"])
+        return patch
+
+
+# Listing fields the Products table can filter and sort on
+SUMMARY_FIELDS = ("product_name", "business_owner", "workstream")
+
+def is_answered(value, default):
+    """True for a field holding a non-blank value other than its template default.
+
+    The maturity scores start at 3, so they only count once changed.
+    """
+    return value is not _MISSING and not is_empty(value) and value != default
+
+
+def summarize_product(product_id, product):
+    """Return the listing row for a product: what the Products page and the editors' headers need."""
+    return {
+        "product_id": product_id,
+        "product_name": product.get("product_name", ""),
+        "business_owner": product.get("business_owner", ""),
+        "workstream": product.get("workstream", ""),
+        "revision": product.get("revision", 0),
+    }
+
+
+def product_file_stem(product_id):
+    """File name (without suffix) for per-product files: plain slugs as-is, other IDs hashed."""
+    if re.fullmatch(r"[a-z0-9]+(?:-[a-z0-9]+)*", product_id or ""):
+        return product_id
+    return hashlib.sha1(product_id.encode()).hexdigest()
+
+
+def _file_revision(path):
+    """Return a cheap revision marker (mtime, size) for a file, or None if it is missing."""
+    try:
+        stat = path.stat()
+    except FileNotFoundError:
+        return None
+    return (stat.st_mtime_ns, stat.st_size)
+
+
+class JsonFileCache:
+    """Process-wide cache of parsed JSON files, invalidated by file revision.
+
+    A file is only re-read when its mtime/size changes, and only re-parsed
+    when the content hash changes too. Returned objects are shared, so callers
+    that modify one must write it straight back.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._entries = {}
+
+    def read(self, path):
+        revision = _file_revision(path)
+        if revision is None:
+            return None
+        with self._lock:
+            entry = self._entries.setdefault(str(path), {"revision": None, "digest": None, "data": None})
+            if entry["revision"] != revision:
+                with diagnostics.span("file read") as span:
+                    raw = path.read_bytes()
+                    span.bytes_read = len(raw)
+                    digest = hashlib.sha256(raw).hexdigest()
+                    if digest != entry["digest"]:
+                        entry["data"] = json.loads(raw)
+                        entry["digest"] = digest
+                entry["revision"] = revision
+            return entry["data"]
+
+    def write(self, path, data, indent=2):
+        """Write a JSON document via a temp file + rename and refresh its entry."""
+        with diagnostics.span("file write") as span:
+            raw = json.dumps(data, indent=indent).encode("utf-8")
+            span.bytes_written = len(raw)
+            tmp_path = path.with_name(path.name + ".tmp")
+            with self._lock:
+                with open(tmp_path, "wb") as f:
+                    f.write(raw)
+                    f.flush()
+                    os.fsync(f.fileno())
+                os.replace(tmp_path, path)
+            self._entries[str(path)] = {
+                "revision": _file_revision(path),
+                "digest": hashlib.sha256(raw).hexdigest(),
+                "data": data,
+            }
+
+    def forget(self, path):
+        with self._lock:
+            self._entries.pop(str(path), None)
+
+
+file_cache = JsonFileCache()
+
+
+class StoreSnapshot:
+    """The store as of one commit (see StoreRepository.snapshot()); readable from any thread while saves go on.
+
+    It has a repository's document_meta() and iter_products(), so streaming
+    code can read either. iter_products() can be run once; close() when done.
+    """
+
+    def __init__(self, meta, products, close=None):
+        self._meta = meta
+        self._products = products
+        self._close = close
+
+    def document_meta(self):
+        return dict(self._meta)
+
+    def iter_products(self):
+        yield from self._products
+
+    def close(self):
+        if self._close is not None:
+            self._close()
+            self._close = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+class StoreRepository:
+    """Interface implemented by every storage backend.
+
+    Documents returned by ``load()`` and ``get_product()`` may be shared with
+    other sessions and must be treated as read-only; all writes go through
+    ``save_product()``, ``merge_product()``, ``delete_product()`` or
+    ``replace()``, called from the repository's StoreWriter thread.
+    """
+
+    name = ""
+
+    @contextmanager
+    def batch(self):
+        """Group several writes into one durable commit (used by StoreWriter)."""
+        yield
+
+    def save_product(self, product_id, patch, template=None, expected_revision=None, base=None):
+        """Compare-and-swap save of one product; returns the changed leaves.
+
+        Every save bumps the product's ``revision``. When expected_revision is
+        given and the stored revision has moved on, the patch is three-way
+        merged against base (the values the editor started from) and
+        SaveConflict is raised if any field was changed on both sides. The
+        compare and the write are atomic because only the writer thread saves.
+
+        Returns the list of changed leaves. A save that changes nothing is not
+        written at all and does not bump the revision.
+        """
+        current = self.get_product(product_id)
+        revision = (current or {}).get("revision", 0)
+        if expected_revision is not None and expected_revision != revision:
+            patch, conflicts = three_way_merge(base or {}, patch, current or {})
+            if conflicts:
+                raise SaveConflict(product_id, revision, conflicts, patch, json.loads(json.dumps(current)))
+        if current is not None:
+            changes = merge_changes(current, patch, apply=False)
+            if not changes:
+                return changes
+            patch = changes_to_patch(changes)
+        if template is not None:
+            template = prune_empty(template)
+        changes = self.merge_product(product_id, dict(patch, revision=revision + 1), template)
+        changes = [change for change in changes if change.path != ("revision",)]
+        self._notify(product_id, changes)
+        return changes
+
+    def exists(self):
+        """Return True if the store has been initialized on disk."""
+        raise NotImplementedError
+
+    def load(self):
+        """Return the whole store as a single aggregated document."""
+        raise NotImplementedError
+
+    def get_product(self, product_id):
+        """Return one product, or None if it does not exist."""
+        raise NotImplementedError
+
+    def list_products(self):
+        """Return ``summarize_product()`` rows for every product, without session bodies."""
+        raise NotImplementedError
+
+    def get_summary(self, product_id):
+        """Return the ``summarize_product()`` row of one product, or None if it does not exist."""
+        product = self.get_product(product_id)
+        return summarize_product(product_id, product) if product is not None else None
+
+    def iter_products(self):
+        """Yield (product_id, product) one at a time, for streaming the whole store."""
+        yield from self.load().get("products", {}).items()
+
+    def document_meta(self):
+        """Return the top-level fields of the aggregated document other than products."""
+        return {k: v for k, v in self.load().items() if k != "products"}
+
+    def snapshot(self):
+        """Return a StoreSnapshot of the store that later saves leave unchanged.
+
+        Take it between batches (StoreWriter.read()), then read it without any
+        lock. The default shares load()'s document, which writes replace
+        rather than edit.
+        """
+        document = self.load()
+        return StoreSnapshot({k: v for k, v in document.items() if k != "products"}, document.get("products", {}).items())
+
+    def query_products(self, filters=None, sort=None, descending=False, offset=0, limit=None):
+        """Return one page of named product summaries and the total number of matches.
+
+        filters maps a SUMMARY_FIELDS name to the allowed values; sort is a
+        SUMMARY_FIELDS name (case-insensitive) or None for catalog order.
+        """
+        if sort is not None and sort not in SUMMARY_FIELDS:
+            raise ValueError(f"Cannot sort products by {sort!r}")
+        rows = [row for row in self.list_products() if row["product_name"]]
+        for field, values in (filters or {}).items():
+            if field not in SUMMARY_FIELDS:
+                raise ValueError(f"Cannot filter products by {field!r}")
+            if values:
+                rows = [row for row in rows if row[field] in values]
+        if sort:
+            rows.sort(key=lambda row: row[sort].lower(), reverse=descending)
+        end = None if limit is None else offset + limit
+        return rows[offset:end], len(rows)
+
+    def product_facets(self):
+        """Return the distinct owners and workstreams of named products, for filter choices."""
+        rows = [row for row in self.list_products() if row["product_name"]]
+        return {field: sorted({row[field] for row in rows if row[field]}) for field in ("business_owner", "workstream")}
+
+    def merge_product(self, product_id, patch, template=None):
+        """Deep-merge patch into a product, creating it from template if it does not exist.
+
+        Returns the changed leaves (see merge_changes()); nothing is written
+        when the list is empty.
+        """
+        raise NotImplementedError
+
+    def replace_products(self, products):
+        """Make the store hold exactly products, (product_id, product) pairs, in one atomic step (used by restore).
+
+        Products are stored as given. One identical to the stored product is
+        left alone; the others continue from the higher of the stored and the
+        given revision, so editors opened on the old product still go through
+        the conflict check. Products not listed are deleted and top-level
+        fields are kept. Once the new store is in place, listeners get one
+        notification per created, updated or deleted product, like saves and
+        deletes. Returns counts of created, updated, unchanged and deleted
+        products.
+        """
+        counts = {"created": 0, "updated": 0, "unchanged": 0, "deleted": 0}
+        existing = [row["product_id"] for row in self.list_products()]
+        notifications, seen = [], set()
+
+        def items():
+            for product_id, product in products:
+                seen.add(product_id)
+                current = self.get_product(product_id)
+                content = prune_empty({k: v for k, v in product.items() if k != "revision"})
+                changes = diff_leaves({k: v for k, v in (current or {}).items() if k != "revision"}, content)
+                if current is not None and not changes:
+                    counts["unchanged"] += 1
+                    yield product_id, current, False
+                    continue
+                counts["created" if current is None else "updated"] += 1
+                notifications.append((product_id, changes))
+                revision = max((current or {}).get("revision", 0), product.get("revision", 0)) + 1
+                yield product_id, dict(content, revision=revision), True
+
+        self._replace(self.document_meta(), items())
+        deleted = [pid for pid in existing if pid not in seen]
+        counts["deleted"] = len(deleted)
+        for product_id, changes in notifications + [(pid, None) for pid in deleted]:
+            self._notify(product_id, changes)
+        return counts
+
+    def delete_product(self, product_id):
+        """Remove a product; return True if it existed."""
+        raise NotImplementedError
+
+    def replace(self, document):
+        """Replace the whole store with an aggregated document; its products are stored without empty leaves.
+
+        Atomic like replace_products(); listeners get one (None, None).
+        """
+        document = _sparse_document(document)
+        meta = {k: v for k, v in document.items() if k != "products"}
+        self._replace(meta, ((pid, product, True) for pid, product in document["products"].items()))
+        self._notify(None, None)
+
+    def _replace(self, meta, items):
+        """Make meta and the products of items the whole store, in one step a failure or crash cannot split.
+
+        items yields (product_id, product, changed); changed is False for a
+        product identical to the stored one, which may then be kept as is.
+        """
+        raise NotImplementedError
+
+    _listeners = ()
+
+    def subscribe(self, listener):
+        """Call listener(product_id, changes) after every save and delete made through this repository.
+
+        changes is the list returned by save_product(), or None when the
+        product was deleted. listener(None, None) means the whole store was
+        replaced (or a batch failed to commit) and anything derived from it
+        must be rebuilt. Listeners run on the writer thread.
+        """
+        self._listeners = self._listeners + (listener,)
+
+    def _notify(self, product_id, changes):
+        for listener in self._listeners:
+            try:
+                listener(product_id, changes)
+            except Exception:
+                # A broken index must not fail the save that triggered it
+                logger.exception("Store listener %r failed", listener)
+
+
+class JsonFileRepository(StoreRepository):
+    """Everything in aggregated.json, with saves appended to a change journal.
+
+    merge_product() and delete_product() append one fsync'd JSON line to
+    aggregated.journal instead of rewriting the snapshot, so a save costs
+    O(patch) and a crash can at worst lose the half-written last line. Inside
+    batch() the lines of every write are flushed with a single fsync. The
+    in-memory document is the snapshot with the journal replayed on top; when
+    another process appends, only the new tail is replayed. Once the journal
+    passes JOURNAL_MAX_ENTRIES or JOURNAL_MAX_BYTES it is compacted back into
+    aggregated.json, which is only ever written via temp file + rename.
+
+    Writes are copy-on-write: the document, its products map and the touched
+    product are replaced rather than edited, so what load(), get_product()
+    and iter_products() handed out stays a stable snapshot for its readers.
+    """
+
+    name = "json"
+    JOURNAL_MAX_ENTRIES = 500
+    JOURNAL_MAX_BYTES = 4 * 1024 * 1024
+
+    def __init__(self, data_dir):
+        self.path = Path(data_dir) / "aggregated.json"
+        self.journal_path = Path(data_dir) / "aggregated.journal"
+        self._lock = threading.RLock()
+        self._data = None
+        self._snapshot = (None, None)  # (revision, digest) of the loaded snapshot
+        self._journal_offset = 0
+        self._journal_entries = 0
+        self._pending_lines = []
+        self._batch_depth = 0
+        # True while the products map was copied during the current batch and not handed out since
+        self._products_owned = False
+
+    def exists(self):
+        return self.path.exists() or self.journal_path.exists()
+
+    @contextmanager
+    def batch(self):
+        with self._lock:
+            self._batch_depth += 1
+            try:
+                yield
+            finally:
+                # Writes are already applied in memory, so flush them even if the batch failed
+                self._batch_depth -= 1
+                if self._batch_depth == 0:
+                    self._products_owned = False
+                    self._flush_journal()
+
+    def _current(self):
+        """Bring the in-memory document up to date with the snapshot and journal on disk."""
+        revision = _file_revision(self.path)
+        journal_revision = _file_revision(self.journal_path)
+        journal_size = journal_revision[1] if journal_revision else 0
+        if self._data is not None and revision != self._snapshot[0]:
+            # Snapshot touched: only a real content change (e.g. compaction elsewhere) forces a reload
+            raw = self.path.read_bytes() if revision else b""
+            digest = hashlib.sha256(raw).hexdigest()
+            if digest != self._snapshot[1]:
+                self._data = None
+            else:
+                self._snapshot = (revision, digest)
+        if self._data is not None and journal_size < self._journal_offset:
+            self._data = None  # journal truncated behind our back
+        if self._data is None:
+            self._products_owned = False
+            with diagnostics.span("snapshot read") as span:
+                raw = self.path.read_bytes() if revision else b""
+                span.bytes_read = len(raw)
+                self._data = json.loads(raw) if raw else {"products": {}}
+            self._snapshot = (revision, hashlib.sha256(raw).hexdigest())
+            self._journal_offset = 0
+            self._journal_entries = 0
+        if journal_size > self._journal_offset:
+            self._replay_journal()
+        return self._data
+
+    def _replay_journal(self):
+        with diagnostics.span("journal replay") as span:
+            with open(self.journal_path, "rb") as f:
+                f.seek(self._journal_offset)
+                tail = f.read()
+            span.bytes_read = len(tail)
+            # A trailing line without newline is an interrupted append; leave it unconsumed
+            complete = tail[:tail.rfind(b"\n") + 1]
+            entries = []
+            for line in complete.splitlines():
+                try:
+                    entries.append(json.loads(line))
+                except ValueError:
+                    continue
+            self._apply(entries)
+            self._journal_entries += len(entries)
+            self._journal_offset += len(complete)
+
+    def _apply(self, entries):
+        """Apply journal entries copy-on-write: readers holding the current document never see it change."""
+        if not entries:
+            return
+        if self._products_owned:
+            # Already copied in this batch, and readers are kept out by the lock until it ends
+            products = self._data["products"]
+        else:
+            products = dict(self._data.get("products", {}))
+            self._data = dict(self._data, products=products)
+            self._products_owned = self._batch_depth > 0
+        copied = set()
+        for entry in entries:
+            pid = entry["product_id"]
+            if entry["op"] == "put":
+                products[pid] = entry["product"]
+                copied.add(pid)
+            elif entry["op"] == "merge":
+                if pid not in copied:
+                    products[pid] = _copy_tree(products.get(pid, {}))
+                    copied.add(pid)
+                merge_changes(products[pid], entry["patch"])
+            elif entry["op"] == "delete":
+                products.pop(pid, None)
+
+    def _append(self, entry):
+        self._apply([entry])
+        self._log(entry)
+
+    def _log(self, entry):
+        self._pending_lines.append((json.dumps(entry, separators=(",", ":")) + "\n").encode("utf-8"))
+        if self._batch_depth == 0:
+            self._flush_journal()
+
+    def _flush_journal(self):
+        if not self._pending_lines:
+            return
+        chunk = b"".join(self._pending_lines)
+        count = len(self._pending_lines)
+        self._pending_lines = []
+        journal_revision = _file_revision(self.journal_path)
+        if journal_revision and journal_revision[1] > self._journal_offset:
+            # Drop the tail of an interrupted append so the new lines start cleanly
+            os.truncate(self.journal_path, self._journal_offset)
+        with diagnostics.span("journal append") as span, open(self.journal_path, "ab") as f:
+            span.bytes_written = len(chunk)
+            f.write(chunk)
+            f.flush()
+            os.fsync(f.fileno())
+            end = f.tell()
+        if end - len(chunk) != self._journal_offset:
+            # Someone else appended in between; re-read everything on the next load
+            self._data = None
+            return
+        self._journal_offset = end
+        self._journal_entries += count
+        if self._journal_entries >= self.JOURNAL_MAX_ENTRIES or self._journal_offset >= self.JOURNAL_MAX_BYTES:
+            self.compact()
+
+    def _write_snapshot(self, data):
+        with diagnostics.span("snapshot write") as span:
+            raw = json.dumps(data, indent=2).encode("utf-8")
+            span.bytes_written = len(raw)
+            tmp_path = self.path.with_name(self.path.name + ".tmp")
+            with open(tmp_path, "wb") as f:
+                f.write(raw)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, self.path)
+        self._snapshot = (_file_revision(self.path), hashlib.sha256(raw).hexdigest())
+
+    def _truncate_journal(self):
+        with open(self.journal_path, "wb"):
+            pass
+        self._journal_offset = 0
+        self._journal_entries = 0
+
+    def compact(self):
+        """Fold the journal into aggregated.json and truncate it.
+
+        Replaying a journal over a snapshot that already contains it yields the
+        same document, so a crash between the two steps is harmless.
+        """
+        with self._lock:
+            data = self._current()
+            self._write_snapshot(data)
+            self._truncate_journal()
+            self._pending_lines = []
+
+    def load(self):
+        with self._lock:
+            # The caller may iterate the products map, so later writes must copy it again
+            self._products_owned = False
+            return self._current()
+
+    def get_product(self, product_id):
+        with self._lock:
+            return self._current().get("products", {}).get(product_id)
+
+    def list_products(self):
+        with self._lock:
+            return [summarize_product(pid, product) for pid, product in self._current().get("products", {}).items()]
+
+    def get_summary(self, product_id):
+        with self._lock:
+            product = self._current().get("products", {}).get(product_id)
+            return summarize_product(product_id, product) if product is not None else None
+
+    def merge_product(self, product_id, patch, template=None):
+        with self._lock:
+            products = self._current().get("products", {})
+            if product_id in products:
+                # Journal only the leaves that actually changed, and apply them like a replayed entry
+                changes = merge_changes(products[product_id], patch, apply=False)
+                if changes:
+                    self._append({"op": "merge", "product_id": product_id, "patch": changes_to_patch(changes)})
+                return changes
+            product = template if template is not None else {}
+            merge_changes(product, patch)
+            self._append({"op": "put", "product_id": product_id, "product": product})
+            return _created(product)
+
+    def delete_product(self, product_id):
+        with self._lock:
+            if product_id not in self._current().get("products", {}):
+                return False
+            self._append({"op": "delete", "product_id": product_id})
+        self._notify(product_id, None)
+        return True
+
+    def _replace(self, meta, items):
+        with self._lock:
+            document = dict(meta, products={pid: product for pid, product, _ in items})
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            journal = _file_revision(self.journal_path)
+            if self._pending_lines or journal and journal[1]:
+                # Folded in first: replaying the old journal onto the new snapshot would corrupt it
+                self.compact()
+            self._write_snapshot(document)
+            self._data = document
+            self._products_owned = False
+
+
+class ShardedRepository(StoreRepository):
+    """One JSON file per product plus a manifest of product names, owners, workstreams and extra top-level keys.
+
+    Product revisions change on every save, so they are kept out of the
+    manifest in the append-only ``revisions.jsonl``: a save appends one line
+    instead of rewriting the manifest, which only changes when a product is
+    added, removed, renamed or reassigned. Inside batch() file writes are
+    held back, so each touched product file and the manifest are written and
+    the revisions appended once per batch however many saves it contains.
+    Cached product files and the manifest are shared with readers, so writes
+    replace them with edited copies instead of changing them in place.
+    """
+
+    name = "sharded"
+
+    # Compact revisions.jsonl once it holds this many lines more than twice its products
+    REVISIONS_SLACK = 1000
+
+    def __init__(self, data_dir):
+        self.products_dir = Path(data_dir) / "products"
+        self.manifest_file = self.products_dir / "manifest.json"
+        self.revisions_file = self.products_dir / "revisions.jsonl"
+        self._lock = threading.RLock()
+        self._pending = {}  # path -> document waiting for the end of the batch
+        self._pending_revisions = {}  # product_id -> revision (None once deleted) waiting for the end of the batch
+        self._batch_depth = 0
+        # Replayed from revisions.jsonl, reading only what was appended since; readers take only this lock
+        self._revisions_lock = threading.RLock()
+        self._revisions = {}
+        self._revisions_read = (None, 0)  # (inode, offset) replayed up to
+        self._revisions_lines = 0
+        # replace() fills staging_dir and swaps it in, moving the old products_dir to old_dir
+        self.staging_dir = self.products_dir.with_name("products.staging")
+        self.old_dir = self.products_dir.with_name("products.old")
+        self._recover()
+
+    def exists(self):
+        return self.manifest_file.exists()
+
+    def _recover(self):
+        """Finish or undo a replace() interrupted by a crash, and drop its leftovers."""
+        if not self.products_dir.exists():
+            # The staged store is complete once its manifest is written
+            if (self.staging_dir / self.manifest_file.name).exists():
+                os.replace(self.staging_dir, self.products_dir)
+            elif self.old_dir.exists():
+                os.replace(self.old_dir, self.products_dir)
+        for leftover in (self.staging_dir, self.old_dir):
+            if leftover.exists():
+                shutil.rmtree(leftover)
+
+    @contextmanager
+    def batch(self):
+        with self._lock:
+            self._batch_depth += 1
+            try:
+                yield
+            finally:
+                self._batch_depth -= 1
+                if self._batch_depth == 0:
+                    pending, self._pending = self._pending, {}
+                    revisions, self._pending_revisions = self._pending_revisions, {}
+                    # Product files first, so the manifest never lists a product whose file is missing
+                    manifest = pending.pop(self.manifest_file, None)
+                    for path, data in pending.items():
+                        file_cache.write(path, data)
+                    self._write_revisions(revisions)
+                    if manifest is not None:
+                        file_cache.write(self.manifest_file, manifest)
+
+    def _read(self, path):
+        if path in self._pending:
+            return self._pending[path]
+        return file_cache.read(path)
+
+    def _write(self, path, data):
+        if self._batch_depth:
+            self._pending[path] = data
+        else:
+            file_cache.write(path, data)
+
+    def _remove(self, path):
+        self._pending.pop(path, None)
+        path.unlink(missing_ok=True)
+        file_cache.forget(path)
+
+    def _manifest(self):
+        return self._read(self.manifest_file) or {"products": {}, "meta": {}}
+
+    def _path(self, product_id):
+        return self.products_dir / f"{product_file_stem(product_id)}.json"
+
+    @staticmethod
+    def _manifest_entry(product):
+        return {field: product.get(field, "") for field in SUMMARY_FIELDS}
+
+    def _summary(self, product_id, entry, revisions):
+        # Entries written by older versions may carry more keys; only the listing fields are read
+        row = {"product_id": product_id}
+        row.update((field, entry.get(field, "")) for field in SUMMARY_FIELDS)
+        row["revision"] = self._pending_revisions.get(product_id) or revisions.get(product_id, 0)
+        return row
+
+    def _read_revisions(self):
+        """product_id -> revision from revisions.jsonl, replaying only the lines appended since the last call."""
+        with self._revisions_lock:
+            try:
+                stat = self.revisions_file.stat()
+            except FileNotFoundError:
+                manifest = file_cache.read(self.manifest_file)
+                if manifest is None:
+                    return {}
+                # Written by a version that kept revisions in the manifest: take them from the product files
+                self._write_revisions({
+                    pid: (file_cache.read(self._path(pid)) or {}).get("revision", 0) for pid in manifest["products"]
+                }, rewrite=True)
+                return self._revisions
+            inode, offset = self._revisions_read
+            if stat.st_ino != inode or stat.st_size < offset:
+                # Compacted by another process
+                self._revisions, self._revisions_lines, offset = {}, 0, 0
+            if stat.st_size > offset:
+                with open(self.revisions_file, "rb") as f:
+                    f.seek(offset)
+                    raw = f.read(stat.st_size - offset)
+                # An interrupted append leaves a partial last line; the next append starts a new line after it
+                raw = raw[:raw.rfind(b"\n") + 1]
+                for line in raw.splitlines():
+                    try:
+                        pid, revision = json.loads(line)
+                    except (ValueError, TypeError):
+                        continue
+                    if revision is None:
+                        self._revisions.pop(pid, None)
+                    else:
+                        self._revisions[pid] = revision
+                    self._revisions_lines += 1
+                offset += len(raw)
+            self._revisions_read = (stat.st_ino, offset)
+            return self._revisions
+
+    def _write_revisions(self, revisions, rewrite=False):
+        """Append {product_id: revision or None} to revisions.jsonl, or with rewrite make them its whole content."""
+        if not revisions and not rewrite:
+            return
+        with self._revisions_lock:
+            if not rewrite:
+                current = self._read_revisions()
+                lines = b"".join(json.dumps([pid, revision]).encode("utf-8") + b"\n" for pid, revision in revisions.items())
+                with diagnostics.span("file write") as span, open(self.revisions_file, "ab") as f:
+                    if os.fstat(f.fileno()).st_size > self._revisions_read[1]:
+                        lines = b"\n" + lines
+                    f.write(lines)
+                    f.flush()
+                    os.fsync(f.fileno())
+                    span.bytes_written = len(lines)
+                    self._revisions_read = (os.fstat(f.fileno()).st_ino, f.tell())
+                for pid, revision in revisions.items():
+                    if revision is None:
+                        current.pop(pid, None)
+                    else:
+                        current[pid] = revision
+                self._revisions_lines += len(revisions)
+                if self._revisions_lines <= 2 * len(current) + self.REVISIONS_SLACK:
+                    return
+                revisions = current
+            revisions = {pid: revision for pid, revision in revisions.items() if revision is not None}
+            raw = b"".join(json.dumps([pid, revision]).encode("utf-8") + b"\n" for pid, revision in revisions.items())
+            self.products_dir.mkdir(parents=True, exist_ok=True)
+            tmp_path = self.revisions_file.with_name(self.revisions_file.name + ".tmp")
+            with diagnostics.span("file write") as span, open(tmp_path, "wb") as f:
+                f.write(raw)
+                f.flush()
+                os.fsync(f.fileno())
+                span.bytes_written = len(raw)
+            os.replace(tmp_path, self.revisions_file)
+            self._revisions, self._revisions_lines = revisions, len(revisions)
+            self._revisions_read = (self.revisions_file.stat().st_ino, len(raw))
+
+    def _set_revision(self, product_id, revision):
+        if self._batch_depth:
+            self._pending_revisions[product_id] = revision
+        else:
+            self._write_revisions({product_id: revision})
+
+    def load(self):
+        manifest = self._manifest()
+        data = dict(manifest.get("meta", {}))
+        data["products"] = {}
+        for pid in manifest["products"]:
+            product = self._read(self._path(pid))
+            if product is not None:
+                data["products"][pid] = product
+        return data
+
+    def get_product(self, product_id):
+        if product_id not in self._manifest()["products"]:
+            return None
+        return self._read(self._path(product_id))
+
+    def list_products(self):
+        revisions = self._read_revisions()
+        return [self._summary(pid, entry, revisions) for pid, entry in self._manifest()["products"].items()]
+
+    def get_summary(self, product_id):
+        entry = self._manifest()["products"].get(product_id)
+        return self._summary(product_id, entry, self._read_revisions()) if entry is not None else None
+
+    def iter_products(self):
+        for pid in list(self._manifest()["products"]):
+            product = self.get_product(pid)
+            if product is not None:
+                yield pid, product
+
+    def document_meta(self):
+        return dict(self._manifest().get("meta", {}))
+
+    def merge_product(self, product_id, patch, template=None):
+        # Only this product's file is rewritten, plus one revisions.jsonl line; the manifest only for a new listing
+        with self._lock:
+            product = self.get_product(product_id)
+            if product is None:
+                product = template if template is not None else {}
+                merge_changes(product, patch)
+                changes = _created(product)
+            else:
+                product = _copy_tree(product)
+                changes = merge_changes(product, patch)
+                if not changes:
+                    return changes
+            self._write(self._path(product_id), product)
+            if any(change.path == ("revision",) for change in changes):
+                self._set_revision(product_id, product["revision"])
+            manifest = self._manifest()
+            entry = self._manifest_entry(product)
+            old = manifest["products"].get(product_id)
+            if old is None or self._manifest_entry(old) != entry:
+                self._write(self.manifest_file, dict(manifest, products={**manifest["products"], product_id: entry}))
+            return changes
+
+    def delete_product(self, product_id):
+        with self._lock:
+            manifest = self._manifest()
+            if product_id not in manifest["products"]:
+                return False
+            self._remove(self._path(product_id))
+            products = dict(manifest["products"])
+            del products[product_id]
+            self._set_revision(product_id, None)
+            self._write(self.manifest_file, dict(manifest, products=products))
+        self._notify(product_id, None)
+        return True
+
+    def _replace(self, meta, items):
+        # The new store is staged in a sibling directory and swapped in with two renames (see _recover())
+        with self._lock:
+            shutil.rmtree(self.staging_dir, ignore_errors=True)
+            self.staging_dir.mkdir(parents=True)
+            manifest = {"products": {}, "meta": meta}
+            revisions = {}
+            for pid, product, changed in items:
+                path = self._path(pid)
+                staged = self.staging_dir / path.name
+                if changed or path in self._pending or not _link(path, staged):
+                    _write_new(staged, json.dumps(product, indent=2).encode("utf-8"))
+                manifest["products"][pid] = self._manifest_entry(product)
+                revisions[pid] = product.get("revision", 0)
+            raw = b"".join(json.dumps([pid, revision]).encode("utf-8") + b"\n" for pid, revision in revisions.items())
+            _write_new(self.staging_dir / self.revisions_file.name, raw)
+            _write_new(self.staging_dir / self.manifest_file.name, json.dumps(manifest, indent=2).encode("utf-8"))
+            shutil.rmtree(self.old_dir, ignore_errors=True)
+            replacing = self.products_dir.exists()
+            if replacing:
+                os.replace(self.products_dir, self.old_dir)
+            os.replace(self.staging_dir, self.products_dir)
+            if replacing:
+                shutil.rmtree(self.old_dir)
+            self._pending, self._pending_revisions = {}, {}
+            with self._revisions_lock:
+                self._revisions, self._revisions_lines = revisions, len(revisions)
+                self._revisions_read = (self.revisions_file.stat().st_ino, len(raw))
+
+
+def _link(source, target):
+    """Hard-link source at target; False where that is not possible (missing file, no link support)."""
+    try:
+        os.link(source, target)
+        return True
+    except OSError:
+        return False
+
+
+def _write_new(path, raw):
+    """Write and fsync a file nothing reads yet, e.g. in a staging directory."""
+    with diagnostics.span("file write") as span, open(path, "wb") as f:
+        f.write(raw)
+        f.flush()
+        os.fsync(f.fileno())
+        span.bytes_written = len(raw)
+
+
+class SqliteRepository(StoreRepository):
+    """SQLite database (WAL mode) with one row per product and one per session section.
+
+    Top-level scalar fields live in ``products.meta``; every dict-valued field
+    (technical_session, business_owner_session, ...) is its own row in
+    ``product_sections``. Saves patch only the touched rows with JSON1's
+    ``json_patch()``, and the listing is answered with ``json_extract()`` on
+    ``meta`` without reading any section bodies. A batch() is one transaction, with a
+    savepoint per write so a failing write only rolls back itself.
+    """
+
+    name = "sqlite"
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS products (
+            product_id TEXT PRIMARY KEY,
+            meta TEXT NOT NULL
+        );
+        CREATE TABLE IF NOT EXISTS product_sections (
+            product_id TEXT NOT NULL REFERENCES products(product_id) ON DELETE CASCADE,
+            section TEXT NOT NULL,
+            body TEXT NOT NULL,
+            PRIMARY KEY (product_id, section)
+        );
+        -- Held per-product completion in older versions; completeness.py counts it now
+        DROP TABLE IF EXISTS product_summaries;
+        CREATE TABLE IF NOT EXISTS store_meta (
+            key TEXT PRIMARY KEY,
+            value TEXT NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS products_business_owner ON products (json_extract(meta, '$.business_owner'));
+    """
+
+    def __init__(self, data_dir):
+        self.db_file = Path(data_dir) / "workshop.db"
+        self._lock = threading.RLock()
+        self._conn = None
+        self._writes = 0
+        self._tx_depth = 0
+        self._loaded = (None, None)
+
+    def exists(self):
+        return self.db_file.exists()
+
+    def _connection(self):
+        if self._conn is None:
+            self.db_file.parent.mkdir(parents=True, exist_ok=True)
+            # Autocommit mode; writes open explicit transactions in _transaction()
+            conn = sqlite3.connect(self.db_file, check_same_thread=False, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            # FULL makes each commit durable; group commit amortizes the extra fsync
+            conn.execute("PRAGMA synchronous=FULL")
+            conn.execute("PRAGMA foreign_keys=ON")
+            conn.executescript(self.SCHEMA)
+            self._conn = conn
+        return self._conn
+
+    @contextmanager
+    def _transaction(self):
+        with self._lock:
+            conn = self._connection()
+            outer = self._tx_depth == 0
+            savepoint = f"sp{self._tx_depth}"
+            conn.execute("BEGIN IMMEDIATE" if outer else f"SAVEPOINT {savepoint}")
+            self._tx_depth += 1
+            try:
+                yield conn
+            except BaseException:
+                conn.execute("ROLLBACK" if outer else f"ROLLBACK TO {savepoint}")
+                if not outer:
+                    conn.execute(f"RELEASE {savepoint}")
+                raise
+            finally:
+                self._tx_depth -= 1
+            if outer:
+                with diagnostics.span("sqlite commit"):
+                    conn.execute("COMMIT")
+            else:
+                conn.execute(f"RELEASE {savepoint}")
+            self._writes += 1
+
+    @contextmanager
+    def batch(self):
+        with self._transaction():
+            yield
+
+    @staticmethod
+    def _split(product):
+        meta = {k: v for k, v in product.items() if not isinstance(v, dict)}
+        sections = {k: v for k, v in product.items() if isinstance(v, dict)}
+        return meta, sections
+
+    def _put(self, conn, product_id, product):
+        # Insert or overwrite; an existing product keeps its rowid, i.e. its place in catalog order
+        meta, sections = self._split(product)
+        with diagnostics.span("sqlite write") as span:
+            meta = json.dumps(meta)
+            rows = [(product_id, name, json.dumps(body)) for name, body in sections.items()]
+            span.bytes_written = len(meta) + sum(len(row[2]) for row in rows)
+            conn.execute(
+                "INSERT INTO products (product_id, meta) VALUES (?, ?) ON CONFLICT (product_id) DO UPDATE SET meta = excluded.meta",
+                (product_id, meta),
+            )
+            conn.execute("DELETE FROM product_sections WHERE product_id = ?", (product_id,))
+            conn.executemany("INSERT INTO product_sections (product_id, section, body) VALUES (?, ?, ?)", rows)
+
+    # Columns of a summary row; meta is only read through json_extract()
+    _SUMMARY_SELECT = (
+        "SELECT product_id, json_extract(meta, '$.product_name'), json_extract(meta, '$.business_owner'), "
+        "json_extract(meta, '$.workstream'), json_extract(meta, '$.revision') FROM products"
+    )
+
+    @staticmethod
+    def _summary_rows(rows):
+        return [
+            {"product_id": pid, "product_name": name or "", "business_owner": owner or "", "workstream": workstream or "", "revision": revision or 0}
+            for pid, name, owner, workstream, revision in rows
+        ]
+
+    def load(self):
+        with self._lock:
+            conn = self._connection()
+            # data_version changes when another connection commits; _writes tracks our own commits
+            revision = (conn.execute("PRAGMA data_version").fetchone()[0], self._writes)
+            if self._loaded[0] == revision:
+                return self._loaded[1]
+            with diagnostics.span("sqlite load") as span:
+                data = {key: json.loads(value) for key, value in conn.execute("SELECT key, value FROM store_meta")}
+                products = {}
+                for pid, meta in conn.execute("SELECT product_id, meta FROM products ORDER BY rowid"):
+                    products[pid] = json.loads(meta)
+                    span.bytes_read += len(meta)
+                for pid, section, body in conn.execute("SELECT product_id, section, body FROM product_sections"):
+                    if pid in products:
+                        products[pid][section] = json.loads(body)
+                        span.bytes_read += len(body)
+                data["products"] = products
+            self._loaded = (revision, data)
+            return data
+
+    def get_product(self, product_id):
+        with self._lock:
+            return self._read_product(self._connection(), product_id)
+
+    @staticmethod
+    def _read_product(conn, product_id):
+        with diagnostics.span("sqlite read") as span:
+            row = conn.execute("SELECT meta FROM products WHERE product_id = ?", (product_id,)).fetchone()
+            if row is None:
+                return None
+            product = json.loads(row[0])
+            span.bytes_read = len(row[0])
+            for section, body in conn.execute("SELECT section, body FROM product_sections WHERE product_id = ?", (product_id,)):
+                product[section] = json.loads(body)
+                span.bytes_read += len(body)
+            return product
+
+    def list_products(self):
+        with self._lock:
+            rows = self._connection().execute(self._SUMMARY_SELECT + " ORDER BY products.rowid").fetchall()
+        return self._summary_rows(rows)
+
+    def get_summary(self, product_id):
+        with self._lock:
+            rows = self._connection().execute(self._SUMMARY_SELECT + " WHERE product_id = ?", (product_id,)).fetchall()
+        summaries = self._summary_rows(rows)
+        return summaries[0] if summaries else None
+
+    def iter_products(self):
+        # One product in memory at a time instead of load()'s whole document
+        with self._lock:
+            pids = [pid for (pid,) in self._connection().execute("SELECT product_id FROM products ORDER BY rowid")]
+        for pid in pids:
+            product = self.get_product(pid)
+            if product is not None:
+                yield pid, product
+
+    def document_meta(self):
+        with self._lock:
+            return {key: json.loads(value) for key, value in self._connection().execute("SELECT key, value FROM store_meta")}
+
+    def snapshot(self):
+        # A read transaction on its own read-only connection keeps seeing this commit (WAL) while saves go on
+        with self._lock:
+            self._connection()
+        conn = sqlite3.connect(self.db_file.resolve().as_uri() + "?mode=ro", uri=True, check_same_thread=False, isolation_level=None)
+        try:
+            conn.execute("BEGIN")
+            meta = {key: json.loads(value) for key, value in conn.execute("SELECT key, value FROM store_meta")}
+            pids = [pid for (pid,) in conn.execute("SELECT product_id FROM products ORDER BY rowid")]
+        except BaseException:
+            conn.close()
+            raise
+
+        def products():
+            for pid in pids:
+                product = self._read_product(conn, pid)
+                if product is not None:
+                    yield pid, product
+
+        return StoreSnapshot(meta, products(), conn.close)
+
+    def query_products(self, filters=None, sort=None, descending=False, offset=0, limit=None):
+        # Filter, sort and page in SQL so a page costs the same however large the catalog is
+        if sort is not None and sort not in SUMMARY_FIELDS:
+            raise ValueError(f"Cannot sort products by {sort!r}")
+        where, params = ["coalesce(json_extract(meta, '$.product_name'), '') != ''"], []
+        for field, values in (filters or {}).items():
+            if field not in SUMMARY_FIELDS:
+                raise ValueError(f"Cannot filter products by {field!r}")
+            if values:
+                where.append(f"json_extract(meta, '$.{field}') IN ({', '.join('?' * len(values))})")
+                params.extend(values)
+        clause = " WHERE " + " AND ".join(where)
+        order = f"json_extract(meta, '$.{sort}') COLLATE NOCASE {'DESC' if descending else 'ASC'}, products.rowid" if sort else "products.rowid"
+        with self._lock:
+            conn = self._connection()
+            total = conn.execute("SELECT COUNT(*) FROM products" + clause, params).fetchone()[0]
+            rows = conn.execute(
+                f"{self._SUMMARY_SELECT}{clause} ORDER BY {order} LIMIT ? OFFSET ?",
+                params + [-1 if limit is None else limit, offset],
+            ).fetchall()
+        return self._summary_rows(rows), total
+
+    def product_facets(self):
+        named = "coalesce(json_extract(meta, '$.product_name'), '') != ''"
+        with self._lock:
+            conn = self._connection()
+            return {
+                field: [value for (value,) in conn.execute(
+                    f"SELECT DISTINCT json_extract(meta, '$.{field}') AS value FROM products "
+                    f"WHERE {named} AND coalesce(value, '') != '' ORDER BY value"
+                )]
+                for field in ("business_owner", "workstream")
+            }
+
+    def merge_product(self, product_id, patch, template=None):
+        with self._transaction() as conn:
+            current = self.get_product(product_id)
+            if current is None:
+                product = template if template is not None else {}
+                merge_changes(product, patch)
+                self._put(conn, product_id, product)
+                return _created(product)
+            changes = merge_changes(current, patch, apply=False)
+            if not changes:
+                return changes
+            # Patch only the changed leaves; json_patch() follows RFC 7396, so null values delete keys
+            meta, sections = self._split(changes_to_patch(changes))
+            # but it keeps the objects a deletion leaves empty, so those sections are rewritten whole
+            cleared = {change.path[0] for change in changes if change.new is None and len(change.path) > 1}
+            merge_changes(current, patch)
+            with diagnostics.span("sqlite write") as span:
+                if meta:
+                    meta = json.dumps(meta)
+                    span.bytes_written += len(meta)
+                    conn.execute("UPDATE products SET meta = json_patch(meta, ?) WHERE product_id = ?", (meta, product_id))
+                for name in cleared:
+                    if name not in current:
+                        conn.execute("DELETE FROM product_sections WHERE product_id = ? AND section = ?", (product_id, name))
+                        continue
+                    body = json.dumps(current[name])
+                    span.bytes_written += len(body)
+                    conn.execute("UPDATE product_sections SET body = ? WHERE product_id = ? AND section = ?", (body, product_id, name))
+                for name, body in sections.items():
+                    if name in cleared:
+                        continue
+                    body = json.dumps(body)
+                    span.bytes_written += len(body)
+                    conn.execute(
+                        "INSERT INTO product_sections (product_id, section, body) VALUES (?, ?, ?) "
+                        "ON CONFLICT (product_id, section) DO UPDATE SET body = json_patch(body, excluded.body)",
+                        (product_id, name, body),
+                    )
+            return changes
+
+    def delete_product(self, product_id):
+        with self._transaction() as conn:
+            deleted = conn.execute("DELETE FROM products WHERE product_id = ?", (product_id,)).rowcount > 0
+        if deleted:
+            self._notify(product_id, None)
+        return deleted
+
+    def _replace(self, meta, items):
+        # One transaction: products are overwritten in place, then the ones not listed are deleted
+        with self._transaction() as conn:
+            conn.execute("DELETE FROM store_meta")
+            conn.executemany("INSERT INTO store_meta (key, value) VALUES (?, ?)", [(k, json.dumps(v)) for k, v in meta.items()])
+            seen = set()
+            for pid, product, changed in items:
+                seen.add(pid)
+                if changed:
+                    self._put(conn, pid, product)
+            stale = [(pid,) for (pid,) in conn.execute("SELECT product_id FROM products").fetchall() if pid not in seen]
+            conn.executemany("DELETE FROM products WHERE product_id = ?", stale)
+
+
+class _WriteRequest:
+    def __init__(self, fn, in_batch=True):
+        self.fn = fn
+        self.in_batch = in_batch
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class StoreWriter:
+    """The single thread that applies every mutation of one repository.
+
+    Callers hand a function of the repository to submit() and block until it
+    has run and its batch is durable. The writer drains whatever is queued
+    into one repo.batch(), i.e. one fsync or transaction for all of it (group
+    commit), so concurrent sessions share the cost of a commit instead of
+    contending for the file. An exception from one request is re-raised in
+    its caller only; a failed commit is reported to every caller in the batch.
+    read() runs a function between two batches instead, outside repo.batch().
+    """
+
+    MAX_BATCH = 256
+
+    def __init__(self, repo):
+        self.repo = repo
+        self._queue = queue.Queue()
+        self._thread = threading.Thread(target=self._run, name=f"store-writer-{repo.name}", daemon=True)
+        self._thread.start()
+
+    def submit(self, fn):
+        """Run fn(repo) on the writer thread and return its result once it is durable."""
+        if threading.current_thread() is self._thread:
+            return fn(self.repo)
+        return self._wait(_WriteRequest(fn))
+
+    def read(self, fn):
+        """Run fn(repo) on the writer thread between two batches and return its result.
+
+        Every write submitted before has committed and none runs meanwhile,
+        and no repository lock is held, so readers are not blocked. Use it to
+        take a StoreSnapshot (plus anything that must match it, e.g. an
+        index's hashes) and read the snapshot after it returns; keep fn short,
+        as saves wait for it.
+        """
+        if threading.current_thread() is self._thread:
+            raise RuntimeError("StoreWriter.read() cannot be called from a write")
+        return self._wait(_WriteRequest(fn, in_batch=False))
+
+    def _wait(self, request):
+        self._queue.put(request)
+        request.done.wait()
+        if request.error is not None:
+            raise request.error
+        return request.result
+
+    def _run(self):
+        held = None
+        while True:
+            batch = [held or self._queue.get()]
+            held = None
+            if not batch[0].in_batch:
+                try:
+                    batch[0].result = batch[0].fn(self.repo)
+                except Exception as e:
+                    batch[0].error = e
+                batch[0].done.set()
+                continue
+            while len(batch) < self.MAX_BATCH:
+                try:
+                    request = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if not request.in_batch:
+                    # Runs once this batch has committed
+                    held = request
+                    break
+                batch.append(request)
+            try:
+                with self.repo.batch():
+                    for request in batch:
+                        try:
+                            request.result = request.fn(self.repo)
+                        except Exception as e:
+                            request.error = e
+            except Exception as e:
+                for request in batch:
+                    if request.error is None:
+                        request.error = e
+                # Listeners were told about writes that did not land; have them resync
+                self.repo._notify(None, None)
+            for request in batch:
+                request.done.set()
+
+
+REPOSITORY_TYPES = {
+    JsonFileRepository.name: JsonFileRepository,
+    ShardedRepository.name: ShardedRepository,
+    SqliteRepository.name: SqliteRepository,
+}
+
+_repositories = {}
+_writers = {}
+_repositories_lock = threading.Lock()
+
+
+def get_repository(mode, data_dir):
+    """Return the process-wide repository for a storage mode and data directory."""
+    if mode not in REPOSITORY_TYPES:
+        raise ValueError(f"Unknown storage mode {mode!r}; expected one of {sorted(REPOSITORY_TYPES)}")
+    key = (mode, str(Path(data_dir).resolve()))
+    with _repositories_lock:
+        if key not in _repositories:
+            _repositories[key] = REPOSITORY_TYPES[mode](data_dir)
+        return _repositories[key]
+
+
+def get_writer(mode, data_dir):
+    """Return the process-wide StoreWriter for a storage mode and data directory."""
+    repo = get_repository(mode, data_dir)
+    with _repositories_lock:
+        if repo not in _writers:
+            _writers[repo] = StoreWriter(repo)
+        return _writers[repo]
+
+
+def ensure_store(mode, data_dir):
+    """Initialize the store for mode, carrying data over from another backend on first start."""
+    repo = get_repository(mode, data_dir)
+    if not repo.exists():
+        sources = [get_repository(other, data_dir) for other in REPOSITORY_TYPES if other != mode]
+        source = next((other for other in sources if other.exists()), None)
+        document = source.load() if source else {"products": {}}
+        get_writer(mode, data_dir).submit(lambda repo: repo.replace(document))
+    return repo
+
+
+class StoreIndex:
+    """Base for in-memory state derived from a store and kept current by its notifications.
+
+    Subclasses implement _scan(repo), which computes the whole state from the
+    store, _install(state) and _apply(product_id, changes, product) for one
+    notification (product is the saved product when READS_PRODUCT is set,
+    otherwise None). build() scans without holding the index lock, as the
+    writer thread may be holding the store's lock while it notifies us:
+    notifications arriving meanwhile are queued and replayed on top of the
+    scan, and a rebuild among them starts the scan over.
+    """
+
+    # Whether _apply needs the saved product, read before taking the index lock
+    READS_PRODUCT = False
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._backlog = None
+
+    def _scan(self, repo):
+        raise NotImplementedError
+
+    def _install(self, state):
+        raise NotImplementedError
+
+    def _apply(self, product_id, changes, product):
+        raise NotImplementedError
+
+    def build(self, repo):
+        """Compute the state from every product of repo."""
+        while True:
+            with self._lock:
+                self._backlog = []
+            state = self._scan(repo)
+            with self._lock:
+                backlog, self._backlog = self._backlog, None
+                if any(product_id is None for product_id, _, _ in backlog):
+                    continue
+                self._install(state)
+                for product_id, changes, product in backlog:
+                    self._apply(product_id, changes, product)
+                return
+
+    def on_store_change(self, product_id, changes, repo):
+        product = None
+        if self.READS_PRODUCT and product_id is not None and changes is not None:
+            product = repo.get_product(product_id)
+        with self._lock:
+            if self._backlog is not None:
+                self._backlog.append((product_id, changes, product))
+                return
+            if product_id is not None:
+                self._apply(product_id, changes, product)
+                return
+        self.build(repo)
+
+
+_attached = {}
+_attached_lock = threading.Lock()
+
+
+def attach_index(repo, name, factory):
+    """Return the process-wide object called name for repo, made by factory() on first use.
+
+    It is subscribed to repo (its on_store_change(product_id, changes, repo)
+    gets every notification) before a StoreIndex is built, so no save is
+    missed between the two.
+    """
+    with _attached_lock:
+        index = _attached.get((id(repo), name))
+        if index is None:
+            index = factory()
+            repo.subscribe(lambda product_id, changes: index.on_store_change(product_id, changes, repo))
+            if isinstance(index, StoreIndex):
+                index.build(repo)
+            _attached[(id(repo), name)] = index
+        return index